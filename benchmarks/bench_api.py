@@ -0,0 +1,107 @@
+"""Tải thử API tra cứu theo lô (bhxh_api.py): nhiều luồng, mỗi luồng giữ một kết nối (requests.Session).
+
+Mã gửi lên lấy ngẫu nhiên từ chính kho dữ liệu, trộn thêm một tỷ lệ mã không tồn tại.
+Chạy với máy chủ có sẵn:   python benchmarks/bench_api.py --url http://127.0.0.1:8502 --mat-khau ...
+Tự bật máy chủ tạm:        python benchmarks/bench_api.py --tu-chay --thu-muc data_store --file-nguoi-dung users.json
+"""
+import argparse
+import io
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pyarrow as pa
+import requests
+
+GOC = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, GOC)
+from bhxh_du_lieu import cot_dang_chuoi
+from bhxh_kho_du_lieu import mo_ban_chia_se
+
+def cho_may_chu(url, cho_toi_da=600):
+    bat_dau = time.time()
+    while time.time() - bat_dau < cho_toi_da:
+        try:
+            if requests.get(url + '/api/suc-khoe', timeout=2).ok: return True
+        except requests.RequestException: pass
+        time.sleep(0.5)
+    return False
+
+def tao_yeu_cau(df, cac_ma, loai, so_ma, ty_le_khong_co, rng):
+    """(đường dẫn, tham số cho requests.post) của một yêu cầu."""
+    vi_tri = rng.integers(0, len(df), so_ma)
+    if loai == 'ho-ten':
+        ho_ten = df['hoTen'].to_numpy(dtype=object)[vi_tri]; ngay = cot_dang_chuoi(df.iloc[vi_tri], 'ngaySinh').to_numpy(dtype=object)
+        return '/api/ho-ten', {'json': {'ds': [{'ho_ten': str(t), 'ngay_sinh': str(n)} for t, n in zip(ho_ten, ngay)]}}
+    ma = cac_ma[vi_tri]
+    thieu = rng.random(so_ma) < ty_le_khong_co
+    ma[thieu] = [f"X{k:09d}" for k in rng.integers(0, 10**9, int(thieu.sum()))]
+    return f'/api/{loai}', {'data': '\n'.join(ma).encode(), 'headers': {'Content-Type': 'text/plain'}}
+
+def dem_dong(phan_hoi, dinh_dang):
+    if dinh_dang == 'arrow': return pa.ipc.open_stream(io.BytesIO(phan_hoi.content)).read_all().num_rows
+    return phan_hoi.content.count(b'\n')
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--url', default='http://127.0.0.1:8502')
+    ap.add_argument('--nguoi-dung', default='bhxh_admin')
+    ap.add_argument('--mat-khau', default='12345')
+    ap.add_argument('--thu-muc', default='data_store', help='Kho dữ liệu để lấy mã mẫu (và để máy chủ tạm đọc)')
+    ap.add_argument('--file-nguoi-dung', default='users.json')
+    ap.add_argument('--tu-chay', action='store_true', help='Tự bật bhxh_api.py ở cổng trong --url rồi tắt khi xong')
+    ap.add_argument('--loai', choices=['ma-so', 'han-the', 'ho-ten'], default='ma-so')
+    ap.add_argument('--dinh-dang', choices=['jsonl', 'arrow'], default='jsonl')
+    ap.add_argument('--so-ma', type=int, default=20_000, help='Số mã (hoặc cặp họ tên) mỗi yêu cầu')
+    ap.add_argument('--so-luong', type=int, default=4, help='Số luồng gửi đồng thời')
+    ap.add_argument('--so-yeu-cau', type=int, default=10, help='Số yêu cầu mỗi luồng')
+    ap.add_argument('--ty-le-khong-co', type=float, default=0.1)
+    args = ap.parse_args()
+
+    may_chu = None
+    if args.tu_chay:
+        cong = args.url.rsplit(':', 1)[-1].strip('/')
+        may_chu = subprocess.Popen([sys.executable, os.path.join(GOC, 'bhxh_api.py'), '--cong', cong,
+                                    '--thu-muc', args.thu_muc, '--file-nguoi-dung', args.file_nguoi_dung])
+    try:
+        t = time.perf_counter()
+        if not cho_may_chu(args.url): sys.exit("Máy chủ API không phản hồi.")
+        if may_chu: print(f"Máy chủ sẵn sàng sau {time.perf_counter() - t:.1f}s")
+        _, df = mo_ban_chia_se(args.thu_muc)
+        print(f"Dữ liệu: {len(df):,} dòng | {args.loai} | {args.dinh_dang} | {args.so_ma:,} mã/yêu cầu | {args.so_luong} luồng x {args.so_yeu_cau} yêu cầu")
+
+        # Dựng sẵn mọi yêu cầu để thời gian đo chỉ gồm gửi, chờ và đọc kết quả
+        cac_ma = cot_dang_chuoi(df, 'soBhxh').to_numpy(dtype=object)
+        theo_luong = [[tao_yeu_cau(df, cac_ma, args.loai, args.so_ma, args.ty_le_khong_co, np.random.default_rng(k)) for _ in range(args.so_yeu_cau)]
+                      for k in range(args.so_luong)]
+        thoi_gian, so_dong, so_byte, loi = [], [], [], []
+        khoa = threading.Lock()
+        def chay(cac_yeu_cau):
+            with requests.Session() as phien:   # Một kết nối giữ suốt các yêu cầu của luồng
+                phien.auth = (args.nguoi_dung, args.mat_khau)
+                for duong_dan, tham_so in cac_yeu_cau:
+                    t = time.perf_counter()
+                    r = phien.post(f"{args.url}{duong_dan}?dinh_dang={args.dinh_dang}", **tham_so)
+                    n = dem_dong(r, args.dinh_dang) if r.ok else 0
+                    with khoa:
+                        if not r.ok: loi.append(r.status_code)
+                        thoi_gian.append(time.perf_counter() - t); so_dong.append(n); so_byte.append(len(r.content))
+        bat_dau = time.perf_counter()
+        cac_luong = [threading.Thread(target=chay, args=(ds,)) for ds in theo_luong]
+        for l in cac_luong: l.start()
+        for l in cac_luong: l.join()
+        tong = time.perf_counter() - bat_dau
+
+        tg = np.array(thoi_gian) * 1000
+        so_yc = len(tg)
+        print(f"Yêu cầu: {so_yc:,} ({len(loi)} lỗi{': ' + str(sorted(set(loi))) if loi else ''}) trong {tong:.2f}s -> {so_yc / tong:.1f} yêu cầu/s, "
+              f"{so_yc * args.so_ma / tong:,.0f} mã/s, {sum(so_dong) / tong:,.0f} dòng/s, {sum(so_byte) / tong / 2**20:.1f} MB/s")
+        print(f"Độ trễ (ms): p50 {np.percentile(tg, 50):.0f} | p95 {np.percentile(tg, 95):.0f} | p99 {np.percentile(tg, 99):.0f} | max {tg.max():.0f}")
+    finally:
+        if may_chu: may_chu.terminate(); may_chu.wait()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Đo bộ nhớ tăng thêm cho mỗi phiên / tiến trình khi đọc dữ liệu.
+
+- cu: mỗi phiên nhận một bản sao (st.cache_data pickle rồi giải pickle kết quả ở mỗi lần gọi).
+- chia_se: mọi phiên dùng chung một DataFrame ánh xạ bộ nhớ từ bản Arrow của phiên bản hiện hành.
+Ngoài ra mở nhiều tiến trình cùng đọc bản Arrow để xem phần bộ nhớ riêng (RssAnon) và PSS của mỗi tiến trình.
+Chỉ chạy trên Linux (đọc /proc).
+
+Chạy: python benchmarks/bench_bo_nho.py --so-dong 1000000 --so-phien 5 --so-tien-trinh 4
+"""
+import argparse
+import gc
+import multiprocessing as mp
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bhxh_du_lieu import luu_parquet, ap_kieu_ngay, bo_sung_cot_khong_dau
+from bhxh_kho_du_lieu import doc_kho, mo_ban_chia_se, ghi_ban_day_du
+
+def bo_nho():
+    """(RssAnon, RssFile, Pss) của tiến trình hiện tại, đơn vị MB."""
+    kq = {}
+    with open('/proc/self/status') as f:
+        for dong in f:
+            if dong.startswith(('RssAnon:', 'RssFile:')): kq[dong.split(':')[0]] = int(dong.split()[1]) / 1024
+    with open('/proc/self/smaps_rollup') as f:
+        for dong in f:
+            if dong.startswith('Pss:'): kq['Pss'] = int(dong.split()[1]) / 1024
+    return kq['RssAnon'], kq['RssFile'], kq['Pss']
+
+def _do_phien(thu_muc, che_do, so_phien, hang_doi):
+    """Chạy trong tiến trình riêng: nạp dữ liệu rồi mô phỏng so_phien phiên cùng lấy dữ liệu."""
+    gc.collect(); truoc = bo_nho()[0]
+    if che_do == 'cu':
+        goc = pickle.dumps(doc_kho(thu_muc))   # st.cache_data lưu kết quả dạng pickle
+        lay = lambda: pickle.loads(goc)
+    else:
+        df = mo_ban_chia_se(thu_muc)[1]
+        lay = lambda: df
+    cac_phien, muc = [], []
+    for _ in range(so_phien):
+        df_phien = lay()
+        df_phien['hoTen'].str.len().sum()   # Chạm vào dữ liệu như khi phiên thực sự dùng
+        cac_phien.append(df_phien)
+        gc.collect(); muc.append(bo_nho()[0])
+    hang_doi.put((truoc, muc))
+
+def _doc_tien_trinh(thu_muc, rao, hang_doi):
+    df = mo_ban_chia_se(thu_muc)[1]
+    df['hoTen'].str.len().sum()
+    rao.wait()   # Đo khi mọi tiến trình đã mở file để PSS phản ánh phần trang nhớ dùng chung
+    gc.collect(); hang_doi.put(bo_nho())
+    rao.wait()
+
+def chay(ctx, dich, *tham_so):
+    hang_doi = ctx.Queue()
+    p = ctx.Process(target=dich, args=(*tham_so, hang_doi)); p.start()
+    kq = hang_doi.get(); p.join()
+    return kq
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--thu-muc', help='Kho dữ liệu có sẵn (mặc định: sinh dữ liệu giả)')
+    ap.add_argument('--so-dong', type=int, default=1_000_000)
+    ap.add_argument('--so-phien', type=int, default=5)
+    ap.add_argument('--so-tien-trinh', type=int, default=4)
+    args = ap.parse_args()
+
+    thu_muc_tam = None
+    thu_muc = args.thu_muc
+    if not thu_muc:
+        from bench_chatbot import tao_du_lieu
+        thu_muc = thu_muc_tam = tempfile.mkdtemp(prefix='bench_bo_nho_')
+        df = tao_du_lieu(args.so_dong)
+        ap_kieu_ngay(df); bo_sung_cot_khong_dau(df)
+        file_moi = os.path.join(thu_muc, 'moi.parquet')
+        luu_parquet(df, file_moi); del df
+        ghi_ban_day_du(thu_muc, file_moi)
+    try:
+        mo_ban_chia_se(thu_muc)   # Dựng sẵn bản Arrow để không tính vào phép đo
+        ctx = mp.get_context('spawn')
+        print(f"RssAnon (MB, bộ nhớ riêng) sau mỗi phiên, {args.so_phien} phiên trong một tiến trình:")
+        for che_do in ('cu', 'chia_se'):
+            truoc, muc = chay(ctx, _do_phien, thu_muc, che_do, args.so_phien)
+            them = [b - a for a, b in zip([muc[0]] + muc, muc)][1:]
+            tb = sum(them) / max(len(them), 1)
+            print(f"  {che_do:<8} nạp: {muc[0] - truoc:8.1f} | mỗi phiên thêm: {tb:8.1f} | "
+                  + ' '.join(f"{m:.0f}" for m in muc))
+
+        print(f"\n{args.so_tien_trinh} tiến trình cùng mở bản Arrow (MB):")
+        rao = ctx.Barrier(args.so_tien_trinh)
+        hang_doi = ctx.Queue()
+        cac_tt = [ctx.Process(target=_doc_tien_trinh, args=(thu_muc, rao, hang_doi)) for _ in range(args.so_tien_trinh)]
+        for p in cac_tt: p.start()
+        kq = [hang_doi.get() for _ in cac_tt]
+        for p in cac_tt: p.join()
+        print(f"  {'#':<4}{'RssAnon':>10}{'RssFile':>10}{'Pss':>10}")
+        for i, (anon, file_, pss) in enumerate(kq):
+            print(f"  {i:<4}{anon:10.1f}{file_:10.1f}{pss:10.1f}")
+    finally:
+        if thu_muc_tam: shutil.rmtree(thu_muc_tam, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Đo độ trễ mỗi câu hỏi của Trợ lý ảo: cách cũ (copy + apply) so với cột không dấu tính sẵn.
+
+Chạy: python benchmarks/bench_chatbot.py --so-dong 1000000
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bhxh_du_lieu import xoa_dau_tieng_viet, bo_sung_cot_khong_dau
+from bhxh_chi_muc import dung_chi_muc, loc_theo_cau_hoi
+
+HO = ['Nguyễn', 'Trần', 'Lê', 'Phạm', 'Hoàng', 'Huỳnh', 'Phan', 'Vũ', 'Võ', 'Đặng', 'Bùi', 'Đỗ']
+DEM = ['Văn', 'Thị', 'Hữu', 'Minh', 'Ngọc', 'Thanh', 'Đức', 'Quốc', 'Thu', 'Hoài']
+TEN = ['An', 'Bình', 'Cường', 'Dũng', 'Hà', 'Lan', 'Hùng', 'Hương', 'Tuấn', 'Trang', 'Khoa', 'Nhung']
+CAU_HOI = ['tìm nguyễn văn hùng', 'tim nguoi ten tran thi lan', 'lê ngọc trang 15/03/1990', 'tìm Thu Hương', 'cho tôi đỗ đức khoa',
+           'tìm hùng nguyễn văn', 'nguyen van hngu', 'tim do duc khoa']
+
+def tao_du_lieu(so_dong, seed=0):
+    rng = np.random.default_rng(seed)
+    ho_ten = (pd.Series(rng.choice(HO, so_dong)) + ' ' + rng.choice(DEM, so_dong) + ' ' + rng.choice(TEN, so_dong))
+    ngay = pd.Timestamp('1950-01-01') + pd.to_timedelta(rng.integers(0, 25000, so_dong), unit='D')
+    return pd.DataFrame({
+        'hoTen': ho_ten,
+        'ngaySinh': ngay.strftime('%d/%m/%Y'),
+        'soBhxh': pd.Series(rng.integers(10**9, 10**10, so_dong)).astype(str),
+        'soCmnd': pd.Series(rng.integers(10**8, 10**9, so_dong)).astype(str),
+    })
+
+def cach_cu(df, prompt):
+    """Tái hiện đường xử lý cũ của hien_thi_chatbot_thong_minh (chỉ phần lọc tên)."""
+    df_res = df.copy()
+    df_res['hoTen_khongdau'] = df_res['hoTen'].apply(lambda x: xoa_dau_tieng_viet(str(x)))
+    p_clean = xoa_dau_tieng_viet(prompt)
+    for w in ["tim", "loc", "cho", "toi", "nguoi", "co", "ngay", "sinh", "ten", "la", "o", "que"]:
+        p_clean = re.sub(r'\b' + w + r'\b', ' ', p_clean)
+    ten = re.sub(r'\s+', ' ', p_clean).strip()
+    return df_res[df_res['hoTen_khongdau'].str.contains(ten)]
+
+def do(ham, lan=3):
+    thoi_gian = []
+    for _ in range(lan):
+        t = time.perf_counter(); ham(); thoi_gian.append(time.perf_counter() - t)
+    return min(thoi_gian)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--so-dong', type=int, default=1_000_000)
+    ap.add_argument('--lan', type=int, default=3)
+    args = ap.parse_args()
+
+    df = tao_du_lieu(args.so_dong)
+    t = time.perf_counter(); bo_sung_cot_khong_dau(df); t_cot = time.perf_counter() - t
+    t = time.perf_counter(); chi_muc = dung_chi_muc(df); t_chi_muc = time.perf_counter() - t
+    print(f"Số dòng: {len(df):,} | tính cột không dấu: {t_cot:.2f}s | dựng chỉ mục: {t_chi_muc:.2f}s")
+    print(f"{'Câu hỏi':<32}{'Cũ (s)':>10}{'Mới (s)':>10}{'Nhanh hơn':>12}{'KQ cũ':>9}{'KQ mới':>9}  Kết quả đầu (mới)")
+    for prompt in CAU_HOI:
+        t_cu = do(lambda: cach_cu(df, prompt), 1)
+        t_moi = do(lambda: loc_theo_cau_hoi(df, chi_muc, prompt), args.lan)
+        vi_tri = loc_theo_cau_hoi(df, chi_muc, prompt)[0]
+        dau = df['hoTen'].iloc[vi_tri[0]] if len(vi_tri) else '-'
+        print(f"{prompt:<32}{t_cu:>10.3f}{t_moi:>10.4f}{t_cu / max(t_moi, 1e-9):>11.0f}x{len(cach_cu(df, prompt)):>9,}{len(vi_tri):>9,}  {dau}")
+
+if __name__ == '__main__':
+    main()
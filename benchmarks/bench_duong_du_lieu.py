@@ -0,0 +1,231 @@
+"""Đo từng đường xử lý dữ liệu của ứng dụng (không cần giao diện) trên dữ liệu giả lập của du_lieu_mau.py.
+
+Mỗi giai đoạn gọi đúng các hàm mà trang Streamlit gọi:
+- nap_du_lieu: XLSB -> Parquet (hoặc nâng cấp cache Parquet cũ), tạo kho rồi dựng bản Arrow dùng chung
+- nap_lai:     mở lại phiên bản hiện hành (lượt chạy lại trang / tiến trình mới)
+- chi_muc:     dựng chỉ mục tìm kiếm
+- tim_nhanh:   Tìm nhanh theo mã số, ngày sinh, họ tên
+- tro_ly_ao:   lọc theo câu hỏi của Trợ lý ảo
+- loc_loi:     báo cáo chất lượng dữ liệu và lấy dòng vi phạm
+- han_bhyt:    đếm và liệt kê thẻ hết hạn / sắp hết hạn
+- bieu_do:     bảng đếm và bảng chéo của biểu đồ
+- xuat_excel:  ghi XLSX (tối đa --so-dong-xuat dòng)
+Mỗi giai đoạn in thời gian, RSS đỉnh trong giai đoạn, RSS tăng thêm và số dòng xử lý mỗi giây.
+RSS đỉnh từng giai đoạn đọc từ /proc (Linux); nơi khác chỉ có đỉnh của cả tiến trình.
+
+Lưu kết quả để so giữa các phiên bản:
+    python benchmarks/bench_duong_du_lieu.py --so-dong 100000,1000000 --ghi-json truoc.json
+    python benchmarks/bench_duong_du_lieu.py --so-dong 100000,1000000 --so-sanh truoc.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+GOC = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, GOC)
+from bhxh_du_lieu import chuyen_xlsb_sang_parquet, cot_dang_chuoi
+from bhxh_kho_du_lieu import khoi_tao_kho, ghi_ban_day_du, mo_ban_chia_se
+from bhxh_chi_muc import dung_chi_muc, loc_theo_cau_hoi, CAC_MOC_HAN
+from bhxh_chat_luong import dung_bao_cao_chat_luong
+from bhxh_tong_hop import dung_khoi_tong_hop, TINH_TRANG_HAN
+from bhxh_xuat_file import cac_lo, ghi_xlsx
+from du_lieu_mau import tao_du_lieu_mau, CAC_CO
+
+CAC_GIAI_DOAN = ['nap_du_lieu', 'nap_lai', 'chi_muc', 'tim_nhanh', 'tro_ly_ao', 'loc_loi', 'han_bhyt', 'bieu_do', 'xuat_excel']
+SO_TRUY_VAN = 200           # Số lượt tìm nhanh / câu hỏi trợ lý ảo mỗi lần đo
+SO_DONG_XUAT = 100_000
+NGUONG_CHAM_HON = 1.2       # --so-sanh đánh dấu giai đoạn chậm hơn bản trước quá tỷ lệ này
+HOM_NAY = pd.Timestamp.now().normalize()
+
+# --- ĐO BỘ NHỚ ---
+def _doc_status(truong):
+    try:
+        with open('/proc/self/status') as f:
+            for dong in f:
+                if dong.startswith(truong + ':'): return int(dong.split()[1]) / 1024
+    except OSError: pass
+    return None
+
+def rss():
+    return _doc_status('VmRSS') or 0.0
+
+def dat_lai_dinh():
+    """Đặt lại RSS đỉnh (VmHWM) về RSS hiện tại; trả về False nếu hệ điều hành không hỗ trợ."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f: f.write('5')
+        return True
+    except OSError: return False
+
+def rss_dinh():
+    return _doc_status('VmHWM') or resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# --- CÁC GIAI ĐOẠN: mỗi hàm nhận trạng thái chung, trả về số dòng đã xử lý ---
+def gd_nap_du_lieu(tt):
+    kho = os.path.join(tt['thu_muc_tam'], 'data_store')
+    if tt['nguon'] == 'xlsb':
+        file_moi = os.path.join(tt['thu_muc_tam'], 'moi.parquet')
+        chuyen_xlsb_sang_parquet(tt['file_nguon'], file_moi)
+        ghi_ban_day_du(kho, file_moi, "Khởi tạo kho")
+    else:
+        khoi_tao_kho(kho, tt['file_nguon'], os.path.join(tt['thu_muc_tam'], 'khong_co.xlsb'))
+    tt['kho'] = kho
+    tt['phien_ban'], tt['df'] = mo_ban_chia_se(kho)
+    return len(tt['df'])
+
+def gd_nap_lai(tt):
+    tt['phien_ban'], tt['df'] = mo_ban_chia_se(tt['kho'])
+    return len(tt['df'])
+
+def gd_chi_muc(tt):
+    tt['chi_muc'] = dung_chi_muc(tt['df'])
+    return len(tt['df'])
+
+def _mau(tt):
+    """Giá trị truy vấn lấy từ chính dữ liệu (cố định theo seed) để lần đo nào cũng hỏi như nhau."""
+    if 'mau' not in tt:
+        df = tt['df']; vi_tri = np.random.default_rng(1).integers(0, len(df), SO_TRUY_VAN)
+        lo = df.iloc[vi_tri]
+        tt['mau'] = {c: [str(v) for v in cot_dang_chuoi(lo, c)] for c in ('soBhxh', 'soCmnd', 'ngaySinh', 'hoTen')}
+    return tt['mau']
+
+def gd_tim_nhanh(tt):
+    df, chi_muc, mau = tt['df'], tt['chi_muc'], _mau(tt)
+    truy_van = [('soBhxh', m) for m in mau['soBhxh']] + [('soCmnd', m[:6]) for m in mau['soCmnd']] + \
+               [('ngaySinh', m) for m in mau['ngaySinh']] + [('hoTen', ' '.join(m.split()[-2:])) for m in mau['hoTen']]
+    tt['so_ket_qua'] = sum(len(chi_muc.tim(df, cot, tu_khoa)) for cot, tu_khoa in truy_van if tu_khoa)
+    return len(truy_van) * len(df)   # Số dòng mà cách quét toàn cột cũ phải đọc
+
+def gd_tro_ly_ao(tt):
+    df, chi_muc, mau = tt['df'], tt['chi_muc'], _mau(tt)
+    cau_hoi = [f"tìm {t.lower()}" for t in mau['hoTen']] + [f"{t} {n}" for t, n in zip(mau['hoTen'], mau['ngaySinh'])] + \
+              [f"cho tôi người có số {m}" for m in mau['soBhxh']]
+    tt['so_ket_qua'] = sum(len(loc_theo_cau_hoi(df, chi_muc, c)[0]) for c in cau_hoi)
+    return len(cau_hoi) * len(df)
+
+def gd_loc_loi(tt):
+    bao_cao = dung_bao_cao_chat_luong(tt['df'])
+    tt['so_ket_qua'] = sum(len(bao_cao.vi_tri(cot, loai)) for cot, loai in bao_cao.cac_luat())
+    return len(tt['df'])
+
+def gd_han_bhyt(tt):
+    chi_muc = tt['chi_muc']
+    dem = chi_muc.dem_han('hanTheDen', HOM_NAY, CAC_MOC_HAN)
+    vi_tri = np.concatenate((chi_muc.khoang_ngay('hanTheDen', den=HOM_NAY)[::-1],
+                             chi_muc.khoang_ngay('hanTheDen', HOM_NAY + pd.Timedelta(days=1), HOM_NAY + pd.Timedelta(days=max(CAC_MOC_HAN)))))
+    tt['so_ket_qua'] = len(vi_tri); tt['vi_tri_xuat'] = vi_tri
+    return len(tt['df']) if dem is not None else 0
+
+def gd_bieu_do(tt):
+    khoi = dung_khoi_tong_hop(tt['df'])
+    cac_cot = ['gioiTinh', 'maTinh', TINH_TRANG_HAN]
+    bang = [khoi.dem(c, hom_nay=HOM_NAY) for c in cac_cot] + [khoi.bang_cheo('maTinh', c, hom_nay=HOM_NAY) for c in cac_cot if c != 'maTinh']
+    tt['so_ket_qua'] = sum(len(b) for b in bang)
+    return len(tt['df'])
+
+def gd_xuat_excel(tt):
+    vi_tri = tt.get('vi_tri_xuat')
+    if vi_tri is None or len(vi_tri) < tt['so_dong_xuat']: vi_tri = np.arange(len(tt['df']))
+    vi_tri = vi_tri[:tt['so_dong_xuat']]
+    duong_dan = os.path.join(tt['thu_muc_tam'], 'xuat.xlsx')
+    ghi_xlsx(cac_lo(tt['df'], vi_tri), duong_dan)
+    tt['so_ket_qua'] = os.path.getsize(duong_dan)
+    return len(vi_tri)
+
+GIAI_DOAN = {ten: globals()[f'gd_{ten}'] for ten in CAC_GIAI_DOAN}
+
+# --- CHẠY ---
+def do_giai_doan(ten, tt):
+    tt.pop('so_ket_qua', None)
+    truoc = rss(); dat_lai_dinh()
+    bat_dau = time.perf_counter()
+    so_dong = GIAI_DOAN[ten](tt)
+    giay = time.perf_counter() - bat_dau
+    return {'giai_doan': ten, 'giay': giay, 'rss_dinh_mb': rss_dinh(), 'rss_tang_mb': rss() - truoc,
+            'so_dong': so_dong, 'dong_moi_giay': so_dong / max(giay, 1e-9), 'so_ket_qua': tt.get('so_ket_qua')}
+
+def chay_mot_co(file_nguon, nguon, cac_giai_doan, so_dong_xuat):
+    """Chạy các giai đoạn theo thứ tự trên một kho tạm mới; các giai đoạn sau dùng kết quả giai đoạn trước."""
+    thu_muc_tam = tempfile.mkdtemp(prefix='bench_duong_du_lieu_')
+    tt = {'thu_muc_tam': thu_muc_tam, 'nguon': nguon, 'so_dong_xuat': so_dong_xuat, 'file_nguon': file_nguon}
+    if nguon == 'parquet':   # khoi_tao_kho xóa cache cũ sau khi nâng cấp, nên dùng bản sao
+        tt['file_nguon'] = os.path.join(thu_muc_tam, 'bhxh_cache.parquet'); shutil.copyfile(file_nguon, tt['file_nguon'])
+    can = set(cac_giai_doan)
+    if can & {'tim_nhanh', 'tro_ly_ao', 'han_bhyt'}: can.add('chi_muc')
+    can.add('nap_du_lieu')
+    try:
+        return [do_giai_doan(ten, tt) for ten in CAC_GIAI_DOAN if ten in can]
+    finally:
+        tt.clear()
+        shutil.rmtree(thu_muc_tam, ignore_errors=True)
+
+def trung_vi(cac_lan):
+    """Gộp nhiều lần chạy: trung vị thời gian, RSS đỉnh lớn nhất."""
+    kq = []
+    for cac_do in zip(*cac_lan):
+        giay = float(np.median([d['giay'] for d in cac_do]))
+        kq.append({**cac_do[0], 'giay': giay, 'dong_moi_giay': cac_do[0]['so_dong'] / max(giay, 1e-9),
+                   'rss_dinh_mb': max(d['rss_dinh_mb'] for d in cac_do), 'cac_lan_giay': [d['giay'] for d in cac_do]})
+    return kq
+
+def phien_ban_ma_nguon():
+    try: return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=GOC, capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError): return None
+
+def in_bang(so_dong, nguon, ket_qua, truoc=None):
+    print(f"\n== {so_dong:,} dòng, nguồn {nguon} ==")
+    print(f"{'Giai đoạn':<14}{'Giây':>10}{'RSS đỉnh MB':>13}{'RSS tăng MB':>13}{'Dòng/giây':>16}" + (f"{'So với trước':>15}" if truoc is not None else ''))
+    for d in ket_qua:
+        dong = f"{d['giai_doan']:<14}{d['giay']:>10.3f}{d['rss_dinh_mb']:>13.0f}{d['rss_tang_mb']:>13.0f}{d['dong_moi_giay']:>16,.0f}"
+        cu = (truoc or {}).get((so_dong, nguon, d['giai_doan']))
+        if cu:
+            ty_le = d['giay'] / max(cu['giay'], 1e-9)
+            dong += f"{ty_le:>14.2f}x" + ('  CHẬM HƠN' if ty_le > NGUONG_CHAM_HON else '')
+        print(dong)
+
+def main():
+    ap = argparse.ArgumentParser(description="Đo các đường xử lý dữ liệu trên dữ liệu giả lập")
+    ap.add_argument('--so-dong', type=lambda s: [int(x) for x in s.split(',')], default=CAC_CO[:2], help='Một hoặc nhiều cỡ, cách nhau bởi dấu phẩy')
+    ap.add_argument('--nguon', choices=['parquet', 'xlsb'], default='parquet', help='Đầu vào của giai đoạn nap_du_lieu')
+    ap.add_argument('--thu-muc-du-lieu', default=os.path.join(GOC, 'du_lieu_mau'), help='Nơi giữ dữ liệu giả lập (sinh một lần, dùng lại)')
+    ap.add_argument('--giai-doan', type=lambda s: s.split(','), default=CAC_GIAI_DOAN, help='Chỉ chạy các giai đoạn này (cách nhau bởi dấu phẩy)')
+    ap.add_argument('--lan', type=int, default=1, help='Số lần chạy mỗi cỡ, lấy trung vị thời gian')
+    ap.add_argument('--so-dong-xuat', type=int, default=SO_DONG_XUAT)
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--ghi-json', help='Lưu kết quả ra file JSON')
+    ap.add_argument('--so-sanh', help='File JSON của lần chạy trước để so thời gian')
+    args = ap.parse_args()
+    sai = [g for g in args.giai_doan if g not in GIAI_DOAN]
+    if sai: ap.error(f"Giai đoạn không có: {', '.join(sai)} (chọn trong {', '.join(CAC_GIAI_DOAN)})")
+
+    truoc = None
+    if args.so_sanh:
+        with open(args.so_sanh, encoding='utf-8') as f: cu = json.load(f)
+        truoc = {(k['so_dong'], k['nguon'], d['giai_doan']): d for k in cu['ket_qua'] for d in k['giai_doan']}
+        print(f"So với {args.so_sanh} (mã nguồn {cu.get('ma_nguon') or '?'}, {cu.get('thoi_diem')})")
+    if not dat_lai_dinh(): print("Không đặt lại được RSS đỉnh (/proc/self/clear_refs): cột RSS đỉnh là đỉnh của cả tiến trình.")
+
+    bao_cao = {'ma_nguon': phien_ban_ma_nguon(), 'thoi_diem': time.strftime('%Y-%m-%d %H:%M:%S'),
+               'may': {'python': platform.python_version(), 'pandas': pd.__version__, 'cpu': os.cpu_count(), 'he_dieu_hanh': platform.platform()},
+               'ket_qua': []}
+    for so_dong in args.so_dong:
+        file_nguon = tao_du_lieu_mau(so_dong, args.thu_muc_du_lieu, args.seed, xlsb=args.nguon == 'xlsb', parquet=args.nguon == 'parquet')[args.nguon]
+        ket_qua = trung_vi([chay_mot_co(file_nguon, args.nguon, args.giai_doan, args.so_dong_xuat) for _ in range(max(args.lan, 1))])
+        so_dong_that = ket_qua[0]['so_dong']   # XLSB bị cắt ở giới hạn dòng của Excel
+        in_bang(so_dong_that, args.nguon, ket_qua, truoc)
+        bao_cao['ket_qua'].append({'so_dong': so_dong_that, 'nguon': args.nguon, 'giai_doan': ket_qua})
+    if args.ghi_json:
+        with open(args.ghi_json, 'w', encoding='utf-8') as f: json.dump(bao_cao, f, ensure_ascii=False, indent=1)
+        print(f"\nĐã lưu {args.ghi_json}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Đo tốc độ tạo phiếu Word (phiếu/giây): python-docx từng phiếu so với phiếu mẫu + nhiều tiến trình.
+
+Chạy: python benchmarks/bench_phieu_word.py --so-phieu 5000 --so-tien-trinh 4
+"""
+import argparse
+import multiprocessing as mp
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bhxh_du_lieu import luu_parquet, ap_kieu_ngay, dang_hien_thi
+from bhxh_kho_du_lieu import mo_ban_chia_se, ghi_ban_day_du, duong_dan_ban_chia_se
+from bhxh_xuat_file import tao_phieu_word, tao_phieu_hang_loat
+
+COT_PHIEU = ['hoTen', 'ngaySinh', 'soBhxh', 'hanTheDen', 'soCmnd', 'soDienThoai', 'diaChiLh', 'VSS_EMAIL']
+
+def rss_dinh():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--so-phieu', type=int, default=5000)
+    ap.add_argument('--so-tien-trinh', type=int, default=os.cpu_count() or 2)
+    ap.add_argument('--mau-cu', type=int, default=200, help='Số phiếu đo theo cách cũ (chậm)')
+    args = ap.parse_args()
+
+    from bench_chatbot import tao_du_lieu
+    thu_muc = tempfile.mkdtemp(prefix='bench_phieu_')
+    try:
+        df = tao_du_lieu(args.so_phieu); ap_kieu_ngay(df)
+        luu_parquet(df, os.path.join(thu_muc, 'moi.parquet'))
+        ghi_ban_day_du(thu_muc, os.path.join(thu_muc, 'moi.parquet'))
+        phien_ban, df = mo_ban_chia_se(thu_muc)
+        file_arrow = duong_dan_ban_chia_se(thu_muc, phien_ban)
+        vi_tri = df.index.to_numpy()
+
+        print(f"{'Cách tạo':<40}{'Số phiếu':>10}{'Giây':>9}{'Phiếu/giây':>12}{'RSS đỉnh MB':>13}")
+        t = time.perf_counter()
+        for _, row in dang_hien_thi(df.head(args.mau_cu)).iterrows(): tao_phieu_word(row, COT_PHIEU)
+        giay = time.perf_counter() - t
+        print(f"{'Cũ: Document() mỗi phiếu':<40}{args.mau_cu:>10,}{giay:>9.2f}{args.mau_cu / giay:>12,.0f}{rss_dinh():>13.0f}")
+
+        for kieu in ('zip', 'docx_gop'):
+            tk = tao_phieu_hang_loat(file_arrow, vi_tri, COT_PHIEU, os.path.join(thu_muc, f'ra.{kieu}'), kieu)
+            print(f"{f'Mẫu, 1 tiến trình ({kieu})':<40}{tk['so_phieu']:>10,}{tk['giay']:>9.2f}{tk['phieu_moi_giay']:>12,.0f}{rss_dinh():>13.0f}")
+            with ProcessPoolExecutor(args.so_tien_trinh, mp_context=mp.get_context('spawn')) as pool:
+                list(pool.map(abs, range(args.so_tien_trinh)))   # Khởi động tiến trình trước khi đo
+                tk = tao_phieu_hang_loat(file_arrow, vi_tri, COT_PHIEU, os.path.join(thu_muc, f'ra.{kieu}'), kieu,
+                                         pool=pool, cua_so=2 * args.so_tien_trinh)
+            ten = f'Mẫu, {args.so_tien_trinh} tiến trình ({kieu})'
+            print(f"{ten:<40}{tk['so_phieu']:>10,}{tk['giay']:>9.2f}{tk['phieu_moi_giay']:>12,.0f}{rss_dinh():>13.0f}")
+    finally:
+        shutil.rmtree(thu_muc, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+"""Sinh dữ liệu BHXH giả lập (cùng tên cột và các kiểu giá trị bẩn hay gặp) để đo hiệu năng mà không cần dữ liệu thật.
+
+Ghi ra hai dạng:
+- XLSB: đầu vào thật của ứng dụng (chuyen_xlsb_sang_parquet). Mọi ô chuỗi nằm trong bảng chuỗi dùng
+  chung như file Excel lưu ra; một số mã số / ngày được ghi thành ô số như khi người nhập gõ vào Excel.
+  Excel giới hạn 1.048.576 dòng mỗi sheet và ứng dụng chỉ đọc sheet đầu, nên phần vượt quá bị cắt.
+- Parquet: cùng nội dung ở dạng chuỗi như pd.read_excel(dtype=str) (đường "cache Parquet cũ" của khoi_tao_kho).
+
+File XLSB chỉ gồm các phần pyxlsb cần (workbook, một sheet, bảng chuỗi), không có styles.bin.
+
+Chạy: python benchmarks/du_lieu_mau.py --so-dong 1000000 --thu-muc du_lieu_mau
+"""
+import argparse
+import os
+import struct
+import sys
+import tempfile
+import time
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bhxh_du_lieu import xoa_dau_tieng_viet, CHUOI_O_TRONG
+
+COT = ['hoTen', 'ngaySinh', 'gioiTinh', 'soBhxh', 'soCmnd', 'soDienThoai', 'diaChiLh', 'maTinh', 'hanTheDen', 'VSS_EMAIL']
+SO_DONG_MOI_KHOI = 100_000
+SO_DONG_TOI_DA_XLSB = 1_048_575   # Trừ dòng tiêu đề
+CAC_CO = [100_000, 1_000_000, 5_000_000]
+
+# Họ theo tỷ lệ gần đúng trong dân số; tên đệm / tên phổ biến
+HO = {'Nguyễn': 38, 'Trần': 11, 'Lê': 9.5, 'Phạm': 7, 'Hoàng': 5.1, 'Huỳnh': 5.1, 'Phan': 4.5, 'Vũ': 3.9, 'Võ': 3.9, 'Đặng': 2.1,
+      'Bùi': 2, 'Đỗ': 1.4, 'Hồ': 1.3, 'Ngô': 1.3, 'Dương': 1, 'Lý': 0.5, 'Đinh': 0.5, 'Trương': 0.5, 'Lương': 0.4, 'Mai': 0.3}
+DEM_NAM = ['Văn', 'Hữu', 'Đức', 'Minh', 'Quốc', 'Thanh', 'Công', 'Xuân', 'Quang', 'Ngọc', 'Đình', 'Anh']
+DEM_NU = ['Thị', 'Ngọc', 'Thu', 'Thanh', 'Minh', 'Hoài', 'Kim', 'Phương', 'Mai', 'Thùy', 'Bích', 'Hồng']
+TEN_NAM = ['An', 'Bình', 'Cường', 'Dũng', 'Đạt', 'Hùng', 'Huy', 'Khoa', 'Long', 'Nam', 'Phúc', 'Quân', 'Sơn', 'Thắng', 'Tuấn', 'Việt', 'Vinh', 'Hải', 'Trung', 'Kiên']
+TEN_NU = ['Anh', 'Chi', 'Dung', 'Giang', 'Hà', 'Hạnh', 'Hương', 'Lan', 'Linh', 'Mai', 'Ngân', 'Nhung', 'Oanh', 'Phương', 'Quỳnh', 'Thảo', 'Trang', 'Vân', 'Yến', 'Hằng']
+TINH = {'01': 'Hà Nội', '79': 'TP. Hồ Chí Minh', '31': 'Hải Phòng', '48': 'Đà Nẵng', '92': 'Cần Thơ', '38': 'Thanh Hóa', '40': 'Nghệ An',
+        '27': 'Bắc Ninh', '34': 'Thái Bình', '36': 'Nam Định', '74': 'Bình Dương', '75': 'Đồng Nai', '46': 'Thừa Thiên Huế', '66': 'Đắk Lắk',
+        '22': 'Quảng Ninh', '56': 'Khánh Hòa', '87': 'Đồng Tháp', '89': 'An Giang', '91': 'Kiên Giang', '26': 'Vĩnh Phúc'}
+DUONG = ['Lê Lợi', 'Trần Hưng Đạo', 'Nguyễn Trãi', 'Hai Bà Trưng', 'Lý Thường Kiệt', 'Quang Trung', 'Hùng Vương', 'Điện Biên Phủ', 'Phan Chu Trinh', 'Lê Duẩn']
+PHUONG = ['Phường 1', 'Phường 3', 'Phường Tân Định', 'Xã Tân Lập', 'Xã Hòa Bình', 'Thị trấn Phú Xuyên', 'Phường Trung Hòa', 'Xã Đông Hải', 'Phường Bến Nghé', 'Xã An Phú']
+MIEN_EMAIL = ['gmail.com', 'yahoo.com', 'outlook.com', 'baohiemxahoi.gov.vn']
+GIU_CHO = ['nan', 'None', 'null', '0', ' ']
+NGAY_EXCEL_GOC = np.datetime64('1899-12-30')
+
+def _chon(rng, mang, n, p=None):
+    mang = np.asarray(mang, dtype=object)
+    return mang[rng.choice(len(mang), n, p=p)]
+
+def _noi(*cac_phan):
+    """Nối từng phần tử của các mảng chuỗi (hoặc chuỗi đơn) thành một mảng object."""
+    kq = pd.Series(cac_phan[0] if not isinstance(cac_phan[0], str) else [cac_phan[0]] * len(cac_phan[1]), dtype='string')
+    for phan in cac_phan[1:]: kq = kq + (phan if isinstance(phan, str) else pd.Series(phan, dtype='string').to_numpy())
+    return kq.to_numpy(dtype=object)
+
+def _chu_so(rng, n, so_chu_so):
+    """Chuỗi toàn chữ số có đúng so_chu_so ký tự (có thể bắt đầu bằng 0)."""
+    return pd.Series(rng.integers(0, 10 ** so_chu_so, n, dtype=np.int64)).astype(str).str.zfill(so_chu_so).to_numpy(dtype=object)
+
+def _ty_le(rng, n, p):
+    return rng.random(n) < p
+
+def _ngay(rng, ngay, ty_le_ban):
+    """Ngày dd/mm/yyyy kèm các kiểu nhập sai: không đệm 0, ISO, số serial Excel, chỉ có năm, chữ, trống."""
+    ngay = pd.DatetimeIndex(ngay)
+    kq = ngay.strftime('%d/%m/%Y').to_numpy(dtype=object)
+    n = len(kq); loai = rng.random(n)
+    if ty_le_ban:
+        m = loai < ty_le_ban * 0.35; kq[m] = [f"{d.day}/{d.month}/{d.year}" for d in ngay[m]]
+        m = (loai >= ty_le_ban * 0.35) & (loai < ty_le_ban * 0.55); kq[m] = ngay[m].strftime('%Y-%m-%d').to_numpy(dtype=object)
+        m = (loai >= ty_le_ban * 0.55) & (loai < ty_le_ban * 0.75)   # Ô ngày kiểu số của Excel
+        kq[m] = ((ngay[m].to_numpy(dtype='datetime64[D]') - NGAY_EXCEL_GOC) // np.timedelta64(1, 'D')).astype(float)
+        m = (loai >= ty_le_ban * 0.75) & (loai < ty_le_ban * 0.85); kq[m] = ngay[m].strftime('%Y').to_numpy(dtype=object)
+        m = (loai >= ty_le_ban * 0.85) & (loai < ty_le_ban * 0.93); kq[m] = _chon(rng, ['khong ro', 'chưa rõ', '00/00/0000'], int(m.sum()))
+        m = (loai >= ty_le_ban * 0.93) & (loai < ty_le_ban); kq[m] = None
+    return kq
+
+def tao_khoi(so_dong, rng, dau=0, hom_nay=None):
+    """Một khối dữ liệu thô: DataFrame object, ô là chuỗi, số thực (ô số của Excel) hoặc None (ô trống)."""
+    n = so_dong
+    hom_nay = pd.Timestamp(hom_nay or pd.Timestamp.now()).normalize()
+    nam = _ty_le(rng, n, 0.5)
+    ho = _chon(rng, list(HO), n, np.array(list(HO.values())) / sum(HO.values()))
+    dem = np.where(nam, _chon(rng, DEM_NAM, n), _chon(rng, DEM_NU, n))
+    ten = np.where(nam, _chon(rng, TEN_NAM, n), _chon(rng, TEN_NU, n))
+    ho_ten = _noi(ho, ' ', dem, ' ', ten)
+    m = _ty_le(rng, n, 0.15); ho_ten[m] = _noi(ho[m], ' ', dem[m], ' ', _chon(rng, DEM_NAM + DEM_NU, int(m.sum())), ' ', ten[m])   # Tên 4 chữ
+    m = _ty_le(rng, n, 0.01); ho_ten[m] = [s.upper() for s in ho_ten[m]]
+    m = _ty_le(rng, n, 0.01); ho_ten[m] = [' ' + s.replace(' ', '  ') + ' ' for s in ho_ten[m]]
+    m = _ty_le(rng, n, 0.005); ho_ten[m] = [xoa_dau_tieng_viet(s).title() for s in ho_ten[m]]
+    m = _ty_le(rng, n, 0.003); ho_ten[m] = None
+
+    ngay_sinh = np.datetime64('1940-01-01') + rng.integers(0, int((hom_nay - pd.Timestamp('1940-01-01')).days), n).astype('timedelta64[D]')
+    ngay_sinh = _ngay(rng, ngay_sinh, 0.04)
+    m = _ty_le(rng, n, 0.002); ngay_sinh[m] = _noi(_chon(rng, ['01/01/'], int(m.sum())), _chon(rng, ['1800', '2099', '3000'], int(m.sum())))
+
+    gioi_tinh = np.where(nam, 'Nam', 'Nữ').astype(object)
+    m = _ty_le(rng, n, 0.01); gioi_tinh[m] = _chon(rng, ['nam', 'NỮ', 'Nu', 'nữ ', 'Khác'], int(m.sum()))
+    m = _ty_le(rng, n, 0.005); gioi_tinh[m] = None
+
+    ma_tinh = _chon(rng, list(TINH), n)
+    so_bhxh = _noi(ma_tinh, _chu_so(rng, n, 8))
+    m = _ty_le(rng, n, 0.005) & (np.arange(n) > 0)   # Trùng mã với một dòng trước đó
+    so_bhxh[m] = so_bhxh[(rng.random(int(m.sum())) * np.flatnonzero(m)).astype(np.int64)]
+    m = _ty_le(rng, n, 0.003); so_bhxh[m] = _chu_so(rng, int(m.sum()), 9)
+    m = _ty_le(rng, n, 0.003); so_bhxh[m] = [' ' + s + ' ' for s in so_bhxh[m]]
+    m = _ty_le(rng, n, 0.004); so_bhxh[m] = [float(s) for s in so_bhxh[m]]   # Ô số: mất số 0 đầu
+    m = _ty_le(rng, n, 0.002); so_bhxh[m] = None
+
+    cccd = _ty_le(rng, n, 0.7)
+    so_cmnd = np.where(cccd, _noi(_chon(rng, ['0'], n), ma_tinh, _chu_so(rng, n, 9)), _chu_so(rng, n, 9)).astype(object)
+    m = _ty_le(rng, n, 0.003); so_cmnd[m] = [float(s) for s in so_cmnd[m]]
+    m = _ty_le(rng, n, 0.02); so_cmnd[m] = _chon(rng, GIU_CHO + [None, None], int(m.sum()))
+
+    dien_thoai = _noi(_chon(rng, ['09', '03', '07', '08', '05'], n), _chu_so(rng, n, 8))
+    loai = rng.random(n)
+    m = loai < 0.03; dien_thoai[m] = [f"{s[:4]} {s[4:7]} {s[7:]}" for s in dien_thoai[m]]
+    m = (loai >= 0.03) & (loai < 0.05); dien_thoai[m] = [f"{s[:4]}.{s[4:7]}.{s[7:]}" for s in dien_thoai[m]]
+    m = (loai >= 0.05) & (loai < 0.07); dien_thoai[m] = ['+84' + s[1:] for s in dien_thoai[m]]
+    m = (loai >= 0.07) & (loai < 0.09); dien_thoai[m] = [float(s) for s in dien_thoai[m]]
+    m = (loai >= 0.09) & (loai < 0.10); dien_thoai[m] = [s[:-2] for s in dien_thoai[m]]
+    m = (loai >= 0.10) & (loai < 0.18); dien_thoai[m] = _chon(rng, GIU_CHO + [None] * 5, int(m.sum()))
+
+    dia_chi = _noi('Số ', rng.integers(1, 500, n).astype(str).astype(object), ' ', _chon(rng, DUONG, n), ', ', _chon(rng, PHUONG, n), ', ',
+                   np.array([TINH[t] for t in ma_tinh], dtype=object))
+    m = _ty_le(rng, n, 0.02); dia_chi[m] = None
+
+    ma_tinh = ma_tinh.copy()
+    m = _ty_le(rng, n, 0.01); ma_tinh[m] = [float(t) for t in ma_tinh[m]]   # '01' gõ thành số 1
+
+    han = np.datetime64(hom_nay.date()) + rng.integers(-730, 730, n).astype('timedelta64[D]')
+    han = _ngay(rng, han, 0.03)
+    m = _ty_le(rng, n, 0.03); han[m] = None
+
+    email = np.full(n, None, dtype=object)
+    co = _ty_le(rng, n, 0.4); k = int(co.sum())
+    ten_khong_dau = [xoa_dau_tieng_viet(str(s)).replace(' ', '') for s in ho_ten[co]]
+    email[co] = _noi(np.array(ten_khong_dau, dtype=object), rng.integers(1, 999, k).astype(str).astype(object), '@', _chon(rng, MIEN_EMAIL, k))
+    m = co & _ty_le(rng, n, 0.03); email[m] = [s.split('.')[0] if i % 2 else s.replace('@', ' ') for i, s in enumerate(email[m])]
+
+    return pd.DataFrame({'hoTen': ho_ten, 'ngaySinh': ngay_sinh, 'gioiTinh': gioi_tinh, 'soBhxh': so_bhxh, 'soCmnd': so_cmnd,
+                         'soDienThoai': dien_thoai, 'diaChiLh': dia_chi, 'maTinh': ma_tinh, 'hanTheDen': han, 'VSS_EMAIL': email},
+                        index=pd.RangeIndex(dau, dau + n))
+
+def cac_khoi(so_dong, seed=0, so_dong_moi_khoi=SO_DONG_MOI_KHOI, hom_nay=None):
+    rng = np.random.default_rng(seed)
+    for dau in range(0, so_dong, so_dong_moi_khoi):
+        yield tao_khoi(min(so_dong_moi_khoi, so_dong - dau), rng, dau, hom_nay)
+
+def dang_chuoi(khoi):
+    """Khối thô -> chuỗi như khi đọc file Excel bằng pd.read_excel(dtype=str) (ô số nguyên mất phần .0)."""
+    def o(v):
+        if v is None or v != v: return None   # Ô trống (None / NaN)
+        if isinstance(v, float): return str(int(v)) if v.is_integer() else str(v)
+        return None if v in CHUOI_O_TRONG else v
+    return pd.DataFrame({c: pd.array([o(v) for v in khoi[c]], dtype='string') for c in khoi.columns})
+
+# --- GHI XLSB ---
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.bin" ContentType="application/vnd.ms-excel.sheet.binary.macroEnabled.main"/>'
+    '<Override PartName="/xl/worksheets/sheet1.bin" ContentType="application/vnd.ms-excel.worksheet"/>'
+    '<Override PartName="/xl/sharedStrings.bin" ContentType="application/vnd.ms-excel.sharedStrings"/>'
+    '</Types>')
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.bin"/>'
+    '</Relationships>')
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.bin"/>'
+    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" Target="sharedStrings.bin"/>'
+    '</Relationships>')
+_DONG = struct.Struct('<IIH3sI')   # BrtRowHdr: số dòng, kiểu, chiều cao, cờ, số khoảng cột
+_O_CHUOI = struct.Struct('<III')   # BrtCellIsst: cột, kiểu, chỉ số trong bảng chuỗi
+_O_SO = struct.Struct('<IId')      # BrtCellReal: cột, kiểu, giá trị
+
+def _ban_ghi(ma, du_lieu=b''):
+    """Bản ghi BIFF12: mã bản ghi (1-2 byte) + độ dài dạng varint + dữ liệu."""
+    dau = ma.to_bytes(2 if ma > 0x7F else 1, 'little')
+    n, do_dai = len(du_lieu), bytearray()
+    while True:
+        b = n & 0x7F; n >>= 7
+        do_dai.append(b | (0x80 if n else 0))
+        if not n: break
+    return dau + bytes(do_dai) + du_lieu
+
+def _chuoi_rong(s):
+    ma = s.encode('utf-16-le')
+    return struct.pack('<I', len(ma) // 2) + ma
+
+class GhiXlsb:
+    """Ghi XLSB theo từng khối dòng với bộ nhớ cố định.
+
+    Dòng của sheet và bảng chuỗi được ghi ra hai file tạm rồi mới đóng gói zip. Chuỗi lặp lại nhiều
+    (giới tính, mã tỉnh, ...) dùng chung một mục; bảng tra chuỗi được làm rỗng khi quá lớn, chuỗi gặp
+    lại sau đó chỉ thành mục mới (bảng chuỗi có mục trùng vẫn hợp lệ).
+    """
+    SO_CHUOI_NHO_TOI_DA = 200_000
+
+    def __init__(self, duong_dan, tieu_de):
+        self.duong_dan, self.so_cot = duong_dan, len(tieu_de)
+        self._sheet, self._bang_chuoi = tempfile.TemporaryFile(), tempfile.TemporaryFile()
+        self._tra_chuoi, self._so_muc, self._tong_chuoi, self._dong = {}, 0, 0, 0
+        self.ghi_dong(tieu_de)
+
+    def _ma_chuoi(self, s):
+        k = self._tra_chuoi.get(s)
+        if k is None:
+            if len(self._tra_chuoi) >= self.SO_CHUOI_NHO_TOI_DA: self._tra_chuoi.clear()
+            k = self._tra_chuoi[s] = self._so_muc; self._so_muc += 1
+            self._bang_chuoi.write(_ban_ghi(0x13, b'\x00' + _chuoi_rong(s)))
+        return k
+
+    def ghi_dong(self, dong):
+        ra = [b'\x00\x11' + _DONG.pack(self._dong, 0, 300, b'\x00\x00\x00', 0)]
+        for c, v in enumerate(dong):
+            if v is None or v == '' or v != v: continue   # v != v: NaN
+            if isinstance(v, str):
+                self._tong_chuoi += 1
+                ra.append(b'\x07\x0c' + _O_CHUOI.pack(c, 0, self._ma_chuoi(v)))
+            else: ra.append(b'\x05\x10' + _O_SO.pack(c, 0, float(v)))
+        self._sheet.write(b''.join(ra)); self._dong += 1
+
+    def ghi_khoi(self, khoi):
+        for dong in khoi.itertuples(index=False, name=None): self.ghi_dong(dong)
+
+    @property
+    def so_dong_du_lieu(self):
+        return self._dong - 1
+
+    def dong(self):
+        file_tam = f"{self.duong_dan}.{os.getpid()}.tmp"
+        try:
+            with zipfile.ZipFile(file_tam, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+                zf.writestr('[Content_Types].xml', _CONTENT_TYPES)
+                zf.writestr('_rels/.rels', _RELS)
+                zf.writestr('xl/_rels/workbook.bin.rels', _WORKBOOK_RELS)
+                zf.writestr('xl/workbook.bin', b''.join([
+                    _ban_ghi(0x0183), _ban_ghi(0x018F),
+                    _ban_ghi(0x019C, struct.pack('<II', 0, 1) + _chuoi_rong('rId1') + _chuoi_rong('Sheet1')),
+                    _ban_ghi(0x0190), _ban_ghi(0x0184)]))
+                for ten, dau, cuoi, nguon in [
+                        ('xl/worksheets/sheet1.bin',
+                         _ban_ghi(0x0181) + _ban_ghi(0x0194, struct.pack('<IIII', 0, self._dong - 1, 0, max(self.so_cot - 1, 0))) + _ban_ghi(0x0191),
+                         _ban_ghi(0x0192) + _ban_ghi(0x0182), self._sheet),
+                        ('xl/sharedStrings.bin', _ban_ghi(0x019F, struct.pack('<II', self._tong_chuoi, self._so_muc)), _ban_ghi(0x01A0), self._bang_chuoi)]:
+                    nguon.seek(0)
+                    with zf.open(ten, 'w', force_zip64=True) as f:
+                        f.write(dau)
+                        while True:
+                            khoi = nguon.read(1 << 20)
+                            if not khoi: break
+                            f.write(khoi)
+                        f.write(cuoi)
+            os.replace(file_tam, self.duong_dan)
+        finally:
+            self._sheet.close(); self._bang_chuoi.close()
+            if os.path.exists(file_tam): os.remove(file_tam)
+
+def tao_du_lieu_mau(so_dong, thu_muc, seed=0, xlsb=True, parquet=True, hom_nay=None, bao_tien_do=print):
+    """Ghi bhxh_<so_dong>.xlsb và bhxh_<so_dong>.parquet vào thu_muc (bỏ qua file đã có). Trả về {dạng: đường dẫn}."""
+    os.makedirs(thu_muc, exist_ok=True)
+    file_xlsb = os.path.join(thu_muc, f"bhxh_{so_dong}.xlsb")
+    file_parquet = os.path.join(thu_muc, f"bhxh_{so_dong}.parquet")
+    xlsb = xlsb and not os.path.exists(file_xlsb)
+    parquet = parquet and not os.path.exists(file_parquet)
+    if xlsb and so_dong > SO_DONG_TOI_DA_XLSB and bao_tien_do:
+        bao_tien_do(f"XLSB chỉ chứa {SO_DONG_TOI_DA_XLSB:,} dòng đầu (giới hạn một sheet Excel).")
+    ghi_xlsb = GhiXlsb(file_xlsb, COT) if xlsb else None
+    ghi_parquet = None; file_parquet_tam = f"{file_parquet}.{os.getpid()}.tmp"
+    bat_dau = time.perf_counter()
+    try:
+        if xlsb or parquet:
+            for khoi in cac_khoi(so_dong, seed, hom_nay=hom_nay):
+                if ghi_xlsb is not None and ghi_xlsb.so_dong_du_lieu < SO_DONG_TOI_DA_XLSB:
+                    ghi_xlsb.ghi_khoi(khoi.iloc[:SO_DONG_TOI_DA_XLSB - ghi_xlsb.so_dong_du_lieu])
+                if parquet:
+                    bang = pa.Table.from_pandas(dang_chuoi(khoi), preserve_index=False)
+                    if ghi_parquet is None: ghi_parquet = pq.ParquetWriter(file_parquet_tam, bang.schema)
+                    ghi_parquet.write_table(bang)
+                if bao_tien_do: bao_tien_do(f"  {khoi.index[-1] + 1:,}/{so_dong:,} dòng ({time.perf_counter() - bat_dau:.0f}s)")
+        if ghi_xlsb is not None: ghi_xlsb.dong(); ghi_xlsb = None
+        if ghi_parquet is not None: ghi_parquet.close(); ghi_parquet = None; os.replace(file_parquet_tam, file_parquet)
+    finally:
+        if ghi_parquet is not None: ghi_parquet.close()
+        if os.path.exists(file_parquet_tam): os.remove(file_parquet_tam)
+    return {'xlsb': file_xlsb, 'parquet': file_parquet}
+
+def main():
+    ap = argparse.ArgumentParser(description="Sinh dữ liệu BHXH giả lập")
+    ap.add_argument('--so-dong', type=lambda s: [int(x) for x in s.split(',')], default=CAC_CO, help='Một hoặc nhiều cỡ, cách nhau bởi dấu phẩy')
+    ap.add_argument('--thu-muc', default='du_lieu_mau')
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--dang', choices=['ca_hai', 'xlsb', 'parquet'], default='ca_hai')
+    args = ap.parse_args()
+    for so_dong in args.so_dong:
+        print(f"Sinh {so_dong:,} dòng...")
+        for dang, duong_dan in tao_du_lieu_mau(so_dong, args.thu_muc, args.seed, args.dang != 'parquet', args.dang != 'xlsb').items():
+            if os.path.exists(duong_dan): print(f"  {dang}: {duong_dan} ({os.path.getsize(duong_dan) / 2**20:,.1f} MB)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+"""API tra cứu theo lô chạy cạnh giao diện Streamlit.
+
+Các hệ thống nội bộ gửi cả danh sách số BHXH (hàng chục nghìn mã mỗi yêu cầu), cặp họ tên + ngày
+sinh, hoặc hỏi trạng thái hạn thẻ, thay vì gõ từng mã vào trang web. API mở cùng bản Arrow ánh xạ
+bộ nhớ của phiên bản hiện hành (dùng chung trang nhớ với các phiên Streamlit) và dựng cùng chỉ mục
+tìm kiếm, nên không có bản sao dữ liệu thứ hai. Kết quả trả về dạng luồng theo từng khối dòng:
+JSON lines (mặc định) hoặc Arrow IPC stream (?dinh_dang=arrow). Xác thực HTTP Basic bằng chính
+tài khoản trong users.json.
+
+Chạy: python bhxh_api.py --cong 8502
+"""
+import argparse
+import base64
+import binascii
+import io
+import json
+import re
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import uvicorn
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from bhxh_chi_muc import dung_chi_muc, CAC_MOC_HAN
+from bhxh_du_lieu import cot_dang_chuoi, la_cot_phu, ten_cot_goc, xoa_dau_tieng_viet, DINH_DANG_NGAY
+from bhxh_kho_du_lieu import mo_ban_chia_se, phien_ban
+from bhxh_nguoi_dung import KhoNguoiDung
+from bhxh_nhat_ky import BoGhiNhatKy
+
+DATA_DIR = 'data_store'
+USER_DB_FILE = 'users.json'
+LOG_DIR = 'nhat_ky'
+CONG_MAC_DINH = 8502
+COT_TRA_VE = ['soBhxh', 'hoTen', 'ngaySinh', 'gioiTinh', 'soCmnd', 'maTinh', 'hanTheDen']   # Cột mặc định của mỗi dòng kết quả
+SO_DONG_MOI_KHOI = 5000      # Số dòng mỗi khối khi trả kết quả dạng luồng
+SO_MA_TOI_DA = 500_000       # Số mã / cặp tối đa trong một yêu cầu
+SO_KET_QUA_MOI_CAP = 3       # Số hồ sơ tối đa cho mỗi cặp họ tên + ngày sinh
+NGUONG_DIEM = 0.75           # Điểm họ tên tối thiểu để coi là khớp
+SO_NGAY_SAP_HET = 30
+CHU_KY_KIEM_TRA = 2.0        # Giây giữa hai lần xem manifest có phiên bản mới chưa
+
+class DuLieuApi:
+    """Phiên bản dữ liệu hiện hành cùng chỉ mục; tự chuyển sang phiên bản mới khi kho được cập nhật."""
+    def __init__(self, thu_muc, chu_ky_kiem_tra=CHU_KY_KIEM_TRA):
+        self.thu_muc, self.chu_ky_kiem_tra = thu_muc, chu_ky_kiem_tra
+        self._khoa = threading.Lock()
+        self._hien_hanh = None      # (phien_ban, df, chi_muc, nhan_ngay)
+        self._lan_kiem_tra = 0.0
+
+    def hien_hanh(self):
+        bay_gio = time.monotonic()
+        if self._hien_hanh is not None and bay_gio - self._lan_kiem_tra < self.chu_ky_kiem_tra: return self._hien_hanh
+        # Khi đang dựng phiên bản mới, các yêu cầu khác vẫn phục vụ bằng bản cũ thay vì chờ
+        if not self._khoa.acquire(blocking=self._hien_hanh is None): return self._hien_hanh
+        try:
+            self._lan_kiem_tra = bay_gio
+            ma = phien_ban(self.thu_muc)
+            if self._hien_hanh is None or self._hien_hanh[0] != ma:
+                ma, df = mo_ban_chia_se(self.thu_muc)
+                self._hien_hanh = (ma, df, dung_chi_muc(df) if len(df) else None, dung_nhan_ngay(df))
+            return self._hien_hanh
+        finally: self._khoa.release()
+
+def dung_nhan_ngay(df):
+    """{cột ngày: (mã từng dòng, nhãn dd/mm/yyyy)}: định dạng mỗi ngày khác nhau một lần cho cả phiên bản,
+    mỗi yêu cầu chỉ còn lấy theo mã thay vì strftime lại các dòng trả về."""
+    nhan_ngay = {}
+    for cot in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[cot]):
+            ma, ngay = pd.factorize(df[cot])
+            nhan_ngay[cot] = (ma.astype(np.int32), pd.DatetimeIndex(ngay).strftime(DINH_DANG_NGAY).to_numpy(dtype=object))
+    return nhan_ngay
+
+# --- TRA CỨU (không phụ thuộc HTTP) ---
+def tra_ma_so(chi_muc, cac_ma, cot='soBhxh'):
+    """(mã tra cứu, vị trí dòng hoặc -1) theo đúng thứ tự các mã gửi lên; một mã trùng nhiều dòng thì ra nhiều dòng."""
+    cac_ma = pd.Index(np.array([str(m).strip() for m in cac_ma], dtype=object))
+    bang_bam = chi_muc.bang_bam[cot]
+    vi_tri, thieu = bang_bam.get_indexer_non_unique(cac_ma)
+    ma = bang_bam.to_numpy(dtype=object).take(np.maximum(vi_tri, 0)) if len(bang_bam) else np.empty(len(vi_tri), dtype=object)
+    ma[vi_tri < 0] = cac_ma.to_numpy(dtype=object)[thieu]   # Các -1 xuất hiện đúng thứ tự mã không tìm thấy
+    return ma, vi_tri.astype(np.int64)
+
+def _doc_ngay(cac_chuoi):
+    """Đọc cả cột ngày gửi lên một lượt: dd/mm/yyyy trước, dạng khác mới đoán từng ô."""
+    chuoi = pd.Series(cac_chuoi, dtype=object)
+    ngay = pd.to_datetime(chuoi, format=DINH_DANG_NGAY, errors='coerce')
+    con_lai = ngay.isna() & (chuoi != '')
+    if con_lai.any(): ngay[con_lai] = [pd.to_datetime(x, dayfirst=True, errors='coerce') for x in chuoi[con_lai]]
+    return ngay
+
+def _vi_tri_ngay_sinh(chi_muc, ngay, chuoi):
+    if 'ngaySinh' in chi_muc.ngay: return None if pd.isna(ngay) else chi_muc.khoang_ngay('ngaySinh', ngay, ngay)
+    if 'ngaySinh' in chi_muc.tien_to: return chi_muc.tim_tien_to('ngaySinh', chuoi)
+    return None
+
+def tra_ho_ten(chi_muc, cac_cap, so_ket_qua=SO_KET_QUA_MOI_CAP, nguong=NGUONG_DIEM):
+    """Khớp từng cặp (họ tên, ngày sinh). Trả về (số thứ tự cặp, vị trí dòng hoặc -1, điểm).
+
+    Có ngày sinh thì khoanh ứng viên bằng chỉ mục ngày rồi chỉ chấm điểm họ tên của vài dòng đó;
+    không có thì tìm họ tên trên toàn bộ như Trợ lý ảo.
+    """
+    stt, vi_tri, diem = [], [], []
+    cac_ngay = [str(n or '').strip() for _, n in cac_cap]
+    ngay_da_doc = _doc_ngay(cac_ngay) if 'ngaySinh' in chi_muc.ngay else [None] * len(cac_cap)
+    for i, ((ho_ten, _), ngay_sinh, ngay) in enumerate(zip(cac_cap, cac_ngay, ngay_da_doc)):
+        ho_ten = xoa_dau_tieng_viet(ho_ten)   # Chỉ mục họ tên dựng trên cột không dấu
+        if ngay_sinh:
+            ung_vien = _vi_tri_ngay_sinh(chi_muc, ngay, ngay_sinh)
+            ung_vien = np.empty(0, dtype=np.int64) if ung_vien is None else np.asarray(ung_vien, dtype=np.int64)
+            d = chi_muc.ten.cham_diem(ho_ten, ung_vien) if ho_ten else np.ones(len(ung_vien), dtype=np.float32)
+            giu = np.flatnonzero(d >= nguong)
+            giu = giu[np.lexsort((ung_vien[giu], -d[giu]))][:so_ket_qua]
+            v, d = ung_vien[giu], d[giu]
+        else:
+            v, d = chi_muc.ten.tim(ho_ten, so_ket_qua=so_ket_qua)
+            giu = d >= nguong; v, d = v[giu], d[giu]
+        if not len(v): v, d = np.array([-1]), np.array([np.nan], dtype=np.float32)
+        stt.append(np.full(len(v), i)); vi_tri.append(v); diem.append(d)
+    if not stt: return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    return np.concatenate(stt), np.concatenate(vi_tri).astype(np.int64), np.concatenate(diem).astype(np.float32)
+
+def trang_thai_han(df, vi_tri, hom_nay, so_ngay=SO_NGAY_SAP_HET, cot='hanTheDen'):
+    """(trạng thái, số ngày còn lại) cho từng vị trí; cùng mốc với trang Hạn BHYT (ngày <= hôm nay là đã hết hạn)."""
+    tim_thay = vi_tri >= 0
+    trang_thai = np.full(len(vi_tri), 'khong_tim_thay', dtype=object)
+    con_lai = pd.array([pd.NA] * len(vi_tri), dtype='Int64')
+    if cot not in df.columns or not pd.api.types.is_datetime64_any_dtype(df[cot]):
+        trang_thai[tim_thay] = 'khong_ro'; return trang_thai, con_lai
+    ngay = df[cot].to_numpy(dtype='datetime64[ns]').take(np.maximum(vi_tri, 0))
+    co_ngay = tim_thay & ~np.isnat(ngay)
+    so_ngay_con = np.zeros(len(vi_tri), dtype=np.int64)
+    so_ngay_con[co_ngay] = (ngay[co_ngay] - np.datetime64(pd.Timestamp(hom_nay).normalize(), 'ns')) // np.timedelta64(1, 'D')
+    trang_thai[tim_thay] = 'khong_ro'
+    trang_thai[co_ngay & (so_ngay_con <= 0)] = 'het_han'
+    trang_thai[co_ngay & (so_ngay_con > 0) & (so_ngay_con <= so_ngay)] = 'sap_het_han'
+    trang_thai[co_ngay & (so_ngay_con > so_ngay)] = 'con_han'
+    con_lai = pd.array(so_ngay_con, dtype='Int64'); con_lai[~co_ngay] = pd.NA
+    return trang_thai, con_lai
+
+# --- TRẢ KẾT QUẢ DẠNG LUỒNG ---
+def cac_khoi_ket_qua(df, vi_tri, them, cac_cot, nhan_ngay=None, so_dong_moi_khoi=SO_DONG_MOI_KHOI):
+    """Từng khối DataFrame: các cột `them` (mảng cùng độ dài vi_tri) rồi các cột dữ liệu; vị trí -1 cho ô rỗng.
+
+    Cột dữ liệu luôn ở dạng chuỗi như người dùng nhìn thấy, nên mọi khối có cùng lược đồ.
+    Luôn có ít nhất một khối (có thể rỗng) để phía nhận vẫn đọc được lược đồ.
+    """
+    nhan_ngay = nhan_ngay or {}
+    cot_lay = cac_cot + [ten_cot_goc(c) for c in cac_cot if ten_cot_goc(c) in df.columns]
+    for dau in range(0, max(len(vi_tri), 1), so_dong_moi_khoi):
+        vt = vi_tri[dau:dau + so_dong_moi_khoi]
+        lay = np.maximum(vt, 0)
+        lat_cat = df.iloc[lay][cot_lay] if len(df) else pd.DataFrame(columns=cot_lay)
+        co = vt >= 0
+        khoi = pd.DataFrame({ten: (gia_tri[dau:dau + so_dong_moi_khoi]) for ten, gia_tri in them.items()})
+        for cot in cac_cot:
+            if not len(lat_cat): chuoi = np.empty(0, dtype=object)
+            elif cot in nhan_ngay:
+                ma, nhan = nhan_ngay[cot]; ma = ma[lay]
+                goc = lat_cat[ten_cot_goc(cot)].fillna('').to_numpy(dtype=object) if ten_cot_goc(cot) in lat_cat.columns else ''
+                chuoi = np.where(ma >= 0, nhan.take(np.maximum(ma, 0)) if len(nhan) else '', goc)
+            else: chuoi = cot_dang_chuoi(lat_cat, cot).to_numpy(dtype=object)
+            khoi[cot] = pd.array(np.where(co, chuoi, None), dtype='string')
+        yield khoi
+
+def _jsonl(cac_khoi):
+    for khoi in cac_khoi:
+        if len(khoi): yield khoi.to_json(orient='records', lines=True, force_ascii=False).encode('utf-8')
+
+def _arrow(cac_khoi):
+    bo_dem = io.BytesIO(); ghi = None
+    for khoi in cac_khoi:
+        bang = pa.Table.from_pandas(khoi, preserve_index=False)
+        if ghi is None: ghi = pa.ipc.new_stream(bo_dem, bang.schema.remove_metadata())
+        ghi.write_table(bang.replace_schema_metadata(None))
+        yield bo_dem.getvalue(); bo_dem.seek(0); bo_dem.truncate()
+    if ghi is not None: ghi.close(); yield bo_dem.getvalue()
+
+def tra_luong(cac_khoi, dinh_dang):
+    if dinh_dang == 'arrow': return StreamingResponse(_arrow(cac_khoi), media_type='application/vnd.apache.arrow.stream')
+    return StreamingResponse(_jsonl(cac_khoi), media_type='application/x-ndjson')
+
+# --- HTTP ---
+class Loi(Exception):
+    def __init__(self, ma, thong_bao, headers=None):
+        super().__init__(thong_bao); self.ma, self.thong_bao, self.headers = ma, thong_bao, headers
+
+def _tra_loi(request, loi):
+    return JSONResponse({'loi': loi.thong_bao}, status_code=loi.ma, headers=loi.headers)
+
+async def _xac_thuc(request):
+    tieu_de = request.headers.get('authorization', '')
+    thieu = Loi(401, "Cần đăng nhập (HTTP Basic, tài khoản của trang web).", {'WWW-Authenticate': 'Basic realm="bhxh"'})
+    if not tieu_de.lower().startswith('basic '): raise thieu
+    try: ten, _, mat_khau = base64.b64decode(tieu_de[6:]).decode('utf-8').partition(':')
+    except (binascii.Error, UnicodeDecodeError): raise thieu
+    if await run_in_threadpool(request.app.state.kho_nguoi_dung.xac_thuc, ten, mat_khau) is None: raise thieu
+    return ten
+
+async def _dung_chung(request):
+    """Xác thực rồi lấy (tên người dùng, df, chỉ mục, nhãn ngày) của phiên bản hiện hành."""
+    ten = await _xac_thuc(request)
+    _, df, chi_muc, nhan_ngay = await run_in_threadpool(request.app.state.du_lieu.hien_hanh)
+    if chi_muc is None: raise Loi(503, "Chưa có dữ liệu.")
+    return ten, df, chi_muc, nhan_ngay
+
+def _cac_cot(request, df):
+    tham_so = request.query_params.get('cot_tra_ve')
+    cac_cot = [c.strip() for c in tham_so.split(',') if c.strip()] if tham_so else [c for c in COT_TRA_VE if c in df.columns]
+    sai = [c for c in cac_cot if c not in df.columns or la_cot_phu(c)]
+    if sai: raise Loi(400, f"Không có cột: {', '.join(sai)}")
+    return cac_cot
+
+async def _doc_danh_sach_ma(request):
+    """Danh sách mã từ thân yêu cầu: JSON {"ma": [...]} hoặc văn bản, mỗi mã một dòng (hay cách nhau bởi dấu phẩy)."""
+    than = await request.body()
+    if 'json' in request.headers.get('content-type', ''):
+        try: cac_ma = json.loads(than)['ma']
+        except (ValueError, KeyError, TypeError): raise Loi(400, 'Thân yêu cầu phải là {"ma": [...]}.')
+        if not isinstance(cac_ma, list) or not all(isinstance(m, (str, int)) and not isinstance(m, bool) for m in cac_ma):
+            raise Loi(400, '"ma" phải là danh sách mã (chuỗi hoặc số).')
+        cac_ma = [str(m) for m in cac_ma]
+    else: cac_ma = [m for m in re.split(r'[\s,;]+', than.decode('utf-8', errors='replace')) if m]
+    if len(cac_ma) > SO_MA_TOI_DA: raise Loi(413, f"Tối đa {SO_MA_TOI_DA:,} mã mỗi yêu cầu.")
+    return cac_ma
+
+def _la_chuoi_hoac_trong(gia_tri):
+    return gia_tri is None or isinstance(gia_tri, str)
+
+def _ghi_nhat_ky(request, ten, hanh_dong, chi_tiet):
+    request.app.state.nhat_ky.ghi(ten, hanh_dong, chi_tiet)
+
+async def suc_khoe(request):
+    ma, df, _, _ = await run_in_threadpool(request.app.state.du_lieu.hien_hanh)
+    return JSONResponse({'phien_ban': ma, 'so_dong': len(df)})
+
+async def api_ma_so(request):
+    """POST /api/ma-so?cot=soBhxh|soCmnd: hồ sơ của từng mã; mã không có thì một dòng tim_thay=false."""
+    ten, df, chi_muc, nhan_ngay = await _dung_chung(request)
+    cot = request.query_params.get('cot', 'soBhxh')
+    if cot not in chi_muc.bang_bam: raise Loi(400, f"Chỉ tra được theo: {', '.join(chi_muc.bang_bam)}")
+    cac_cot, cac_ma = _cac_cot(request, df), await _doc_danh_sach_ma(request)
+    ma, vi_tri = await run_in_threadpool(tra_ma_so, chi_muc, cac_ma, cot)
+    _ghi_nhat_ky(request, ten, "API tra cứu mã số", f"{len(cac_ma):,} mã ({cot}), {int((vi_tri >= 0).sum()):,} hồ sơ")
+    return tra_luong(cac_khoi_ket_qua(df, vi_tri, {'ma_tra_cuu': ma, 'tim_thay': vi_tri >= 0}, cac_cot, nhan_ngay), request.query_params.get('dinh_dang'))
+
+async def api_ho_ten(request):
+    """POST /api/ho-ten với {"ds": [{"ho_ten": ..., "ngay_sinh": "dd/mm/yyyy"}, ...]}: vài hồ sơ khớp nhất cho mỗi cặp."""
+    ten, df, chi_muc, nhan_ngay = await _dung_chung(request)
+    if chi_muc.ten is None: raise Loi(503, "Dữ liệu không có cột họ tên.")
+    try:
+        than = json.loads(await request.body())
+        ds = than['ds']
+        if not isinstance(ds, list) or not all(isinstance(x, dict) and _la_chuoi_hoac_trong(x.get('ho_ten')) and _la_chuoi_hoac_trong(x.get('ngay_sinh')) for x in ds):
+            raise TypeError
+        cac_cap = [(x.get('ho_ten') or '', x.get('ngay_sinh') or '') for x in ds]
+        so_ket_qua = max(1, min(int(than.get('so_ket_qua', SO_KET_QUA_MOI_CAP)), 50))
+    except (ValueError, KeyError, TypeError, AttributeError, OverflowError): raise Loi(400, 'Thân yêu cầu phải là {"ds": [{"ho_ten": ..., "ngay_sinh": ...}]}.')
+    if len(cac_cap) > SO_MA_TOI_DA: raise Loi(413, f"Tối đa {SO_MA_TOI_DA:,} cặp mỗi yêu cầu.")
+    cac_cot = _cac_cot(request, df)
+    stt, vi_tri, diem = await run_in_threadpool(tra_ho_ten, chi_muc, cac_cap, so_ket_qua)
+    _ghi_nhat_ky(request, ten, "API tra cứu họ tên", f"{len(cac_cap):,} cặp họ tên + ngày sinh")
+    them = {'stt': stt, 'tim_thay': vi_tri >= 0, 'diem': diem}
+    return tra_luong(cac_khoi_ket_qua(df, vi_tri, them, cac_cot, nhan_ngay), request.query_params.get('dinh_dang'))
+
+async def api_han_the(request):
+    """POST /api/han-the?so_ngay=30: trạng thái hạn thẻ (het_han / sap_het_han / con_han / khong_ro / khong_tim_thay) của từng số BHXH."""
+    ten, df, chi_muc, nhan_ngay = await _dung_chung(request)
+    try: so_ngay = int(request.query_params.get('so_ngay', SO_NGAY_SAP_HET))
+    except ValueError: raise Loi(400, "so_ngay phải là số nguyên.")
+    cac_cot, cac_ma = _cac_cot(request, df), await _doc_danh_sach_ma(request)
+    hom_nay = pd.Timestamp.now().normalize()
+    def tinh():
+        ma, vi_tri = tra_ma_so(chi_muc, cac_ma)
+        return ma, vi_tri, *trang_thai_han(df, vi_tri, hom_nay, so_ngay)
+    ma, vi_tri, trang_thai, con_lai = await run_in_threadpool(tinh)
+    _ghi_nhat_ky(request, ten, "API kiểm tra hạn", f"{len(cac_ma):,} mã, cửa sổ {so_ngay} ngày")
+    them = {'ma_tra_cuu': ma, 'tim_thay': vi_tri >= 0, 'trang_thai': trang_thai, 'so_ngay_con_lai': con_lai}
+    return tra_luong(cac_khoi_ket_qua(df, vi_tri, them, cac_cot, nhan_ngay), request.query_params.get('dinh_dang'))
+
+async def api_tong_hop_han(request):
+    """GET /api/han-the/tong-hop: số thẻ đã hết hạn và sắp hết hạn theo các mốc, như trang Hạn BHYT."""
+    _, df, chi_muc, _ = await _dung_chung(request)
+    if 'hanTheDen' not in chi_muc.ngay: raise Loi(503, "Cột hanTheDen không ở dạng ngày tháng.")
+    dem = chi_muc.dem_han('hanTheDen', pd.Timestamp.now(), CAC_MOC_HAN)
+    return JSONResponse({'phien_ban': df.attrs.get('phien_ban', ''), 'het_han': dem['het'], 'sap_het_han': {str(n): dem[n] for n in CAC_MOC_HAN}})
+
+def tao_ung_dung(thu_muc=DATA_DIR, file_nguoi_dung=USER_DB_FILE, thu_muc_nhat_ky=LOG_DIR):
+    app = Starlette(routes=[
+        Route('/api/suc-khoe', suc_khoe),
+        Route('/api/ma-so', api_ma_so, methods=['POST']),
+        Route('/api/ho-ten', api_ho_ten, methods=['POST']),
+        Route('/api/han-the', api_han_the, methods=['POST']),
+        Route('/api/han-the/tong-hop', api_tong_hop_han),
+    ], exception_handlers={Loi: _tra_loi})
+    app.state.du_lieu = DuLieuApi(thu_muc)
+    app.state.kho_nguoi_dung = KhoNguoiDung(file_nguoi_dung)
+    app.state.nhat_ky = BoGhiNhatKy(thu_muc_nhat_ky)
+    return app
+
+def main():
+    ap = argparse.ArgumentParser(description="API tra cứu theo lô cho dữ liệu BHXH")
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--cong', type=int, default=CONG_MAC_DINH)
+    ap.add_argument('--thu-muc', default=DATA_DIR)
+    ap.add_argument('--file-nguoi-dung', default=USER_DB_FILE)
+    ap.add_argument('--thu-muc-nhat-ky', default=LOG_DIR)
+    args = ap.parse_args()
+    app = tao_ung_dung(args.thu_muc, args.file_nguoi_dung, args.thu_muc_nhat_ky)
+    app.state.du_lieu.hien_hanh()   # Nạp dữ liệu và dựng chỉ mục trước khi nhận yêu cầu
+    uvicorn.run(app, host=args.host, port=args.cong, timeout_keep_alive=60, log_level='warning')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Bộ đệm kết quả truy vấn dùng chung cho mọi phiên.
+
+Mỗi mục là mảng vị trí dòng (hoặc bộ nhiều mảng) của một truy vấn đã chuẩn hóa, gắn với phiên
+bản dữ liệu. Giới hạn theo tổng dung lượng (bỏ mục ít dùng nhất trước) và theo tuổi. Mục của một
+phiên bản chỉ bị bỏ khi phiên bản đó ra khỏi nhóm SO_PHIEN_BAN_GIU phiên bản dùng gần nhất, nên
+trong lúc chuyển phiên bản các phiên còn ở bản cũ và các phiên đã sang bản mới đều vẫn trúng.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+DUNG_LUONG_TOI_DA = 64 * 1024 * 1024   # Byte
+TUOI_TOI_DA = 3600                     # Giây
+SO_PHIEN_BAN_GIU = 2                   # Như max_entries của nap_du_lieu_toi_uu: bản hiện hành và bản trước
+
+def _dung_luong(gia_tri):
+    if isinstance(gia_tri, np.ndarray): return gia_tri.nbytes
+    if isinstance(gia_tri, (tuple, list)): return sum(_dung_luong(x) for x in gia_tri) + 64
+    if isinstance(gia_tri, dict): return sum(_dung_luong(x) for x in gia_tri.values()) + 64
+    return 64
+
+def _chi_doc(gia_tri):
+    """Khóa ghi các mảng trong kết quả, vì cùng một mảng được trả cho nhiều phiên."""
+    if isinstance(gia_tri, np.ndarray): gia_tri.flags.writeable = False
+    elif isinstance(gia_tri, (tuple, list)):
+        for x in gia_tri: _chi_doc(x)
+    return gia_tri
+
+class BoDemKetQua:
+    def __init__(self, dung_luong_toi_da=DUNG_LUONG_TOI_DA, tuoi_toi_da=TUOI_TOI_DA, so_phien_ban_giu=SO_PHIEN_BAN_GIU):
+        self.dung_luong_toi_da, self.tuoi_toi_da, self.so_phien_ban_giu = dung_luong_toi_da, tuoi_toi_da, so_phien_ban_giu
+        self._khoa = threading.Lock()
+        self._muc = OrderedDict()   # (phien_ban, loai, truy_van) -> (gia_tri, dung_luong, thoi_diem)
+        self._phien_ban = OrderedDict()   # Các phiên bản còn giữ mục, dùng gần nhất ở cuối
+        self._dung_luong = 0
+        self._dem = {}              # loai -> {'trung': n, 'truot': n}
+        self._bo_do_day = self._bo_do_cu = self._vo_hieu = 0
+
+    def _dung_phien_ban(self, phien_ban):
+        """Đánh dấu phiên bản vừa dùng; phiên bản bị đẩy ra khỏi nhóm dùng gần nhất thì bỏ hết mục của nó."""
+        if phien_ban in self._phien_ban: self._phien_ban.move_to_end(phien_ban); return
+        self._phien_ban[phien_ban] = None
+        while len(self._phien_ban) > self.so_phien_ban_giu:
+            cu = self._phien_ban.popitem(last=False)[0]
+            bo = [k for k in self._muc if k[0] == cu]
+            for k in bo: self._dung_luong -= self._muc.pop(k)[1]
+            if bo: self._vo_hieu += 1
+
+    def lay(self, phien_ban, loai, truy_van, tinh):
+        """Kết quả của truy_van (đã chuẩn hóa, hashable) trên phiên bản dữ liệu; tính bằng tinh() khi chưa có."""
+        khoa = (phien_ban, loai, truy_van); bay_gio = time.monotonic()
+        with self._khoa:
+            self._dung_phien_ban(phien_ban)
+            dem = self._dem.setdefault(loai, {'trung': 0, 'truot': 0})
+            muc = self._muc.get(khoa)
+            if muc is not None and bay_gio - muc[2] <= self.tuoi_toi_da:
+                self._muc.move_to_end(khoa); dem['trung'] += 1
+                return muc[0]
+            dem['truot'] += 1
+        # Tính ngoài khóa: hai phiên cùng trượt một truy vấn thì cùng tính, không chặn các truy vấn khác
+        gia_tri = _chi_doc(tinh()); dung_luong = _dung_luong(gia_tri)
+        with self._khoa:
+            if phien_ban not in self._phien_ban or dung_luong > self.dung_luong_toi_da: return gia_tri
+            cu = self._muc.pop(khoa, None)
+            if cu is not None: self._dung_luong -= cu[1]
+            self._muc[khoa] = (gia_tri, dung_luong, bay_gio); self._dung_luong += dung_luong
+            self._don_dep(bay_gio)
+        return gia_tri
+
+    def _don_dep(self, bay_gio):
+        for khoa in [k for k, m in self._muc.items() if bay_gio - m[2] > self.tuoi_toi_da]:
+            self._dung_luong -= self._muc.pop(khoa)[1]; self._bo_do_cu += 1
+        while self._dung_luong > self.dung_luong_toi_da and self._muc:
+            self._dung_luong -= self._muc.popitem(last=False)[1][1]; self._bo_do_day += 1
+
+    def xoa(self):
+        with self._khoa: self._muc.clear(); self._dung_luong = 0
+
+    def thong_ke(self):
+        """Số liệu cho trang quản trị: tổng quan và tỷ lệ trúng theo từng loại truy vấn."""
+        with self._khoa:
+            theo_loai = {loai: dict(d, so_muc=sum(1 for k in self._muc if k[1] == loai)) for loai, d in self._dem.items()}
+            trung = sum(d['trung'] for d in self._dem.values()); truot = sum(d['truot'] for d in self._dem.values())
+            return {'phien_ban': list(reversed(self._phien_ban)), 'so_muc': len(self._muc), 'dung_luong': self._dung_luong,
+                    'dung_luong_toi_da': self.dung_luong_toi_da, 'trung': trung, 'truot': truot,
+                    'ty_le_trung': trung / (trung + truot) if trung + truot else 0.0,
+                    'bo_do_day': self._bo_do_day, 'bo_do_cu': self._bo_do_cu, 'vo_hieu': self._vo_hieu, 'theo_loai': theo_loai}
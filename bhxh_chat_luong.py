@@ -0,0 +1,104 @@
+"""Báo cáo chất lượng dữ liệu, tính một lần cho mỗi phiên bản dữ liệu.
+
+Mỗi luật (ô trống / giá trị giữ chỗ, sai định dạng, trùng mã, ngày không hợp lệ) cho ra một
+bitmap các dòng vi phạm (np.packbits), nên xem chi tiết một luật chỉ là giải nén bitmap.
+Các cột được kiểm tra song song trên nhiều luồng; phần việc nặng nằm trong pyarrow.compute,
+vốn nhả GIL nên các luồng chạy thật sự song song.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from bhxh_du_lieu import la_cot_phu, cot_dang_chuoi, ten_cot_goc, COT_NGAY
+
+GIA_TRI_GIU_CHO = ['nan', 'none', 'null', '', '0']   # Giống cách Lọc lỗi vẫn coi là ô trống
+DINH_DANG = {   # Cột: (biểu thức hợp lệ sau khi bỏ khoảng trắng đầu cuối, ký tự phân cách được bỏ qua)
+    'soBhxh': (r'^\d{10}$', None),
+    'soCmnd': (r'^(\d{9}|\d{12})$', None),                    # CMND 9 số hoặc CCCD 12 số
+    'soDienThoai': (r'^(0|\+?84)\d{9,10}$', r'[\s.\-()]'),    # Cho phép viết 0912 345 678, 0912.345.678
+    'VSS_EMAIL': (r'^[^@\s]+@[^@\s]+\.[A-Za-z]{2,}$', None),
+}
+COT_KIEM_TRUNG = ['soBhxh', 'soCmnd']
+NAM_HOP_LE = (1900, 2100)
+SO_DONG_SONG_SONG = 200_000   # Dữ liệu từ mức này trở lên mới chia các cột cho nhiều luồng
+
+MO_TA_LUAT = {
+    'thieu': 'Thiếu / giá trị giữ chỗ',
+    'dinh_dang': 'Sai định dạng',
+    'trung': 'Trùng mã',
+    'ngay_sai': 'Ngày không đọc được',
+    'ngay_ngoai_khoang': 'Ngày ngoài khoảng hợp lệ',
+}
+
+def _mang_chuoi(df, cot):
+    """Cột dưới dạng chuỗi Arrow như người dùng nhìn thấy (cột category chỉ chuyển phần nhãn)."""
+    s = df[cot]
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        nhan = pa.array(s.cat.categories.astype(str).to_numpy(dtype=object), type=pa.string())
+        ma = s.cat.codes.to_numpy()
+        return pc.fill_null(pc.take(nhan, pa.array(ma, mask=ma < 0)), '')
+    if pd.api.types.is_datetime64_any_dtype(s) or not pd.api.types.is_string_dtype(s): s = cot_dang_chuoi(df, cot)
+    return pc.fill_null(pa.array(s), '')   # Cột chuỗi Arrow của bản ánh xạ bộ nhớ: không sao chép
+
+def _thanh_numpy(mang_bool):
+    return np.asarray(mang_bool.to_numpy(zero_copy_only=False), dtype=bool)
+
+def kiem_tra_cot(df, cot, hom_nay=None):
+    """[(loai, mask)] của một cột: ô trống, định dạng, trùng mã, ngày."""
+    chuoi = pc.utf8_trim_whitespace(_mang_chuoi(df, cot))
+    giu_cho = pa.array(GIA_TRI_GIU_CHO, type=chuoi.type)
+    thieu = _thanh_numpy(pc.is_in(pc.utf8_lower(chuoi), value_set=giu_cho))
+    kq = [('thieu', thieu)]
+    if cot in DINH_DANG:
+        mau, phan_cach = DINH_DANG[cot]
+        gia_tri = pc.replace_substring_regex(chuoi, phan_cach, '') if phan_cach else chuoi
+        kq.append(('dinh_dang', ~_thanh_numpy(pc.match_substring_regex(gia_tri, mau)) & ~thieu))
+    if cot in COT_KIEM_TRUNG:
+        ma = pc.dictionary_encode(chuoi)   # Các khúc dùng chung một từ điển
+        cac_khuc = ma.chunks if isinstance(ma, pa.ChunkedArray) else [ma]
+        chi_so = np.concatenate([k.indices.to_numpy(zero_copy_only=False) for k in cac_khuc]) if cac_khuc else np.zeros(0, dtype=np.int32)
+        dem = np.bincount(chi_so[~thieu], minlength=len(cac_khuc[0].dictionary) if cac_khuc else 0)
+        kq.append(('trung', (dem[chi_so] > 1) & ~thieu))
+    if cot in COT_NGAY and pd.api.types.is_datetime64_any_dtype(df[cot]):
+        if ten_cot_goc(cot) in df.columns:
+            goc = df[ten_cot_goc(cot)]
+            kq.append(('ngay_sai', goc.notna().to_numpy(dtype=bool) & ~thieu))
+        nam = df[cot].dt.year.to_numpy(dtype='float64', na_value=np.nan)
+        ngoai = (nam < NAM_HOP_LE[0]) | (nam > NAM_HOP_LE[1])
+        if cot == 'ngaySinh': ngoai |= (df[cot] > pd.Timestamp(hom_nay or pd.Timestamp.now())).to_numpy(dtype=bool, na_value=False)
+        kq.append(('ngay_ngoai_khoang', ngoai))
+    return kq
+
+class BaoCaoChatLuong:
+    def __init__(self, df, so_luong=None, hom_nay=None):
+        self.so_dong = len(df)
+        self.cac_cot = [c for c in df.columns if not la_cot_phu(c)]
+        so_luong = so_luong or os.cpu_count() or 1
+        if self.so_dong >= SO_DONG_SONG_SONG and so_luong > 1 and len(self.cac_cot) > 1:
+            with ThreadPoolExecutor(min(so_luong, len(self.cac_cot)), thread_name_prefix='chat_luong') as pool:
+                ket_qua = list(pool.map(lambda c: kiem_tra_cot(df, c, hom_nay), self.cac_cot))
+        else: ket_qua = [kiem_tra_cot(df, c, hom_nay) for c in self.cac_cot]
+        self._luat = {}   # (cot, loai) -> (so_dong_vi_pham, bitmap)
+        for cot, cac_luat in zip(self.cac_cot, ket_qua):
+            for loai, mask in cac_luat: self._luat[(cot, loai)] = (int(mask.sum()), np.packbits(mask))
+
+    def cac_luat(self, cot=None):
+        return [k for k in self._luat if cot is None or k[0] == cot]
+
+    def dem(self, cot, loai):
+        return self._luat[(cot, loai)][0]
+
+    def vi_tri(self, cot, loai):
+        """Vị trí các dòng vi phạm một luật (tăng dần)."""
+        return np.flatnonzero(np.unpackbits(self._luat[(cot, loai)][1], count=self.so_dong)).astype(np.int64)
+
+    def bang_tong_hop(self):
+        return pd.DataFrame([{'Cột': cot, 'Luật': MO_TA_LUAT[loai], 'Số dòng': dem, 'Tỷ lệ (%)': 100 * dem / self.so_dong if self.so_dong else 0.0}
+                             for (cot, loai), (dem, _) in self._luat.items()])
+
+def dung_bao_cao_chat_luong(df):
+    return BaoCaoChatLuong(df)
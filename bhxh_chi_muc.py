@@ -0,0 +1,244 @@
+"""Chỉ mục tìm kiếm dựng sẵn cho dữ liệu BHXH.
+
+Module này không phụ thuộc Streamlit để có thể dùng lại ở các tiến trình khác.
+Mọi kết quả trả về là mảng vị trí dòng (theo thứ tự gốc của DataFrame).
+"""
+import re
+import threading
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from bhxh_du_lieu import xoa_dau_tieng_viet, ten_cot_khong_dau, cot_dang_chuoi, COT_NGAY
+from bhxh_tim_ten import ChiMucTen
+
+COT_MA_SO = ['soBhxh', 'soCmnd']                  # Tra cứu chính xác bằng bảng băm
+COT_TIEN_TO = ['soBhxh', 'soCmnd', 'ngaySinh']    # Tra cứu tiền tố bằng mảng đã sắp xếp
+COT_TRIGRAM = ['hoTen', ten_cot_khong_dau('hoTen')]   # Tìm chuỗi con bằng chỉ mục trigram
+TU_RAC = ["tim", "loc", "cho", "toi", "nguoi", "co", "ngay", "sinh", "ten", "la", "o", "que"]
+KY_TU_CUOI = '\U0010ffff'
+CAC_MOC_HAN = (7, 30, 60, 90)                     # Cửa sổ "sắp hết hạn" (ngày) được đếm sẵn
+
+# --- TÌM KIẾM QUÉT TOÀN CỘT (ĐƯỜNG DỰ PHÒNG) ---
+def tim_kiem_quet(df, ten_cot, tu_khoa, kieu='chua'):
+    """Quét cả cột như cách cũ. kieu: 'chinh_xac', 'tien_to' hoặc 'chua'."""
+    cot = cot_dang_chuoi(df, ten_cot)
+    tu_khoa = str(tu_khoa).strip()
+    if kieu == 'chinh_xac': mask = cot.str.strip() == tu_khoa
+    elif kieu == 'tien_to': mask = cot.str.strip().str.startswith(tu_khoa)
+    else: mask = cot.str.contains(tu_khoa, case=False, regex=False, na=False)
+    return np.flatnonzero(mask.to_numpy(dtype=bool))
+
+# --- DỰNG CHỈ MỤC ---
+def so_ngay(ngay):
+    """Ngày (chuỗi / datetime / Timestamp) -> số ngày kể từ 1970-01-01, bỏ phần giờ."""
+    return int(np.datetime64(pd.Timestamp(ngay).normalize(), 'D').astype(np.int64))
+
+def _dung_chi_muc_ngay(cot):
+    """Mảng số ngày đã sắp xếp (bỏ ô trống) cùng vị trí dòng tương ứng."""
+    ngay = cot.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]').astype(np.int64)
+    vi_tri = np.flatnonzero(cot.notna().to_numpy())
+    thu_tu = np.argsort(ngay[vi_tri], kind='stable')
+    return ngay[vi_tri][thu_tu], vi_tri[thu_tu]
+
+def _ma_trigram(ma):
+    """Ghép 3 mã ký tự liên tiếp (mỗi ký tự 21 bit) thành một số nguyên 64 bit."""
+    return (ma[:-2] << np.uint64(42)) | (ma[1:-1] << np.uint64(21)) | ma[2:]
+
+def _ma_hoa_chuoi(gia_tri):
+    return np.frombuffer(gia_tri.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+
+def _dung_trigram(chuoi):
+    """Dựng danh sách vị trí (posting list) theo trigram, hoàn toàn bằng numpy."""
+    n = len(chuoi)
+    do_dai = chuoi.str.len().to_numpy(dtype=np.int64) + 1
+    ma = _ma_hoa_chuoi('\x00'.join(chuoi.tolist()) + '\x00')
+    dong = np.repeat(np.arange(n, dtype=np.int32), do_dai)
+    if len(ma) < 3:
+        return np.empty(0, dtype=np.uint64), np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32)
+    hop_le = (ma[:-2] != 0) & (ma[1:-1] != 0) & (ma[2:] != 0)   # Bỏ trigram vắt qua dấu phân cách
+    ma_tg = _ma_trigram(ma)[hop_le]
+    dong = dong[:-2][hop_le]
+    thu_tu = np.argsort(ma_tg, kind='stable')   # dong vốn tăng dần nên sắp ổn định là đủ
+    ma_tg = ma_tg[thu_tu]; dong = dong[thu_tu]
+    giu = np.ones(len(ma_tg), dtype=bool)
+    giu[1:] = (ma_tg[1:] != ma_tg[:-1]) | (dong[1:] != dong[:-1])
+    ma_tg = ma_tg[giu]; dong = dong[giu]
+    ma_duy_nhat, bat_dau = np.unique(ma_tg, return_index=True)
+    bien = np.append(bat_dau, len(ma_tg)).astype(np.int64)
+    return ma_duy_nhat, bien, dong
+
+class ChiMucTimKiem:
+    """Chỉ mục dựng một lần cho mỗi phiên bản dữ liệu và dùng chung giữa các phiên.
+
+    - Bảng băm (pd.Index) cho tra cứu chính xác số BHXH / CMND.
+    - Mảng đã sắp xếp cho tra cứu tiền tố mã số và ngày sinh.
+    - Trigram cho tìm chuỗi con trong họ tên (không phân biệt hoa thường).
+    - Mảng ngày đã sắp xếp cho truy vấn khoảng ngày (hạn thẻ, ngày sinh) bằng tìm kiếm nhị phân.
+    - Từ điển từ của họ tên không dấu cho tìm tên gần đúng có xếp hạng (Trợ lý ảo).
+    """
+
+    def __init__(self, df):
+        self.so_dong = len(df)
+        self.bang_bam, self.tien_to, self.trigram, self.cot_chuoi, self.ngay, self.do_dai = {}, {}, {}, {}, {}, {}
+        self._dem_han, self._khoa_dem_han = {}, threading.Lock()   # Chỉ mục dùng chung giữa các phiên
+        for cot in set(COT_MA_SO + COT_TIEN_TO + COT_TRIGRAM):
+            if cot in df.columns: self.cot_chuoi[cot] = cot_dang_chuoi(df, cot).str.strip()
+        for cot in set(COT_MA_SO + COT_TIEN_TO) & set(self.cot_chuoi):
+            self.do_dai[cot] = int(self.cot_chuoi[cot].str.len().fillna(0).max()) if self.so_dong else 0
+        for cot in COT_MA_SO:
+            if cot in self.cot_chuoi:
+                idx = pd.Index(self.cot_chuoi[cot].to_numpy(dtype=object))
+                if len(idx): idx.get_indexer_for(idx[:1])   # Ép pandas dựng bảng băm ngay lúc nạp
+                self.bang_bam[cot] = idx
+        for cot in COT_TIEN_TO:
+            if cot in self.cot_chuoi:
+                gia_tri = self.cot_chuoi[cot].to_numpy(dtype=object)
+                thu_tu = pc.sort_indices(pa.array(gia_tri, type=pa.string())).to_numpy()
+                self.tien_to[cot] = (gia_tri[thu_tu], thu_tu)
+        for cot in COT_TRIGRAM:
+            if cot in self.cot_chuoi:
+                self.trigram[cot] = _dung_trigram(self.cot_chuoi[cot].str.lower())
+        for cot in COT_NGAY:
+            if cot in df.columns and pd.api.types.is_datetime64_any_dtype(df[cot]):
+                self.ngay[cot] = _dung_chi_muc_ngay(df[cot])
+        if 'hanTheDen' in self.ngay: self.dem_han('hanTheDen', pd.Timestamp.now())   # Đếm sẵn cho hôm nay
+        cot_ten = ten_cot_khong_dau('hoTen')
+        self.ten = ChiMucTen(df[cot_ten]) if cot_ten in df.columns else None
+
+    def tim_chinh_xac(self, ten_cot, gia_tri):
+        vi_tri = self.bang_bam[ten_cot].get_indexer_for([str(gia_tri).strip()])
+        return np.sort(vi_tri[vi_tri >= 0])
+
+    def tim_tien_to(self, ten_cot, tien_to):
+        gia_tri_sx, thu_tu = self.tien_to[ten_cot]
+        tien_to = str(tien_to).strip()
+        dau = np.searchsorted(gia_tri_sx, tien_to, side='left')
+        cuoi = np.searchsorted(gia_tri_sx, tien_to + KY_TU_CUOI, side='left')
+        return np.sort(thu_tu[dau:cuoi])
+
+    def tim_chuoi_con(self, ten_cot, chuoi):
+        """Giao các posting list của trigram rồi kiểm tra lại ứng viên (trả về None nếu chuỗi < 3 ký tự)."""
+        chuoi = str(chuoi).strip().lower()
+        if len(chuoi) < 3: return None
+        ma_duy_nhat, bien, dong = self.trigram[ten_cot]
+        danh_sach = []
+        for ma in np.unique(_ma_trigram(_ma_hoa_chuoi(chuoi))):
+            k = np.searchsorted(ma_duy_nhat, ma)
+            if k >= len(ma_duy_nhat) or ma_duy_nhat[k] != ma: return np.empty(0, dtype=np.int64)
+            danh_sach.append(dong[bien[k]:bien[k + 1]])
+        danh_sach.sort(key=len)
+        ung_vien = danh_sach[0]
+        for ds in danh_sach[1:]:
+            if len(ung_vien) == 0: break
+            ung_vien = np.intersect1d(ung_vien, ds, assume_unique=True)
+        cot = self.cot_chuoi[ten_cot].iloc[ung_vien]
+        khop = cot.str.lower().str.contains(chuoi, regex=False, na=False).to_numpy(dtype=bool)
+        return ung_vien[khop].astype(np.int64)
+
+    def _bien_ngay(self, ten_cot, tu=None, den=None):
+        ngay_sx = self.ngay[ten_cot][0]
+        dau = 0 if tu is None else np.searchsorted(ngay_sx, so_ngay(tu), side='left')
+        cuoi = len(ngay_sx) if den is None else np.searchsorted(ngay_sx, so_ngay(den), side='right')
+        return dau, max(dau, cuoi)
+
+    def khoang_ngay(self, ten_cot, tu=None, den=None):
+        """Vị trí các dòng có tu <= ngày <= den (None: không chặn), theo thứ tự ngày tăng dần."""
+        dau, cuoi = self._bien_ngay(ten_cot, tu, den)
+        return self.ngay[ten_cot][1][dau:cuoi]
+
+    def dem_khoang_ngay(self, ten_cot, tu=None, den=None):
+        dau, cuoi = self._bien_ngay(ten_cot, tu, den)
+        return int(cuoi - dau)
+
+    def dem_han(self, ten_cot, hom_nay, cac_moc=CAC_MOC_HAN):
+        """Số thẻ đã hết hạn (ngày <= hôm nay) và sắp hết hạn trong từng cửa sổ, tính một lần mỗi ngày."""
+        khoa = (ten_cot, pd.Timestamp(hom_nay).normalize(), tuple(cac_moc))
+        with self._khoa_dem_han:
+            dem = self._dem_han.get(khoa)
+        if dem is None:
+            hom_nay = khoa[1]; mai = hom_nay + pd.Timedelta(days=1)
+            dem = {'het': self.dem_khoang_ngay(ten_cot, den=hom_nay)}
+            for moc in cac_moc: dem[moc] = self.dem_khoang_ngay(ten_cot, mai, hom_nay + pd.Timedelta(days=moc))
+            with self._khoa_dem_han:
+                if len(self._dem_han) > 16: self._dem_han.clear()
+                self._dem_han[khoa] = dem
+        return dem
+
+    def tim(self, df, ten_cot, tu_khoa):
+        """Các dòng mà cột chứa tu_khoa (không phân biệt hoa thường), đúng bằng kết quả quét toàn cột.
+
+        Chỉ mục chỉ được dùng khi cho cùng kết quả: mã số / ngày gõ đủ độ dài dài nhất của cột thì
+        "chứa" cũng là "bằng" nên tra bảng băm / mảng sắp xếp; họ tên dùng trigram; còn lại quét cột.
+        """
+        tu_khoa = str(tu_khoa).strip()
+        if tu_khoa and tu_khoa.lower() == tu_khoa.upper() and len(tu_khoa) >= self.do_dai.get(ten_cot, np.inf):
+            if ten_cot in self.bang_bam: return self.tim_chinh_xac(ten_cot, tu_khoa)
+            return self.tim_tien_to(ten_cot, tu_khoa)   # Không chuỗi nào dài hơn tu_khoa: tiền tố = khớp đúng
+        if ten_cot in self.trigram:
+            vi_tri = self.tim_chuoi_con(ten_cot, tu_khoa)
+            if vi_tri is not None: return vi_tri
+        return tim_kiem_quet(df, ten_cot, tu_khoa)
+
+def dung_chi_muc(df):
+    return ChiMucTimKiem(df)
+
+def doi_chieu_voi_quet(chi_muc, df, ten_cot, tu_khoa, kieu='chua'):
+    """So sánh kết quả chỉ mục với đường quét cũ (dùng khi kiểm tra độ chính xác)."""
+    if kieu == 'chinh_xac': vi_tri = chi_muc.tim_chinh_xac(ten_cot, tu_khoa)
+    elif kieu == 'tien_to': vi_tri = chi_muc.tim_tien_to(ten_cot, tu_khoa)
+    else: vi_tri = chi_muc.tim_chuoi_con(ten_cot, tu_khoa)
+    if vi_tri is None: return True
+    return np.array_equal(vi_tri, tim_kiem_quet(df, ten_cot, tu_khoa, kieu))
+
+# --- LỌC THEO CÂU HỎI CỦA TRỢ LÝ ẢO ---
+def loc_theo_cau_hoi(df, chi_muc, prompt):
+    """Tách ngày sinh, mã số và tên từ câu hỏi rồi lọc bằng chỉ mục.
+
+    Trả về (vi_tri, filters) với vi_tri là mảng vị trí dòng khớp mọi điều kiện; khi có tên thì
+    vi_tri là top-K theo độ phù hợp giảm dần thay vì theo thứ tự dòng.
+    Không sao chép DataFrame: tên được lọc trên cột không dấu tính sẵn lúc nạp dữ liệu.
+    """
+    vi_tri = np.arange(len(df))
+    prompt_khong_dau = xoa_dau_tieng_viet(prompt)
+    filters = []
+
+    # 1. TÌM NGÀY THÁNG
+    date_m = re.search(r'\d{1,2}[/-]\d{1,2}[/-]\d{4}', prompt)
+    if date_m:
+        ngay_raw = date_m.group().replace('-', '/')
+        try:
+            nd = pd.to_datetime(ngay_raw, dayfirst=True).strftime('%d/%m/%Y')
+            vi_tri = np.intersect1d(vi_tri, chi_muc.tim(df, 'ngaySinh', nd), assume_unique=True)
+            filters.append(f"Ngày sinh: **{nd}**")
+            prompt_khong_dau = prompt_khong_dau.replace(xoa_dau_tieng_viet(date_m.group()), "")
+        except Exception: pass
+
+    # 2. TÌM MÃ SỐ
+    for n in re.findall(r'\b\d{5,}\b', prompt):
+        if date_m and n in date_m.group(): continue
+        vi_tri_so = np.union1d(chi_muc.tim(df, 'soBhxh', n), chi_muc.tim(df, 'soCmnd', n))
+        vi_tri = np.intersect1d(vi_tri, vi_tri_so, assume_unique=True)
+        filters.append(f"Mã số: **{n}**")
+        prompt_khong_dau = prompt_khong_dau.replace(n, "")
+
+    # 3. TÌM TÊN
+    p_clean = prompt_khong_dau
+    for w in TU_RAC: p_clean = re.sub(r'\b' + w + r'\b', ' ', p_clean)
+    p_clean = re.sub(r'\b(bieu do|thong ke|han|het han)\b', ' ', p_clean)
+    ten = re.sub(r'\s+', ' ', p_clean).strip()
+
+    cot_ten = ten_cot_khong_dau('hoTen')
+    if len(ten) > 1 and chi_muc.ten is not None:
+        # Tên gần đúng, xếp theo độ phù hợp (top-K); các điều kiện ngày sinh / mã số giới hạn tập ứng viên
+        vi_tri = chi_muc.ten.tim(ten, trong=vi_tri if filters else None)[0]
+        filters.append(f"Tên gần đúng: **{ten}** (xếp theo độ phù hợp)")
+    elif len(ten) > 1 and cot_ten in df.columns:
+        vi_tri_ten = chi_muc.tim_chuoi_con(cot_ten, ten) if cot_ten in chi_muc.trigram else None
+        if vi_tri_ten is not None:
+            vi_tri = np.intersect1d(vi_tri, vi_tri_ten, assume_unique=True)
+        else:
+            mask = df[cot_ten].iloc[vi_tri].str.contains(ten, regex=False, na=False).to_numpy(dtype=bool)
+            vi_tri = vi_tri[mask]
+        filters.append(f"Tên chứa: **{ten}**")
+    return vi_tri, filters
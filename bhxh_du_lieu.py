@@ -0,0 +1,246 @@
+"""Nạp và chuẩn hóa dữ liệu BHXH (không phụ thuộc Streamlit)."""
+import os
+import re
+import threading
+import time
+import unicodedata
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pyxlsb import open_workbook
+
+COT_TIM_KHONG_DAU = ['hoTen', 'diaChiLh']   # Các cột văn bản được lưu kèm bản không dấu
+HAU_TO_KHONG_DAU = '_khongdau'
+HAU_TO_GOC = '_goc'                         # Chuỗi gốc của ô ngày tháng không phân tích được
+SO_DONG_MOI_LO = 50_000                     # Số dòng mỗi row group khi chuyển XLSB sang Parquet
+# Chuỗi mà pd.read_excel mặc định đọc thành ô trống (na_values mặc định của pandas)
+CHUOI_O_TRONG = frozenset(['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                           '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'])
+
+# --- LƯỢC ĐỒ CỘT CỦA CACHE ---
+COT_NGAY = ['ngaySinh', 'hanTheDen']        # Lưu dạng ngày tháng đã phân tích
+COT_PHAN_LOAI = ['gioiTinh', 'maTinh']      # Luôn mã hóa từ điển (category)
+COT_KHONG_PHAN_LOAI = ['hoTen', 'soBhxh', 'soCmnd', 'soDienThoai', 'diaChiLh', 'VSS_EMAIL']
+NGUONG_PHAN_LOAI = 2000                     # Cột chuỗi có ít giá trị khác nhau hơn mức này cũng được mã hóa từ điển
+DINH_DANG_NGAY = '%d/%m/%Y'
+
+# --- CHUẨN HÓA TIẾNG VIỆT ---
+def xoa_dau_tieng_viet(text):
+    if not isinstance(text, str): return str(text)
+    text = unicodedata.normalize('NFD', text)
+    text = re.sub(r'[\u0300-\u036f]', '', text)
+    text = text.lower().strip()
+    text = re.sub(r'\s+', ' ', text)
+    return text
+
+def xoa_dau_cot(series):
+    """Phiên bản vector hóa của xoa_dau_tieng_viet cho cả một cột."""
+    s = series.astype('string').fillna('').str.normalize('NFD')
+    s = s.str.replace('[\u0300-\u036f]', '', regex=True)
+    return s.str.lower().str.strip().str.replace(r'\s+', ' ', regex=True)
+
+def ten_cot_khong_dau(ten_cot):
+    return ten_cot + HAU_TO_KHONG_DAU
+
+def ten_cot_goc(ten_cot):
+    return ten_cot + HAU_TO_GOC
+
+def la_cot_phu(ten_cot):
+    return str(ten_cot).endswith((HAU_TO_KHONG_DAU, HAU_TO_GOC))
+
+def bo_sung_cot_khong_dau(df):
+    """Thêm các cột không dấu còn thiếu. Trả về True nếu có cột mới được tính."""
+    co_thay_doi = False
+    for cot in COT_TIM_KHONG_DAU:
+        if cot in df.columns and ten_cot_khong_dau(cot) not in df.columns:
+            df[ten_cot_khong_dau(cot)] = xoa_dau_cot(df[cot])
+            co_thay_doi = True
+    return co_thay_doi
+
+def bo_cot_phu(df):
+    """Bỏ các cột nội bộ (cột không dấu, chuỗi ngày gốc) trước khi hiển thị hoặc xuất file."""
+    cot_phu = [c for c in df.columns if la_cot_phu(c)]
+    return df.drop(columns=cot_phu) if cot_phu else df
+
+# --- KIỂU DỮ LIỆU ---
+def phan_tich_ngay(series):
+    """Phân tích cột ngày dạng chuỗi (dd/mm/yyyy, ISO hoặc số sê-ri Excel).
+
+    Trả về (ngay, goc): goc chỉ giữ chuỗi gốc ở những ô không phân tích được.
+    """
+    s = series.astype('string').str.strip()
+    ngay = pd.to_datetime(s, format=DINH_DANG_NGAY, errors='coerce')
+    con_lai = ngay.isna() & s.notna() & (s != '')
+    if con_lai.any():
+        r = s[con_lai]
+        so = pd.to_numeric(r, errors='coerce')
+        ngay_so = pd.to_datetime(so.where((so >= 3000) & (so < 2958466)), unit='D', origin='1899-12-30', errors='coerce')
+        ngay_khac = pd.to_datetime(r.where(so.isna()), dayfirst=True, format='mixed', errors='coerce')
+        ngay[con_lai] = ngay_so.fillna(ngay_khac)
+    goc = s.where(ngay.isna() & s.notna() & (s != ''))
+    return ngay, goc
+
+def ap_kieu_ngay(df):
+    """Chuyển các cột ngày còn ở dạng chuỗi sang datetime. Trả về True nếu có cột được chuyển."""
+    co_thay_doi = False
+    for cot in COT_NGAY:
+        if cot in df.columns and not pd.api.types.is_datetime64_any_dtype(df[cot]):
+            df[cot], df[ten_cot_goc(cot)] = phan_tich_ngay(df[cot])
+            co_thay_doi = True
+    return co_thay_doi
+
+def cot_dang_chuoi(df, ten_cot):
+    """Cột dưới dạng chuỗi như người dùng nhìn thấy (ngày dd/mm/yyyy, ô trống là '')."""
+    cot = df[ten_cot]
+    if pd.api.types.is_datetime64_any_dtype(cot):
+        ma, ngay = pd.factorize(cot)   # Định dạng mỗi ngày khác nhau một lần thay vì từng dòng
+        nhan = pd.array(pd.DatetimeIndex(ngay).strftime(DINH_DANG_NGAY), dtype='string')
+        chuoi = pd.Series(nhan.take(ma, allow_fill=True), index=cot.index)
+        if ten_cot_goc(ten_cot) in df.columns: chuoi = chuoi.fillna(df[ten_cot_goc(ten_cot)])
+        return chuoi.fillna('')
+    return cot.astype('string').fillna('')
+
+def dang_hien_thi(df):
+    """Bản hiển thị / xuất file của một nhóm dòng: bỏ cột nội bộ, ngày về dạng dd/mm/yyyy."""
+    cot_ngay = [c for c in df.columns if pd.api.types.is_datetime64_any_dtype(df[c])]
+    if not cot_ngay: return bo_cot_phu(df)
+    df = df.copy()
+    for cot in cot_ngay: df[cot] = cot_dang_chuoi(df, cot)
+    return bo_cot_phu(df)
+
+def _kieu_pandas(kieu):
+    if kieu in (pa.string(), pa.large_string()): return pd.StringDtype('pyarrow')
+    return None
+
+def _ma_hoa_tu_dien(bang):
+    """Mã hóa từ điển các cột chuỗi ít giá trị (giới tính, mã tỉnh...) ngay trên bảng Arrow."""
+    for i, truong in enumerate(bang.schema):
+        ten = truong.name
+        if not pa.types.is_string(truong.type) and not pa.types.is_large_string(truong.type): continue
+        if ten in COT_KHONG_PHAN_LOAI or la_cot_phu(ten): continue
+        cot = bang.column(i)
+        if ten not in COT_PHAN_LOAI:
+            so_gia_tri = pc.count_distinct(cot).as_py()
+            if so_gia_tri > NGUONG_PHAN_LOAI or so_gia_tri * 2 > max(len(bang), 1): continue
+        bang = bang.set_column(i, ten, cot.dictionary_encode())
+    return bang
+
+def doc_du_lieu(file_parquet):
+    """Đọc cache Parquet với lược đồ tối ưu.
+
+    Chuỗi dùng Arrow, cột ít giá trị thành category, ngày tháng là datetime.
+    Trả về (df, can_ghi_lai): can_ghi_lai=True khi cache cũ vừa được nâng cấp lược đồ.
+    """
+    bang = _ma_hoa_tu_dien(pq.read_table(file_parquet))
+    df = bang.to_pandas(types_mapper=_kieu_pandas, ignore_metadata=True)
+    can_ghi_lai = ap_kieu_ngay(df)
+    can_ghi_lai = bo_sung_cot_khong_dau(df) or can_ghi_lai
+    return df, can_ghi_lai
+
+def luu_parquet(df, file_parquet):
+    """Ghi đè cache Parquet một cách nguyên tử (ghi file tạm rồi đổi tên)."""
+    file_tam = f"{file_parquet}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        df.to_parquet(file_tam, index=False)
+        os.replace(file_tam, file_parquet)
+    finally:
+        if os.path.exists(file_tam): os.remove(file_tam)
+
+def luu_arrow(df, file_arrow):
+    """Ghi DataFrame ra file Arrow IPC không nén (để ánh xạ bộ nhớ), nguyên tử như luu_parquet.
+
+    Chuỗi được ghi dạng large_string đúng như kiểu pandas dùng nên lúc đọc không phải chuyển đổi.
+    """
+    bang = pa.Table.from_pandas(df, preserve_index=False)
+    for i, truong in enumerate(bang.schema):
+        if pa.types.is_string(truong.type): bang = bang.set_column(i, truong.name, bang.column(i).cast(pa.large_string()))
+    file_tam = f"{file_arrow}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with pa.OSFile(file_tam, 'wb') as f, pa.ipc.new_file(f, bang.schema) as writer:
+            writer.write_table(bang, max_chunksize=SO_DONG_MOI_LO * 4)
+        os.replace(file_tam, file_arrow)
+    finally:
+        if os.path.exists(file_tam): os.remove(file_tam)
+
+def doc_arrow_anh_xa(file_arrow):
+    """Đọc file Arrow IPC qua ánh xạ bộ nhớ (memory map).
+
+    Cột chuỗi trỏ thẳng vào trang nhớ của file nên không tốn bộ nhớ riêng và được hệ điều hành
+    chia sẻ giữa mọi tiến trình cùng mở file; chỉ mã category và cột ngày được chép ra.
+    """
+    with pa.memory_map(file_arrow, 'r') as nguon:
+        bang = pa.ipc.open_file(nguon).read_all()
+    return bang.to_pandas(types_mapper=_kieu_pandas, ignore_metadata=True)
+
+# --- CHUYỂN XLSB SANG PARQUET THEO LÔ ---
+def _gia_tri_o(v):
+    """Chuyển giá trị ô pyxlsb sang chuỗi giống pd.read_excel(dtype=str)."""
+    if v is None: return None
+    if isinstance(v, float): return str(int(v)) if v.is_integer() else str(v)
+    v = str(v)
+    return None if v in CHUOI_O_TRONG else v
+
+def _chuan_hoa_tieu_de(tieu_de):
+    """Làm sạch dòng tiêu đề: bỏ khoảng trắng, đặt tên cột trống và đánh số cột trùng như pandas."""
+    ket_qua, da_co = [], {}
+    for i, ten in enumerate(tieu_de):
+        ten = str(ten).strip() if ten not in (None, '') else f'Unnamed: {i}'
+        if ten in da_co:
+            da_co[ten] += 1; ten = f'{ten}.{da_co[ten]}'
+        da_co.setdefault(ten, 0)
+        ket_qua.append(ten)
+    return ket_qua
+
+def _ghi_lo_parquet(writer, file_tam, tieu_de, lo):
+    """Ghi một lô dòng thành một row group, mở writer ở lô đầu tiên."""
+    df = pd.DataFrame(lo, columns=tieu_de, dtype=object)
+    df = df.astype({c: 'string' for c in df.columns})
+    ap_kieu_ngay(df)
+    bo_sung_cot_khong_dau(df)
+    bang = pa.Table.from_pandas(df, preserve_index=False)
+    if writer is None: writer = pq.ParquetWriter(file_tam, bang.schema)
+    else: bang = bang.cast(writer.schema)
+    writer.write_table(bang)
+    return writer
+
+def chuyen_xlsb_sang_parquet(file_xlsb, file_parquet, so_dong_moi_lo=SO_DONG_MOI_LO, bao_tien_do=None):
+    """Đọc XLSB theo từng lô dòng và ghi dần thành các row group Parquet.
+
+    Bộ nhớ chỉ phụ thuộc kích thước lô. Kết quả được ghi vào file tạm rồi mới thay thế
+    file_parquet, nên nếu lỗi giữa chừng thì cache cũ vẫn nguyên vẹn.
+    bao_tien_do(so_dong, tong_so_dong, dong_moi_giay) được gọi sau mỗi lô.
+    Trả về tổng số dòng dữ liệu đã ghi.
+    """
+    file_tam = f"{file_parquet}.{os.getpid()}.{threading.get_ident()}.tmp"
+    writer, so_dong, bat_dau = None, 0, time.perf_counter()
+    try:
+        with open_workbook(file_xlsb) as wb:
+            with wb.get_sheet(1) as sheet:
+                tong = max(sheet.dimension.h - 1, 0) if sheet.dimension else 0
+                dong_iter = sheet.rows(sparse=True)
+                tieu_de = next(dong_iter, None)
+                if tieu_de is None: raise ValueError("File Excel không có dữ liệu.")
+                tieu_de = _chuan_hoa_tieu_de([o.v for o in tieu_de])
+                so_cot = len(tieu_de)
+                lo = []
+                for dong in dong_iter:
+                    gia_tri = [None] * so_cot
+                    for o in dong:
+                        if o.c < so_cot: gia_tri[o.c] = _gia_tri_o(o.v)
+                    if not any(v is not None for v in gia_tri): continue
+                    lo.append(gia_tri)
+                    if len(lo) >= so_dong_moi_lo:
+                        writer = _ghi_lo_parquet(writer, file_tam, tieu_de, lo)
+                        so_dong += len(lo); lo = []
+                        if bao_tien_do: bao_tien_do(so_dong, tong, so_dong / (time.perf_counter() - bat_dau))
+                if lo or writer is None:
+                    writer = _ghi_lo_parquet(writer, file_tam, tieu_de, lo)
+                    so_dong += len(lo)
+        writer.close(); writer = None
+        if bao_tien_do: bao_tien_do(so_dong, so_dong, so_dong / max(time.perf_counter() - bat_dau, 1e-9))
+        os.replace(file_tam, file_parquet)
+        return so_dong
+    finally:
+        if writer is not None: writer.close()
+        if os.path.exists(file_tam): os.remove(file_tam)
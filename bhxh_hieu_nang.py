@@ -0,0 +1,194 @@
+"""Đo hiệu năng từng thao tác (thời gian, bộ nhớ, số dòng, bộ đệm) và lưu theo tháng để xem lại.
+
+Một lần đo chỉ tốn hai lần đọc đồng hồ và hai lần đọc /proc/self/statm; bản ghi được đưa vào
+hàng đợi và ghi theo lô ở luồng nền như nhật ký hoạt động, vào file hieu_nang_YYYY-MM.sqlite.
+Hàm bên trong một phép đo ghi thêm số dòng / trúng bộ đệm qua ghi_so_dong() mà không cần nhận
+đối tượng đo làm tham số. RSS là của cả tiến trình (mọi phiên dùng chung), nên RSS tăng chỉ là
+ước lượng khi nhiều phiên chạy cùng lúc. Có thể bật cProfile cho riêng phép đo của một phiên.
+"""
+import cProfile
+import glob
+import io
+import os
+import pstats
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+from bhxh_nhat_ky import BoGhiNhatKy, moc_thoi_gian, DINH_DANG_THOI_GIAN, DO_DAI_CHI_TIET
+
+TIEN_TO_PHAN_VUNG = 'hieu_nang_'
+COT_DO = ['thoi_gian', 'chuc_nang', 'nguoi_dung', 'chi_tiet', 'giay', 'rss_tang_mb', 'so_dong_quet', 'so_dong_tra', 'trung_bo_dem', 'loi']
+NGUONG_CHAM = 1.0            # Giây; thao tác lâu hơn được coi là chậm
+SO_HO_SO_GIU_LAI = 20        # Số kết quả cProfile gần nhất giữ trong bộ nhớ
+SO_DONG_HO_SO = 25           # Số hàm in ra trong mỗi kết quả cProfile
+SO_DONG_DOC_TOI_DA = 500_000 # Giới hạn số lần đo đọc lên khi tổng hợp một khoảng thời gian
+_TRANG = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def rss_mb():
+    """RSS hiện tại của tiến trình (MB), None nếu không đọc được /proc."""
+    try:
+        with open('/proc/self/statm', 'rb') as f: return int(f.read().split()[1]) * _TRANG / 2**20
+    except (OSError, ValueError, IndexError): return None
+
+# --- PHÂN VÙNG ---
+def _ket_noi(duong_dan):
+    ket_noi = sqlite3.connect(duong_dan, timeout=30)
+    ket_noi.execute("PRAGMA journal_mode=WAL"); ket_noi.execute("PRAGMA synchronous=NORMAL")
+    ket_noi.execute("CREATE TABLE IF NOT EXISTS do_luong (thoi_gian TEXT NOT NULL, chuc_nang TEXT NOT NULL, nguoi_dung TEXT, chi_tiet TEXT, "
+                    "giay REAL NOT NULL, rss_tang_mb REAL, so_dong_quet INTEGER, so_dong_tra INTEGER, trung_bo_dem INTEGER, loi TEXT)")
+    ket_noi.execute("CREATE INDEX IF NOT EXISTS ix_thoi_gian ON do_luong (thoi_gian)")
+    ket_noi.execute("CREATE INDEX IF NOT EXISTS ix_giay ON do_luong (giay)")
+    return ket_noi
+
+def ghi_lo(thu_muc, cac_dong):
+    """Ghi một lô bản ghi đo (theo COT_DO), mỗi phân vùng tháng một giao dịch."""
+    theo_phan_vung = {}
+    for dong in cac_dong: theo_phan_vung.setdefault(f"{TIEN_TO_PHAN_VUNG}{dong[0][:7]}.sqlite", []).append(dong)
+    os.makedirs(thu_muc, exist_ok=True)
+    for ten, lo in theo_phan_vung.items():
+        ket_noi = _ket_noi(os.path.join(thu_muc, ten))
+        try:
+            with ket_noi: ket_noi.executemany(f"INSERT INTO do_luong VALUES ({', '.join('?' * len(COT_DO))})", lo)
+        finally:
+            ket_noi.close()
+
+def cac_phan_vung(thu_muc, tu=None, den=None):
+    kq = []
+    for duong_dan in glob.glob(os.path.join(thu_muc, f"{TIEN_TO_PHAN_VUNG}*.sqlite")):
+        thang = os.path.basename(duong_dan)[len(TIEN_TO_PHAN_VUNG):-len('.sqlite')]
+        if (tu and thang < tu[:7]) or (den and thang > den[:7]): continue
+        kq.append(duong_dan)
+    return sorted(kq, reverse=True)
+
+# --- ĐO ---
+_hien_tai = threading.local()   # Ngăn xếp phép đo đang mở của luồng (mỗi lượt chạy trang Streamlit là một luồng)
+
+def _ngan_xep():
+    if not hasattr(_hien_tai, 'ngan_xep'): _hien_tai.ngan_xep = []
+    return _hien_tai.ngan_xep
+
+class PhepDo:
+    __slots__ = ('chuc_nang', 'nguoi_dung', 'chi_tiet', 'so_dong_quet', 'so_dong_tra', 'trung_bo_dem', 'loi')
+    def __init__(self, chuc_nang, nguoi_dung='', chi_tiet=''):
+        self.chuc_nang, self.nguoi_dung, self.chi_tiet = chuc_nang, nguoi_dung, chi_tiet
+        self.so_dong_quet = self.so_dong_tra = self.trung_bo_dem = self.loi = None
+
+def phep_do_hien_tai():
+    """Phép đo trong cùng nhất đang mở ở luồng này (None nếu không có)."""
+    ngan_xep = _ngan_xep()
+    return ngan_xep[-1] if ngan_xep else None
+
+def ghi_so_dong(quet=None, tra=None, trung_bo_dem=None):
+    """Ghi số dòng đã quét / trả về và trúng bộ đệm vào phép đo đang mở; số dòng quét được cộng dồn."""
+    phep_do = phep_do_hien_tai()
+    if phep_do is None: return
+    if quet is not None: phep_do.so_dong_quet = (phep_do.so_dong_quet or 0) + int(quet)
+    if tra is not None: phep_do.so_dong_tra = int(tra)
+    if trung_bo_dem is not None: phep_do.trung_bo_dem = bool(trung_bo_dem) and phep_do.trung_bo_dem is not False   # Một lần trượt là trượt
+
+class BoDoHieuNang:
+    """Kho số đo dùng chung cho mọi phiên (tạo một lần bằng st.cache_resource)."""
+    def __init__(self, thu_muc):
+        self.thu_muc = thu_muc
+        self._bo_ghi = BoGhiNhatKy(thu_muc, ham_ghi=ghi_lo, ten_luong='ghi_hieu_nang')
+        self._ho_so = deque(maxlen=SO_HO_SO_GIU_LAI)
+
+    def ghi(self, chuc_nang, nguoi_dung='', chi_tiet='', giay=0.0, rss_tang_mb=None, so_dong_quet=None, so_dong_tra=None, trung_bo_dem=None, loi=None):
+        self._bo_ghi.them((datetime.now().strftime(DINH_DANG_THOI_GIAN), str(chuc_nang), str(nguoi_dung or ''), str(chi_tiet or '')[:DO_DAI_CHI_TIET],
+                           float(giay), rss_tang_mb, so_dong_quet, so_dong_tra, None if trung_bo_dem is None else int(trung_bo_dem), loi))
+
+    @contextmanager
+    def do(self, chuc_nang, nguoi_dung='', chi_tiet='', ho_so=False):
+        """Đo khối lệnh bên trong; ho_so=True chạy thêm cProfile (chỉ ở phép đo ngoài cùng)."""
+        ngan_xep = _ngan_xep(); phep_do = PhepDo(chuc_nang, nguoi_dung, chi_tiet)
+        bo_ho_so = None
+        if ho_so and not ngan_xep:
+            bo_ho_so = cProfile.Profile()
+            try: bo_ho_so.enable()
+            except ValueError: bo_ho_so = None   # Đã có công cụ profile khác đang chạy
+        ngan_xep.append(phep_do)
+        rss_truoc = rss_mb(); bat_dau = time.perf_counter()
+        try:
+            yield phep_do
+        except Exception as e:
+            phep_do.loi = type(e).__name__; raise
+        finally:
+            giay = time.perf_counter() - bat_dau; rss_sau = rss_mb()
+            if bo_ho_so is not None: bo_ho_so.disable(); self._luu_ho_so(phep_do, giay, bo_ho_so)
+            ngan_xep.pop()
+            self.ghi(phep_do.chuc_nang, phep_do.nguoi_dung, phep_do.chi_tiet, giay, None if rss_truoc is None or rss_sau is None else round(rss_sau - rss_truoc, 2),
+                     phep_do.so_dong_quet, phep_do.so_dong_tra, phep_do.trung_bo_dem, phep_do.loi)
+
+    def _luu_ho_so(self, phep_do, giay, bo_ho_so):
+        dau_ra = io.StringIO()
+        pstats.Stats(bo_ho_so, stream=dau_ra).sort_stats('cumulative').print_stats(SO_DONG_HO_SO)
+        self._ho_so.appendleft({'thoi_gian': datetime.now().strftime(DINH_DANG_THOI_GIAN), 'chuc_nang': phep_do.chuc_nang,
+                                'nguoi_dung': phep_do.nguoi_dung, 'chi_tiet': phep_do.chi_tiet, 'giay': giay, 'bao_cao': dau_ra.getvalue()})
+
+    def cac_ho_so(self, nguoi_dung=None):
+        """Kết quả cProfile gần nhất (mới nhất trước)."""
+        return [h for h in list(self._ho_so) if nguoi_dung is None or h['nguoi_dung'] == nguoi_dung]
+
+    def xa(self):
+        """Ghi hết các số đo đang chờ (để màn hình thống kê thấy cả thao tác vừa làm)."""
+        self._bo_ghi.xa()
+
+    def dong(self):
+        self._bo_ghi.dong()
+
+# --- ĐỌC VÀ TỔNG HỢP ---
+def doc_do_luong(thu_muc, tu=None, den=None, chuc_nang=None, so_dong_toi_da=SO_DONG_DOC_TOI_DA):
+    """Các lần đo trong khoảng [tu, den] (mới nhất trước), tối đa so_dong_toi_da dòng."""
+    tu, den = moc_thoi_gian(tu), moc_thoi_gian(den, cuoi_ngay=True)
+    dieu_kien, tham_so = [], []
+    if tu: dieu_kien.append("thoi_gian >= ?"); tham_so.append(tu)
+    if den: dieu_kien.append("thoi_gian <= ?"); tham_so.append(den)
+    if chuc_nang: dieu_kien.append(f"chuc_nang IN ({', '.join('?' * len(chuc_nang))})"); tham_so.extend(chuc_nang)
+    where = (" WHERE " + " AND ".join(dieu_kien)) if dieu_kien else ""
+    cac_phan, con_lai = [], so_dong_toi_da
+    for duong_dan in cac_phan_vung(thu_muc, tu, den):
+        if con_lai <= 0: break
+        ket_noi = _ket_noi(duong_dan)
+        try:
+            cac_dong = ket_noi.execute(f"SELECT {', '.join(COT_DO)} FROM do_luong{where} ORDER BY thoi_gian DESC LIMIT ?", [*tham_so, con_lai]).fetchall()
+        finally:
+            ket_noi.close()
+        cac_phan.extend(cac_dong); con_lai -= len(cac_dong)
+    df = pd.DataFrame(cac_phan, columns=COT_DO)
+    for cot in ('giay', 'rss_tang_mb', 'so_dong_quet', 'so_dong_tra', 'trung_bo_dem'): df[cot] = pd.to_numeric(df[cot]).astype('float64')   # Ô trống -> NaN
+    return df
+
+def tong_hop(df):
+    """Mỗi chức năng một dòng: số lượt, phân vị độ trễ (ms), số dòng trung bình, tỷ lệ trúng bộ đệm, số lỗi."""
+    if df.empty: return pd.DataFrame()
+    nhom = df.groupby('chuc_nang')
+    phan_vi = nhom['giay'].quantile([0.5, 0.95, 0.99]).unstack() * 1000
+    bang = pd.DataFrame({
+        'Số lượt': nhom.size(),
+        'p50 (ms)': phan_vi[0.5], 'p95 (ms)': phan_vi[0.95], 'p99 (ms)': phan_vi[0.99], 'Tối đa (ms)': nhom['giay'].max() * 1000,
+        'Dòng quét TB': nhom['so_dong_quet'].mean(), 'Dòng trả TB': nhom['so_dong_tra'].mean(),
+        'Trúng bộ đệm (%)': nhom['trung_bo_dem'].mean() * 100,   # Chỉ tính các lần có dùng bộ đệm
+        'RSS tăng TB (MB)': nhom['rss_tang_mb'].mean(),
+        'Số lỗi': nhom['loi'].count(),
+    })
+    return bang.sort_values('p95 (ms)', ascending=False).reset_index(names='Chức năng')
+
+def xu_huong(df, theo_gio=False):
+    """Số lượt, p50 và p95 (ms) của từng chức năng theo ngày (hoặc theo giờ)."""
+    if df.empty: return pd.DataFrame(columns=['Thời điểm', 'Chức năng', 'Số lượt', 'p50 (ms)', 'p95 (ms)'])
+    moc = df['thoi_gian'].str.slice(0, 13 if theo_gio else 10)
+    nhom = df.assign(moc=moc).groupby(['moc', 'chuc_nang'])['giay']
+    bang = pd.DataFrame({'Số lượt': nhom.size(), 'p50 (ms)': nhom.quantile(0.5) * 1000, 'p95 (ms)': nhom.quantile(0.95) * 1000}).reset_index()
+    bang['moc'] = pd.to_datetime(bang['moc'] + (':00' if theo_gio else ''))
+    return bang.rename(columns={'moc': 'Thời điểm', 'chuc_nang': 'Chức năng'}).sort_values('Thời điểm')
+
+def truy_van_cham(df, nguong=NGUONG_CHAM, so_dong=200):
+    """Các lần đo lâu hơn nguong giây, chậm nhất trước."""
+    cham = df[df['giay'] >= nguong].sort_values('giay', ascending=False).head(so_dong)
+    return cham.assign(ms=(cham['giay'] * 1000).round(0))[['thoi_gian', 'chuc_nang', 'nguoi_dung', 'chi_tiet', 'ms', 'so_dong_quet', 'so_dong_tra', 'trung_bo_dem', 'rss_tang_mb', 'loi']]
@@ -0,0 +1,258 @@
+"""Kho dữ liệu có phiên bản: một đoạn gốc + các đoạn delta, ghi nhận qua manifest.
+
+Người đọc chỉ nhìn thấy phiên bản ghi trong manifest.json. Mọi thay đổi được ghi ra
+file mới trước, sau đó manifest mới được thay thế nguyên tử (os.replace), nên phiên bản
+cũ vẫn được phục vụ cho đến khi phiên bản mới hoàn tất.
+"""
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from bhxh_du_lieu import (doc_du_lieu, luu_parquet, luu_arrow, doc_arrow_anh_xa, chuyen_xlsb_sang_parquet,
+                          la_cot_phu, cot_dang_chuoi)
+from bhxh_khoa_file import khoa_file
+
+FILE_MANIFEST = 'manifest.json'
+FILE_KHOA = '.ghi.lock'
+COT_KHOA = 'soBhxh'
+COT_THAO_TAC = '_thao_tac'
+SO_DELTA_TOI_DA = 8          # Gộp kho khi có nhiều đoạn delta hơn mức này
+TY_LE_GOP = 0.2              # ... hoặc khi tổng số dòng delta vượt 20% đoạn gốc
+TIEN_TO_CHIA_SE = 'chia_se_' # Bản Arrow dựng sẵn của từng phiên bản, dùng chung qua ánh xạ bộ nhớ
+
+# --- MANIFEST ---
+def doc_manifest(thu_muc):
+    duong_dan = os.path.join(thu_muc, FILE_MANIFEST)
+    if not os.path.exists(duong_dan): return None
+    with open(duong_dan, 'r', encoding='utf-8') as f: return json.load(f)
+
+def _ghi_manifest(thu_muc, manifest):
+    file_tam = os.path.join(thu_muc, f"{FILE_MANIFEST}.{os.getpid()}.tmp")
+    with open(file_tam, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+        f.flush(); os.fsync(f.fileno())
+    os.replace(file_tam, os.path.join(thu_muc, FILE_MANIFEST))
+
+def phien_ban(thu_muc):
+    """Mã phiên bản dữ liệu hiện hành ('' nếu kho chưa có dữ liệu)."""
+    manifest = doc_manifest(thu_muc)
+    return manifest['phien_ban'] if manifest else ""
+
+def _khoa_ghi(thu_muc, cho_toi_da=600):
+    """Khóa của hệ điều hành để hai lượt cập nhật (khác tiến trình hay khác luồng) không ghi kho cùng lúc."""
+    return khoa_file(os.path.join(thu_muc, FILE_KHOA), cho_toi_da, "Kho dữ liệu đang được cập nhật bởi phiên khác.", chu_ky=0.5)
+
+def file_tam_trong_kho(thu_muc, hau_to='.parquet'):
+    """Tên file tạm riêng cho từng lượt ghi (cùng thư mục kho để os.replace không phải chép qua ổ khác)."""
+    fd, duong_dan = tempfile.mkstemp(dir=thu_muc, prefix='moi_', suffix=hau_to)
+    os.close(fd)
+    return duong_dan
+
+def _ten_doan(loai, manifest_cu):
+    """Tên file đoạn mới, đánh số theo bộ đếm lần ghi manifest nên không bao giờ trùng."""
+    return f"{loai}_{(manifest_cu or {}).get('dem', 0) + 1:06d}.parquet"
+
+def _cam_ket(thu_muc, manifest_cu, goc, delta, so_phien_ban, ghi_chu):
+    """Ghi manifest mới rồi dọn các đoạn không còn được phiên bản hiện hành hay phiên bản trước dùng."""
+    manifest = {
+        'phien_ban': f"v{so_phien_ban:06d}", 'so': so_phien_ban,
+        'goc': goc, 'delta': delta, 'thoi_gian': time.strftime("%Y-%m-%d %H:%M:%S"), 'ghi_chu': ghi_chu,
+        'truoc': [manifest_cu['goc']] + manifest_cu['delta'] if manifest_cu else [],
+        'dem': (manifest_cu or {}).get('dem', 0) + 1,
+    }
+    _ghi_manifest(thu_muc, manifest)
+    dang_dung = set([goc] + delta + manifest['truoc'])
+    dang_dung |= {_ten_ban_chia_se(manifest['phien_ban'])} | ({_ten_ban_chia_se(manifest_cu['phien_ban'])} if manifest_cu else set())
+    for ten in os.listdir(thu_muc):
+        la_doan = ten.endswith('.parquet') and ten.startswith(('goc_', 'delta_'))
+        la_ban_chia_se = ten.endswith('.arrow') and ten.startswith(TIEN_TO_CHIA_SE)
+        if (la_doan or la_ban_chia_se) and ten not in dang_dung:
+            try: os.remove(os.path.join(thu_muc, ten))
+            except OSError: pass   # Windows không cho xóa file đang được ánh xạ; lần ghi sau sẽ dọn
+    return manifest
+
+# --- ĐỌC KHO ---
+def _noi(df_goc, df_them):
+    """Nối thêm dòng, giữ nguyên kiểu cột của df_goc (hợp nhất danh mục của cột category)."""
+    if df_them.empty: return df_goc
+    df_them = df_them.reindex(columns=df_goc.columns)
+    for cot in df_goc.columns:
+        kieu = df_goc[cot].dtype
+        if isinstance(kieu, pd.CategoricalDtype):
+            gia_tri = df_them[cot].dropna().astype(str).unique().tolist()
+            da_co = set(kieu.categories)
+            moi = [g for g in gia_tri if g not in da_co]
+            if moi: df_goc[cot] = df_goc[cot].cat.add_categories(moi)
+            df_them[cot] = pd.Categorical(df_them[cot].astype(object), categories=df_goc[cot].cat.categories)
+        elif df_them[cot].dtype != kieu:
+            df_them[cot] = df_them[cot].astype(kieu)
+    return pd.concat([df_goc, df_them], ignore_index=True)
+
+def _ap_delta(df, delta):
+    df = df[~df[COT_KHOA].isin(delta[COT_KHOA]).to_numpy(dtype=bool)]
+    them = delta[(delta[COT_THAO_TAC] != 'xoa').to_numpy(dtype=bool)].drop(columns=[COT_THAO_TAC])
+    return _noi(df.reset_index(drop=True), them.reset_index(drop=True))
+
+def doc_kho(thu_muc, manifest=None):
+    """Đọc phiên bản hiện hành: đoạn gốc rồi lần lượt áp các đoạn delta."""
+    manifest = manifest or doc_manifest(thu_muc)
+    if not manifest: return pd.DataFrame()
+    df, _ = doc_du_lieu(os.path.join(thu_muc, manifest['goc']))
+    for ten in manifest['delta']:
+        delta, _ = doc_du_lieu(os.path.join(thu_muc, ten))
+        df = _ap_delta(df, delta)
+    return df
+
+def _ten_ban_chia_se(ma_phien_ban):
+    return f"{TIEN_TO_CHIA_SE}{ma_phien_ban}.arrow"
+
+def duong_dan_ban_chia_se(thu_muc, ma_phien_ban):
+    """Đường dẫn bản Arrow của một phiên bản (để tiến trình khác tự mở lại bằng ánh xạ bộ nhớ)."""
+    return os.path.join(thu_muc, _ten_ban_chia_se(ma_phien_ban))
+
+def mo_ban_chia_se(thu_muc, ma_phien_ban=None):
+    """Mở phiên bản hiện hành (hay đúng ma_phien_ban) từ bản Arrow ánh xạ bộ nhớ, dựng bản này từ các đoạn nếu chưa có.
+
+    Mọi phiên Streamlit và tiến trình cùng đọc một phiên bản dùng chung trang nhớ của file thay vì
+    mỗi nơi giữ một bản sao. Trả về (phien_ban, df); df chỉ được đọc, không được sửa tại chỗ.
+    Chỉ mục của df là vị trí dòng (RangeIndex), nên nhãn chỉ mục của một lát cắt là vị trí trong bản.
+    Phiên bản cũ chỉ mở được khi bản Arrow của nó còn (kho giữ bản trước); không còn thì LookupError.
+    """
+    manifest = doc_manifest(thu_muc)
+    if not manifest: return "", pd.DataFrame()
+    if ma_phien_ban and ma_phien_ban != manifest['phien_ban']:
+        duong_dan = duong_dan_ban_chia_se(thu_muc, ma_phien_ban)
+        try: df = doc_arrow_anh_xa(duong_dan)
+        except FileNotFoundError: raise LookupError(f"Phiên bản {ma_phien_ban} không còn trong kho (hiện hành: {manifest['phien_ban']}).")
+        df.attrs['phien_ban'] = ma_phien_ban
+        return ma_phien_ban, df
+    duong_dan = duong_dan_ban_chia_se(thu_muc, manifest['phien_ban'])
+    if not os.path.exists(duong_dan): luu_arrow(doc_kho(thu_muc, manifest), duong_dan)
+    df = doc_arrow_anh_xa(duong_dan)
+    df.attrs['phien_ban'] = manifest['phien_ban']   # Đi theo mọi lát cắt để xuất file biết đọc bản nào
+    return manifest['phien_ban'], df
+
+# --- GHI KHO ---
+def ghi_ban_day_du(thu_muc, file_parquet_moi, ghi_chu="Thay thế toàn bộ"):
+    """Dùng file Parquet mới làm đoạn gốc của một phiên bản mới (bỏ mọi delta)."""
+    os.makedirs(thu_muc, exist_ok=True)
+    with _khoa_ghi(thu_muc): return _thay_goc(thu_muc, file_parquet_moi, ghi_chu)
+
+def _thay_goc(thu_muc, file_parquet_moi, ghi_chu):
+    """Phần việc của ghi_ban_day_du; người gọi phải đang giữ _khoa_ghi."""
+    manifest_cu = doc_manifest(thu_muc)
+    so = (manifest_cu['so'] if manifest_cu else 0) + 1
+    goc = _ten_doan('goc', manifest_cu)
+    os.replace(file_parquet_moi, os.path.join(thu_muc, goc))
+    return _cam_ket(thu_muc, manifest_cu, goc, [], so, ghi_chu)
+
+def _bam_dong(df, cac_cot):
+    """Băm nội dung từng dòng (ngày tháng băm theo dạng chuỗi để không phụ thuộc đơn vị thời gian)."""
+    bang = pd.DataFrame({c: cot_dang_chuoi(df, c) for c in cac_cot})
+    return pd.util.hash_pandas_object(bang, index=False).to_numpy()
+
+def tinh_delta(df_cu, df_moi):
+    """So sánh hai bản theo soBhxh. Trả về (vi_tri_them, vi_tri_sua trong df_moi, khoa_xoa)."""
+    cac_cot = [c for c in df_moi.columns if not la_cot_phu(c)]
+    khoa_cu = cot_dang_chuoi(df_cu, COT_KHOA).to_numpy(dtype=object)
+    khoa_moi = cot_dang_chuoi(df_moi, COT_KHOA).to_numpy(dtype=object)
+    bam_cu = pd.Series(_bam_dong(df_cu, cac_cot), index=khoa_cu)
+    bam_moi = _bam_dong(df_moi, cac_cot)
+    bam_doi_chieu = bam_cu.reindex(khoa_moi).to_numpy()
+    co_trong_cu = pd.Index(khoa_moi).isin(khoa_cu)
+    vi_tri_them = (~co_trong_cu).nonzero()[0]
+    vi_tri_sua = (co_trong_cu & (bam_doi_chieu != bam_moi)).nonzero()[0]
+    khoa_xoa = khoa_cu[~pd.Index(khoa_cu).isin(khoa_moi)]
+    return vi_tri_them, vi_tri_sua, khoa_xoa
+
+def _co_the_tang_dan(df_cu, df_moi):
+    """Chỉ cập nhật tăng dần khi cùng cấu trúc cột và soBhxh là khóa duy nhất, không trống."""
+    if df_cu.empty or COT_KHOA not in df_moi.columns: return False
+    cot_cu = [c for c in df_cu.columns if not la_cot_phu(c)]
+    cot_moi = [c for c in df_moi.columns if not la_cot_phu(c)]
+    if cot_cu != cot_moi: return False
+    for df in (df_cu, df_moi):
+        khoa = cot_dang_chuoi(df, COT_KHOA)
+        if (khoa == '').any() or khoa.duplicated().any(): return False
+    return True
+
+def cap_nhat_tang_dan(thu_muc, file_parquet_moi):
+    """Ghi phần chênh lệch giữa bản mới và phiên bản hiện hành thành một đoạn delta.
+
+    Nếu không thể so khớp theo soBhxh (đổi cấu trúc cột, khóa trùng/trống) thì thay thế toàn bộ.
+    Trả về dict tóm tắt: che_do, them, sua, xoa, phien_ban, da_gop.
+    """
+    os.makedirs(thu_muc, exist_ok=True)
+    with _khoa_ghi(thu_muc):
+        manifest_cu = doc_manifest(thu_muc)
+        df_cu = doc_kho(thu_muc, manifest_cu)
+        df_moi, _ = doc_du_lieu(file_parquet_moi)
+        so = (manifest_cu['so'] if manifest_cu else 0) + 1
+        if not _co_the_tang_dan(df_cu, df_moi):
+            goc = _ten_doan('goc', manifest_cu)
+            os.replace(file_parquet_moi, os.path.join(thu_muc, goc))
+            manifest = _cam_ket(thu_muc, manifest_cu, goc, [], so, "Thay thế toàn bộ (không so khớp được theo soBhxh)")
+            return {'che_do': 'toan_bo', 'them': len(df_moi), 'sua': 0, 'xoa': len(df_cu), 'phien_ban': manifest['phien_ban'], 'da_gop': False}
+
+        vi_tri_them, vi_tri_sua, khoa_xoa = tinh_delta(df_cu, df_moi)
+        tom_tat = {'che_do': 'tang_dan', 'them': len(vi_tri_them), 'sua': len(vi_tri_sua), 'xoa': len(khoa_xoa)}
+        if not (len(vi_tri_them) or len(vi_tri_sua) or len(khoa_xoa)):
+            os.remove(file_parquet_moi)
+            return {**tom_tat, 'phien_ban': manifest_cu['phien_ban'], 'da_gop': False}
+
+        vi_tri = np.concatenate([vi_tri_them, vi_tri_sua])
+        thay_doi = df_moi.iloc[vi_tri].copy()
+        thay_doi[COT_THAO_TAC] = ['them'] * len(vi_tri_them) + ['sua'] * len(vi_tri_sua)
+        xoa = pd.DataFrame({COT_KHOA: pd.array(khoa_xoa, dtype=df_moi[COT_KHOA].dtype), COT_THAO_TAC: 'xoa'})
+        delta = pd.concat([thay_doi, xoa], ignore_index=True) if len(xoa) else thay_doi
+        ten_delta = _ten_doan('delta', manifest_cu)
+        luu_parquet(delta, os.path.join(thu_muc, ten_delta))
+        os.remove(file_parquet_moi)
+        manifest = _cam_ket(thu_muc, manifest_cu, manifest_cu['goc'], manifest_cu['delta'] + [ten_delta], so,
+                            f"Delta: +{tom_tat['them']} ~{tom_tat['sua']} -{tom_tat['xoa']}")
+
+        so_dong_delta = sum(pd.read_parquet(os.path.join(thu_muc, t), columns=[COT_KHOA]).shape[0] for t in manifest['delta'])
+        da_gop = False
+        if len(manifest['delta']) > SO_DELTA_TOI_DA or so_dong_delta > TY_LE_GOP * max(len(df_cu), 1):
+            _gop(thu_muc, manifest); da_gop = True
+        return {**tom_tat, 'phien_ban': manifest['phien_ban'], 'da_gop': da_gop}
+
+def _gop(thu_muc, manifest):
+    """Gộp đoạn gốc và các delta thành đoạn gốc mới. Nội dung không đổi nên giữ nguyên mã phiên bản."""
+    df = doc_kho(thu_muc, manifest)
+    goc = _ten_doan('goc', manifest)
+    luu_parquet(df, os.path.join(thu_muc, goc))
+    moi = {**manifest, 'goc': goc, 'delta': [], 'truoc': [manifest['goc']] + manifest['delta'],
+           'dem': manifest['dem'] + 1, 'ghi_chu': manifest['ghi_chu'] + " (đã gộp)"}
+    _ghi_manifest(thu_muc, moi)
+    return moi
+
+def gop_kho(thu_muc):
+    """Gộp kho theo yêu cầu (ví dụ chạy định kỳ ngoài giờ làm việc)."""
+    with _khoa_ghi(thu_muc):
+        manifest = doc_manifest(thu_muc)
+        if manifest and manifest['delta']: return _gop(thu_muc, manifest)
+        return manifest
+
+def khoi_tao_kho(thu_muc, file_parquet_cu, file_excel):
+    """Tạo phiên bản đầu tiên từ cache Parquet cũ hoặc file Excel gốc nếu kho còn trống."""
+    if doc_manifest(thu_muc): return False
+    os.makedirs(thu_muc, exist_ok=True)
+    with _khoa_ghi(thu_muc):
+        if doc_manifest(thu_muc): return False   # Phiên khác vừa khởi tạo xong trong lúc chờ khóa
+        file_moi = file_tam_trong_kho(thu_muc)
+        try:
+            if os.path.exists(file_parquet_cu):
+                df, _ = doc_du_lieu(file_parquet_cu)   # Nâng cấp lược đồ của cache cũ một lần
+                luu_parquet(df, file_moi)
+            elif os.path.exists(file_excel): chuyen_xlsb_sang_parquet(file_excel, file_moi)
+            else: return False
+            _thay_goc(thu_muc, file_moi, "Khởi tạo kho")
+        finally:
+            if os.path.exists(file_moi): os.remove(file_moi)
+        if os.path.exists(file_parquet_cu): os.remove(file_parquet_cu)
+        return True
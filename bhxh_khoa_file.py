@@ -0,0 +1,38 @@
+"""Khóa ghi giữa các tiến trình và các luồng bằng khóa của hệ điều hành (flock / msvcrt.locking).
+
+Khóa gắn với file đang mở nên tự nhả khi tiến trình chết; file khóa không bao giờ bị xóa,
+vì xóa nó có thể làm hai bên cùng tưởng mình giữ khóa.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+    import msvcrt
+
+def _thu_khoa(fd):
+    try:
+        if fcntl: fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else: os.lseek(fd, 0, os.SEEK_SET); msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError: return False
+
+def _nha_khoa(fd):
+    if fcntl: fcntl.flock(fd, fcntl.LOCK_UN)
+    else: os.lseek(fd, 0, os.SEEK_SET); msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+@contextmanager
+def khoa_file(duong_dan, cho_toi_da=600, thong_bao="File đang được cập nhật bởi phiên khác.", chu_ky=0.05):
+    """Giữ khóa độc quyền trên duong_dan trong khối with; chờ quá cho_toi_da giây thì TimeoutError."""
+    fd = os.open(duong_dan, os.O_CREAT | os.O_RDWR)
+    try:
+        bat_dau = time.time()
+        while not _thu_khoa(fd):
+            if time.time() - bat_dau > cho_toi_da: raise TimeoutError(thong_bao)
+            time.sleep(chu_ky)
+        try: yield
+        finally: _nha_khoa(fd)
+    finally: os.close(fd)
@@ -0,0 +1,143 @@
+"""Kho tài khoản (users.json) dùng chung cho mọi phiên.
+
+Nội dung file được giữ trong bộ nhớ và chỉ đọc lại khi file đổi (so mtime, kích thước, inode), nên
+mỗi lượt chạy lại trang chỉ tốn một lần os.stat. Mọi thay đổi đi qua cap_nhat(): giữ khóa file,
+đọc lại bản mới nhất trên đĩa, sửa rồi ghi nguyên tử (file tạm + os.replace), nên hai quản trị
+viên sửa cùng lúc không ghi đè lên nhau. Số lần băm bcrypt chạy cùng lúc bị giới hạn bằng semaphore.
+"""
+import copy
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+
+import bcrypt
+
+from bhxh_khoa_file import khoa_file
+
+SO_LUONG_BAM = 2          # Số lần băm bcrypt cùng lúc trong tiến trình, tránh vài lần đăng nhập chiếm hết CPU
+CHO_KHOA_TOI_DA = 30      # Giây chờ khóa file tài khoản tối đa
+MAT_KHAU_MAC_DINH = "12345"
+TUOI_XAC_THUC = 300       # Giây một lần xác thực thành công được nhớ (API gọi liên tục không băm lại mỗi yêu cầu)
+
+def _la_ma_bam(chuoi):
+    return isinstance(chuoi, str) and chuoi.startswith(('$2a$', '$2b$', '$2y$')) and len(chuoi) == 60
+
+class KhoNguoiDung:
+    def __init__(self, duong_dan, so_luong_bam=SO_LUONG_BAM):
+        self.duong_dan = duong_dan
+        self._khoa = threading.Lock()
+        self._gioi_han_bam = threading.BoundedSemaphore(so_luong_bam)
+        self._dau_hieu = None   # (mtime_ns, kích thước, inode) của bản đang giữ
+        self._cau_hinh = {'usernames': {}}
+        self._bi_mat = os.urandom(32)
+        self._da_xac_thuc = {}  # HMAC(tên, mật khẩu) -> (mã băm lúc kiểm tra, hạn)
+
+    # --- Băm mật khẩu ---
+    def bam_mat_khau(self, mat_khau):
+        with self._gioi_han_bam: return bcrypt.hashpw(mat_khau.encode(), bcrypt.gensalt()).decode()
+
+    def kiem_tra_mat_khau(self, mat_khau, ma_bam):
+        try:
+            with self._gioi_han_bam: return bcrypt.checkpw(mat_khau.encode(), ma_bam.encode())
+        except ValueError: return False
+
+    def xac_thuc(self, ten_dang_nhap, mat_khau):
+        """Thông tin tài khoản nếu đúng mật khẩu, ngược lại None.
+
+        Lần đúng gần đây được nhớ theo HMAC với khóa ngẫu nhiên của tiến trình (không giữ mật khẩu
+        thô); đổi mật khẩu làm mã băm đổi nên bản nhớ cũ tự mất hiệu lực.
+        """
+        tai_khoan = self.doc()['usernames'].get(ten_dang_nhap)
+        if not tai_khoan: return None
+        khoa = hmac.new(self._bi_mat, f"{ten_dang_nhap}\0{mat_khau}".encode(), hashlib.sha256).digest()
+        muc = self._da_xac_thuc.get(khoa)
+        if muc and muc[0] == tai_khoan['password'] and muc[1] > time.monotonic(): return tai_khoan
+        if not self.kiem_tra_mat_khau(mat_khau, tai_khoan['password']): return None
+        if len(self._da_xac_thuc) > 1000: self._da_xac_thuc.clear()
+        self._da_xac_thuc[khoa] = (tai_khoan['password'], time.monotonic() + TUOI_XAC_THUC)
+        return tai_khoan
+
+    # --- Đọc ---
+    def _dau_hieu_file(self):
+        try: tt = os.stat(self.duong_dan)
+        except FileNotFoundError: return None
+        return (tt.st_mtime_ns, tt.st_size, tt.st_ino)   # Ghi nguyên tử luôn đổi inode
+
+    def _doc_dia(self):
+        try:
+            with open(self.duong_dan, 'r', encoding='utf-8') as f: cau_hinh = json.load(f)
+        except (OSError, ValueError): cau_hinh = {}
+        cau_hinh.setdefault('usernames', {})
+        return cau_hinh
+
+    def doc(self):
+        """Cấu hình tài khoản hiện hành. Bản dùng chung: chỉ đọc, muốn sửa thì qua cap_nhat()."""
+        dau_hieu = self._dau_hieu_file()
+        if dau_hieu is None: self._khoi_tao(); dau_hieu = self._dau_hieu_file()
+        if dau_hieu != self._dau_hieu:
+            with self._khoa:
+                if dau_hieu != self._dau_hieu:
+                    cau_hinh = self._doc_dia()
+                    if any(not _la_ma_bam(u.get('password')) for u in cau_hinh['usernames'].values()):
+                        return self.cap_nhat(lambda c: None) or self._cau_hinh   # File sửa tay còn mật khẩu thô: băm một lần rồi ghi lại
+                    self._cau_hinh, self._dau_hieu = cau_hinh, dau_hieu
+        return self._cau_hinh
+
+    @property
+    def phien_ban(self):
+        """Đổi mỗi khi file tài khoản đổi; dùng làm khóa cho các đối tượng dựng từ cấu hình."""
+        self.doc()
+        return self._dau_hieu
+
+    # --- Ghi ---
+    def _khoa_file(self):
+        """Khóa giữa các tiến trình và luồng (cùng cách khóa của kho dữ liệu)."""
+        return khoa_file(self.duong_dan + '.lock', CHO_KHOA_TOI_DA, "File tài khoản đang được cập nhật bởi phiên khác.")
+
+    def _ghi(self, cau_hinh):
+        file_tam = f"{self.duong_dan}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(file_tam, 'w', encoding='utf-8') as f:
+            json.dump(cau_hinh, f, ensure_ascii=False)
+            f.flush(); os.fsync(f.fileno())
+        os.replace(file_tam, self.duong_dan)
+
+    def cap_nhat(self, ham):
+        """Đọc bản mới nhất trên đĩa, gọi ham(cau_hinh) để sửa tại chỗ rồi ghi nguyên tử. Trả về kết quả của ham.
+
+        Lỗi ném ra từ ham (vd. tên đăng nhập đã tồn tại) hủy cả lần ghi.
+        """
+        da_bam = self._bam_truoc(ham)
+        with self._khoa_file():
+            cau_hinh = self._doc_dia(); truoc = copy.deepcopy(cau_hinh)
+            ket_qua = ham(cau_hinh)
+            for u in cau_hinh['usernames'].values():
+                if not _la_ma_bam(u.get('password')):
+                    mat_khau = str(u.get('password') or '')
+                    u['password'] = da_bam.get(mat_khau) or self.bam_mat_khau(mat_khau)   # Chỉ băm trong khóa nếu file vừa đổi
+            if cau_hinh != truoc or self._dau_hieu_file() is None: self._ghi(cau_hinh)   # Không đổi gì thì không ghi, để các phiên khỏi dựng lại
+            dau_hieu = self._dau_hieu_file()
+        self._cau_hinh, self._dau_hieu = cau_hinh, dau_hieu
+        return ket_qua
+
+    def _bam_truoc(self, ham):
+        """Chạy thử ham trên bản đọc không khóa để băm sẵn các mật khẩu thô (bcrypt chậm, không giữ khóa lúc băm)."""
+        thu = self._doc_dia()
+        try: ham(thu)
+        except Exception: return {}   # Để lần chạy trong khóa quyết định
+        tho = {str(u.get('password') or '') for u in thu['usernames'].values() if not _la_ma_bam(u.get('password'))}
+        return {mat_khau: self.bam_mat_khau(mat_khau) for mat_khau in tho}
+
+    def _khoi_tao(self):
+        """Tạo file với tài khoản quản trị mặc định khi chưa có (mật khẩu được cap_nhat băm)."""
+        def tao(cau_hinh):
+            if not cau_hinh['usernames']:
+                cau_hinh['usernames']['bhxh_admin'] = {'name': 'Admin Tổng', 'email': 'admin@bhxh.vn',
+                                                       'password': MAT_KHAU_MAC_DINH, 'role': 'admin'}
+        self.cap_nhat(tao)
+
+    def ban_sao(self):
+        """Bản sao sâu cho thư viện đăng nhập (nó ghi số lần đăng nhập sai... vào cấu hình)."""
+        return copy.deepcopy(self.doc())
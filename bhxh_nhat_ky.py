@@ -0,0 +1,196 @@
+"""Nhật ký hoạt động: ghi theo lô ở luồng nền, lưu thành các phân vùng SQLite theo tháng.
+
+log_action chỉ đưa một dòng vào hàng đợi trong bộ nhớ; luồng ghi gom nhiều dòng rồi ghi
+một giao dịch vào file nhat_ky_YYYY-MM.sqlite của tháng tương ứng. Mỗi phân vùng có chỉ mục
+(người dùng, thời gian) và (thời gian) nên màn hình nhật ký lọc và phân trang mà không phải
+đọc toàn bộ lịch sử.
+"""
+import atexit
+import csv
+import glob
+import io
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+COT_NHAT_KY = ['Thời gian', 'Người dùng', 'Hành động', 'Chi tiết']
+TIEN_TO_PHAN_VUNG = 'nhat_ky_'
+DO_DAI_CHI_TIET = 150        # Giới hạn độ dài chi tiết như bản ghi CSV cũ
+SO_DONG_MOI_LO_GHI = 500     # Số dòng tối đa trong một giao dịch ghi
+CHU_KY_GHI = 1.0             # Giây chờ gom lô trước khi ghi
+DINH_DANG_THOI_GIAN = "%Y-%m-%d %H:%M:%S"
+
+# --- PHÂN VÙNG ---
+def _ten_phan_vung(thoi_gian):
+    return f"{TIEN_TO_PHAN_VUNG}{thoi_gian[:7]}.sqlite"   # 'YYYY-MM-DD HH:MM:SS' -> nhat_ky_YYYY-MM.sqlite
+
+def _ket_noi(duong_dan):
+    ket_noi = sqlite3.connect(duong_dan, timeout=30)
+    ket_noi.execute("PRAGMA journal_mode=WAL"); ket_noi.execute("PRAGMA synchronous=NORMAL")
+    ket_noi.execute("CREATE TABLE IF NOT EXISTS nhat_ky (thoi_gian TEXT NOT NULL, nguoi_dung TEXT NOT NULL, hanh_dong TEXT, chi_tiet TEXT)")
+    ket_noi.execute("CREATE INDEX IF NOT EXISTS ix_nguoi_dung_thoi_gian ON nhat_ky (nguoi_dung, thoi_gian)")
+    ket_noi.execute("CREATE INDEX IF NOT EXISTS ix_thoi_gian ON nhat_ky (thoi_gian)")
+    return ket_noi
+
+def ghi_lo(thu_muc, cac_dong):
+    """Ghi một lô (thoi_gian, nguoi_dung, hanh_dong, chi_tiet), mỗi phân vùng một giao dịch."""
+    theo_phan_vung = {}
+    for dong in cac_dong: theo_phan_vung.setdefault(_ten_phan_vung(dong[0]), []).append(dong)
+    os.makedirs(thu_muc, exist_ok=True)
+    for ten, lo in theo_phan_vung.items():
+        ket_noi = _ket_noi(os.path.join(thu_muc, ten))
+        try:
+            with ket_noi: ket_noi.executemany("INSERT INTO nhat_ky VALUES (?, ?, ?, ?)", lo)
+        finally:
+            ket_noi.close()
+
+def cac_phan_vung(thu_muc, tu=None, den=None):
+    """Các file phân vùng giao với khoảng [tu, den], mới nhất trước."""
+    kq = []
+    for duong_dan in glob.glob(os.path.join(thu_muc, f"{TIEN_TO_PHAN_VUNG}*.sqlite")):
+        thang = os.path.basename(duong_dan)[len(TIEN_TO_PHAN_VUNG):-len('.sqlite')]
+        if (tu and thang < tu[:7]) or (den and thang > den[:7]): continue
+        kq.append(duong_dan)
+    return sorted(kq, reverse=True)
+
+# --- GHI NỀN ---
+class BoGhiNhatKy:
+    """Hàng đợi nhật ký dùng chung cho mọi phiên; một luồng nền ghi theo lô.
+
+    ham_ghi(thu_muc, cac_dong) ghi một lô; mặc định là ghi_lo của nhật ký hoạt động.
+    """
+    def __init__(self, thu_muc, so_dong_moi_lo=SO_DONG_MOI_LO_GHI, chu_ky=CHU_KY_GHI, ham_ghi=ghi_lo, ten_luong='ghi_nhat_ky'):
+        self.thu_muc = thu_muc
+        self.so_dong_moi_lo, self.chu_ky = so_dong_moi_lo, chu_ky
+        self._ham_ghi = ham_ghi
+        self._hang_doi = queue.Queue()
+        self._cho_ghi = []   # Lô chưa ghi được (file đang bị khóa...), thử lại ở chu kỳ sau
+        self._dung = threading.Event()
+        self._luong = threading.Thread(target=self._chay, name=ten_luong, daemon=True)
+        self._luong.start()
+        atexit.register(self.dong)
+
+    def ghi(self, nguoi_dung, hanh_dong, chi_tiet=""):
+        self.them((datetime.now().strftime(DINH_DANG_THOI_GIAN), str(nguoi_dung), str(hanh_dong), str(chi_tiet)[:DO_DAI_CHI_TIET]))
+
+    def them(self, dong):
+        """Đưa một dòng đã định dạng (tuple, phần tử đầu là thời gian) vào hàng đợi."""
+        self._hang_doi.put(dong)
+
+    def xa(self, cho_toi_da=10):
+        """Chờ luồng nền ghi hết những dòng đã vào hàng đợi (để màn hình nhật ký thấy ngay)."""
+        if not self._luong.is_alive(): self._ghi_het(); return
+        xong = threading.Event(); self._hang_doi.put(xong); xong.wait(cho_toi_da)
+
+    def dong(self):
+        if self._dung.is_set(): return
+        self._dung.set(); self._hang_doi.put(None)
+        self._luong.join(timeout=10)
+        self._ghi_het()
+
+    def _ghi_het(self):
+        """Ghi đồng bộ phần còn lại trong hàng đợi (khi luồng nền đã dừng)."""
+        while True:
+            try: muc = self._hang_doi.get_nowait()
+            except queue.Empty: break
+            if isinstance(muc, tuple): self._cho_ghi.append(muc)
+            elif isinstance(muc, threading.Event): muc.set()
+        self._ghi_cho()
+
+    def _ghi_cho(self):
+        if not self._cho_ghi: return True
+        try:
+            self._ham_ghi(self.thu_muc, self._cho_ghi); self._cho_ghi = []; return True
+        except sqlite3.Error:
+            return False
+
+    def _chay(self):
+        while not self._dung.is_set():
+            cac_su_kien = []
+            try: muc = self._hang_doi.get(timeout=self.chu_ky)
+            except queue.Empty: muc = False
+            # Gom thêm những dòng đang chờ, tối đa so_dong_moi_lo, rồi ghi một lần
+            while muc is not False:
+                if muc is None: break
+                if isinstance(muc, threading.Event): cac_su_kien.append(muc)
+                else: self._cho_ghi.append(muc)
+                if len(self._cho_ghi) >= self.so_dong_moi_lo: break
+                try: muc = self._hang_doi.get_nowait()
+                except queue.Empty: muc = False
+            if not self._ghi_cho(): time.sleep(self.chu_ky)
+            for su_kien in cac_su_kien: su_kien.set()
+
+# --- ĐỌC ---
+def _dieu_kien(nguoi_dung, tu, den):
+    dieu_kien, tham_so = [], []
+    if nguoi_dung: dieu_kien.append("nguoi_dung = ?"); tham_so.append(nguoi_dung)
+    if tu: dieu_kien.append("thoi_gian >= ?"); tham_so.append(tu)
+    if den: dieu_kien.append("thoi_gian <= ?"); tham_so.append(den)
+    return (" WHERE " + " AND ".join(dieu_kien)) if dieu_kien else "", tham_so
+
+def moc_thoi_gian(ngay, cuoi_ngay=False):
+    """date/datetime/chuỗi -> chuỗi thời gian so sánh được với cột thoi_gian."""
+    if ngay is None or ngay == "": return None
+    if isinstance(ngay, datetime): return ngay.strftime(DINH_DANG_THOI_GIAN)
+    ngay = str(ngay)
+    return ngay if len(ngay) > 10 else f"{ngay} {'23:59:59' if cuoi_ngay else '00:00:00'}"
+
+def truy_van(thu_muc, nguoi_dung=None, tu=None, den=None, trang=0, so_dong_moi_trang=100):
+    """Một trang nhật ký (mới nhất trước) và tổng số dòng khớp điều kiện.
+
+    Mỗi phân vùng chỉ được đếm qua chỉ mục; dữ liệu chỉ đọc ở những phân vùng chứa trang cần xem.
+    """
+    tu, den = moc_thoi_gian(tu), moc_thoi_gian(den, cuoi_ngay=True)
+    where, tham_so = _dieu_kien(nguoi_dung, tu, den)
+    bo_qua, con_lai, tong, cac_phan = trang * so_dong_moi_trang, so_dong_moi_trang, 0, []
+    for duong_dan in cac_phan_vung(thu_muc, tu, den):
+        ket_noi = _ket_noi(duong_dan)
+        try:
+            dem = ket_noi.execute(f"SELECT COUNT(*) FROM nhat_ky{where}", tham_so).fetchone()[0]
+            tong += dem
+            if con_lai and bo_qua < dem:
+                cac_dong = ket_noi.execute(f"SELECT thoi_gian, nguoi_dung, hanh_dong, chi_tiet FROM nhat_ky{where} "
+                                           "ORDER BY thoi_gian DESC, rowid DESC LIMIT ? OFFSET ?", [*tham_so, con_lai, bo_qua]).fetchall()
+                cac_phan.extend(cac_dong); con_lai -= len(cac_dong); bo_qua = 0
+            elif con_lai: bo_qua -= dem
+        finally:
+            ket_noi.close()
+    return pd.DataFrame(cac_phan, columns=COT_NHAT_KY), tong
+
+def doc_tung_lo(thu_muc, nguoi_dung=None, tu=None, den=None, so_dong_moi_lo=50_000):
+    """Đọc tuần tự mọi dòng khớp điều kiện theo từng lô (dùng khi tải file nhật ký)."""
+    tu, den = moc_thoi_gian(tu), moc_thoi_gian(den, cuoi_ngay=True)
+    where, tham_so = _dieu_kien(nguoi_dung, tu, den)
+    for duong_dan in cac_phan_vung(thu_muc, tu, den):
+        ket_noi = _ket_noi(duong_dan)
+        try:
+            con_tro = ket_noi.execute(f"SELECT thoi_gian, nguoi_dung, hanh_dong, chi_tiet FROM nhat_ky{where} ORDER BY thoi_gian DESC, rowid DESC", tham_so)
+            while cac_dong := con_tro.fetchmany(so_dong_moi_lo): yield cac_dong
+        finally:
+            ket_noi.close()
+
+def xuat_csv(thu_muc, nguoi_dung=None, tu=None, den=None):
+    """Nội dung CSV (utf-8-sig) của các dòng khớp điều kiện."""
+    bo_dem = io.StringIO(); viet = csv.writer(bo_dem)
+    viet.writerow(COT_NHAT_KY)
+    for lo in doc_tung_lo(thu_muc, nguoi_dung, tu, den): viet.writerows(lo)
+    return bo_dem.getvalue().encode('utf-8-sig')
+
+def chuyen_csv_cu(file_csv, thu_muc, so_dong_moi_lo=50_000):
+    """Chuyển activity_logs.csv của bản cũ vào các phân vùng (một lần), rồi đổi tên file cũ."""
+    if not os.path.exists(file_csv): return 0
+    tong, lo = 0, []
+    with open(file_csv, newline='', encoding='utf-8') as f:
+        doc = csv.reader(f); next(doc, None)
+        for dong in doc:
+            if len(dong) < 4 or not dong[0]: continue
+            lo.append((dong[0], dong[1], dong[2], dong[3][:DO_DAI_CHI_TIET]))
+            if len(lo) >= so_dong_moi_lo: ghi_lo(thu_muc, lo); tong += len(lo); lo = []
+    if lo: ghi_lo(thu_muc, lo); tong += len(lo)
+    os.replace(file_csv, f"{file_csv}.da_chuyen")
+    return tong
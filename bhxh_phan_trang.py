@@ -0,0 +1,49 @@
+"""Phân trang kết quả phía máy chủ.
+
+Con trỏ kết quả chỉ giữ vị trí dòng của toàn bộ kết quả trên dữ liệu đang nạp; mỗi lần
+chuyển trang chỉ cắt ra và định dạng đúng những dòng đang xem, không chạy lại truy vấn.
+"""
+import hashlib
+from functools import lru_cache
+
+import numpy as np
+
+from bhxh_du_lieu import dang_hien_thi
+
+SO_DONG_MOI_TRANG = 10         # Số hồ sơ mỗi trang khi hiện dạng thẻ
+SO_DONG_MOI_TRANG_BANG = 100   # Số dòng mỗi trang khi hiện dạng bảng
+
+@lru_cache(maxsize=32)
+def anh_xa_cot(cac_cot_du_lieu, cac_cot_can):
+    """((cột cần, tên cột thực hoặc None), ...) so khớp không phân biệt hoa thường; tính một lần cho mỗi bộ cột."""
+    theo_chu_thuong = {}
+    for cot in cac_cot_du_lieu: theo_chu_thuong.setdefault(str(cot).lower(), cot)
+    return tuple((cot, theo_chu_thuong.get(cot.lower())) for cot in cac_cot_can)
+
+class ConTroKetQua:
+    """Vị trí dòng của một kết quả trên df; vi_tri=None là toàn bộ df."""
+    def __init__(self, df, vi_tri=None, so_dong_moi_trang=SO_DONG_MOI_TRANG):
+        self.df = df
+        self.vi_tri = np.arange(len(df)) if vi_tri is None else np.asarray(vi_tri, dtype=np.int64)
+        self.so_dong_moi_trang = so_dong_moi_trang
+        bam = hashlib.sha1(str(df.attrs.get('phien_ban', '')).encode()); bam.update(self.vi_tri.tobytes())
+        self.ma = bam.hexdigest()[:16]   # Đổi khi kết quả đổi, để giao diện quay về trang đầu
+
+    def __len__(self):
+        return len(self.vi_tri)
+
+    @property
+    def so_trang(self):
+        return max((len(self.vi_tri) - 1) // self.so_dong_moi_trang + 1, 1)
+
+    def khoang(self, trang):
+        """(dòng đầu, dòng cuối) của trang (đánh số từ 1) trong kết quả."""
+        trang = min(max(int(trang), 1), self.so_trang)
+        dau = (trang - 1) * self.so_dong_moi_trang
+        return dau, min(dau + self.so_dong_moi_trang, len(self.vi_tri))
+
+    def trang(self, trang, cac_cot=None):
+        """Bản hiển thị của đúng các dòng thuộc trang."""
+        dau, cuoi = self.khoang(trang)
+        lat_cat = self.df.iloc[self.vi_tri[dau:cuoi]]
+        return dang_hien_thi(lat_cat[cac_cot] if cac_cot else lat_cat)
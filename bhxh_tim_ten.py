@@ -0,0 +1,150 @@
+"""Tìm họ tên có xếp hạng cho Trợ lý ảo.
+
+Họ tên được chuẩn hóa như xoa_dau_tieng_viet (thêm 'đ' -> 'd') rồi tách thành từ. Chỉ mục dựng
+một lần: từ điển các từ đã sắp xếp, danh sách dòng (posting list) của từng từ và IDF.
+Khi tìm, mỗi từ của câu hỏi được so với cả từ điển bằng khoảng cách sửa (Levenshtein) tính
+vector hóa trên numpy, cộng thêm khớp tiền tố; điểm của một dòng là tổng IDF × độ giống của
+từ khớp tốt nhất cho từng từ câu hỏi, nên đảo thứ tự họ / tên hay gõ sai một ký tự vẫn tìm ra.
+"""
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+SO_KET_QUA = 200          # Top-K trả về
+DO_DAI_SO_SANH = 24       # Từ dài hơn chỉ so khớp phần đầu khi tính khoảng cách sửa
+DIEM_TIEN_TO = 0.8        # Độ giống khi từ câu hỏi là tiền tố của từ trong từ điển
+PHAT_TU_THUA = 0.02       # Trừ điểm cho mỗi từ thừa trong họ tên so với câu hỏi
+
+def chuan_hoa_tu(chuoi):
+    """Chuỗi đã bỏ dấu -> danh sách từ (gộp 'đ' vào 'd' để 'duc' khớp 'đức')."""
+    tu = str(chuoi).replace('đ', 'd').split()
+    return list(dict.fromkeys(tu))   # Bỏ từ lặp, giữ thứ tự
+
+def _so_sua_toi_da(do_dai):
+    return 0 if do_dai <= 2 else 1 if do_dai <= 5 else 2
+
+def khoang_cach_sua(tu, ma_tu_dien, do_dai_tu_dien):
+    """Khoảng cách sửa (Levenshtein có tính đảo hai ký tự liền nhau) từ `tu` tới mọi từ trong từ điển cùng lúc.
+
+    ma_tu_dien là ma trận (số từ, DO_DAI_SO_SANH) mã ký tự, đệm 0. Mỗi ký tự của `tu` là một
+    bước quy hoạch động trên cả ma trận; phần phụ thuộc theo cột được gộp bằng minimum.accumulate.
+    """
+    so_tu, do_dai = ma_tu_dien.shape
+    cot = np.arange(do_dai + 1, dtype=np.int32)
+    truoc = truoc_nua = np.broadcast_to(cot, (so_tu, do_dai + 1))
+    ky_tu_truoc = None
+    for i, ky_tu in enumerate(np.frombuffer(tu[:DO_DAI_SO_SANH].encode('utf-32-le'), dtype=np.uint32), 1):
+        thay = np.minimum(truoc[:, 1:] + 1, truoc[:, :-1] + (ma_tu_dien != ky_tu))   # Xóa / thay
+        if ky_tu_truoc is not None and do_dai > 1:   # Đảo hai ký tự liền nhau ("hnug" -> "hung") tính là một lần sửa
+            dao = (ma_tu_dien[:, 1:] == ky_tu_truoc) & (ma_tu_dien[:, :-1] == ky_tu)
+            thay[:, 1:] = np.where(dao, np.minimum(thay[:, 1:], truoc_nua[:, :-2] + 1), thay[:, 1:])
+        ung_vien = np.concatenate([np.full((so_tu, 1), i, dtype=np.int32), thay], axis=1) - cot
+        truoc_nua, truoc = truoc, np.minimum.accumulate(ung_vien, axis=1) + cot   # Chèn: cur[j] = min(cur[j-1] + 1, ...)
+        ky_tu_truoc = ky_tu
+    return truoc[np.arange(so_tu), np.minimum(do_dai_tu_dien, do_dai)]
+
+class ChiMucTen:
+    def __init__(self, cot_khong_dau):
+        chuoi = pa.array(cot_khong_dau.fillna('').to_numpy(dtype=object), type=pa.string())
+        cac_tu = pc.split_pattern(pc.replace_substring(chuoi, 'đ', 'd'), ' ')
+        phang = pc.list_flatten(cac_tu)
+        dong = np.repeat(np.arange(len(chuoi), dtype=np.int32), pc.list_value_length(cac_tu).fill_null(0).to_numpy())
+        co_chu = pc.greater(pc.utf8_length(phang), 0).to_numpy(zero_copy_only=False)
+        phang, dong = phang.filter(pa.array(co_chu)), dong[co_chu]   # Bỏ từ rỗng do nhiều khoảng trắng liền nhau
+        # Từ điển sắp xếp (để tìm tiền tố bằng tìm kiếm nhị phân) và mã từ của từng vị trí
+        ma_hoa = pc.dictionary_encode(phang)
+        tu_dien = ma_hoa.dictionary.to_numpy(zero_copy_only=False).astype(object)
+        thu_tu = np.argsort(tu_dien, kind='stable'); hang = np.empty_like(thu_tu); hang[thu_tu] = np.arange(len(thu_tu))
+        ma_tu = hang[ma_hoa.indices.to_numpy()].astype(np.int32)
+        self.tu_dien = tu_dien[thu_tu]
+        # Posting list: dòng của từng từ, tăng dần và không lặp
+        sx = np.argsort(ma_tu, kind='stable'); ma_tu, dong = ma_tu[sx], dong[sx]
+        giu = np.ones(len(ma_tu), dtype=bool); giu[1:] = (ma_tu[1:] != ma_tu[:-1]) | (dong[1:] != dong[:-1])
+        ma_tu, self.dong = ma_tu[giu], dong[giu]
+        so_dong_cua_tu = np.bincount(ma_tu, minlength=len(self.tu_dien))
+        self.bien = np.concatenate([[0], np.cumsum(so_dong_cua_tu)]).astype(np.int64)
+        self.idf = np.log1p(len(chuoi) / np.maximum(so_dong_cua_tu, 1)).astype(np.float32)
+        self.so_tu_cua_dong = np.bincount(self.dong, minlength=len(chuoi)).astype(np.int16)
+        self.so_dong = len(chuoi)
+        # Ma trận mã ký tự của từ điển cho khoảng cách sửa
+        do_dai = np.fromiter((len(t) for t in self.tu_dien), dtype=np.int32, count=len(self.tu_dien))
+        self.do_dai_tu = np.minimum(do_dai, DO_DAI_SO_SANH)
+        rong = max(int(self.do_dai_tu.max()) if len(do_dai) else 1, 1)
+        ma = np.zeros((len(self.tu_dien), rong), dtype=np.uint32)
+        for k, t in enumerate(self.tu_dien):   # Chỉ chạy trên từ điển (vài nghìn từ), không theo dòng
+            ma[k, :self.do_dai_tu[k]] = np.frombuffer(t[:rong].encode('utf-32-le'), dtype=np.uint32)
+        self.ma_tu_dien = ma
+        self._khop = {}   # Từ câu hỏi -> kết quả tu_gan_dung; họ tên lặp lại nhiều nên hay trúng khi tra theo lô
+
+    def tu_gan_dung(self, tu):
+        """(mã từ, độ giống 0..1) của các từ trong từ điển khớp `tu`: chính xác, tiền tố hoặc sai vài ký tự."""
+        khop = self._khop.get(tu)
+        if khop is None:
+            if len(self._khop) > 50_000: self._khop.clear()
+            khop = self._khop[tu] = self._tu_gan_dung(tu)
+        return khop
+
+    def _tu_gan_dung(self, tu):
+        khop = {}
+        so_sua = _so_sua_toi_da(len(tu))
+        if so_sua and len(self.tu_dien):
+            kc = khoang_cach_sua(tu, self.ma_tu_dien, self.do_dai_tu)
+            for k in np.flatnonzero(kc <= so_sua): khop[int(k)] = 1.0 - kc[k] / max(len(tu), len(self.tu_dien[k]))
+        dau = np.searchsorted(self.tu_dien, tu, side='left'); cuoi = np.searchsorted(self.tu_dien, tu + '\U0010ffff', side='left')
+        for k in range(dau, cuoi):
+            khop[k] = 1.0 if self.tu_dien[k] == tu else max(khop.get(k, 0.0), DIEM_TIEN_TO if len(tu) >= 2 else 0.0)
+        return {k: d for k, d in khop.items() if d > 0}
+
+    def tim(self, cau_hoi, trong=None, so_ket_qua=SO_KET_QUA):
+        """Top-K (vị trí dòng, điểm) theo độ phù hợp giảm dần; `trong` giới hạn trong các dòng cho trước (lọc ngày sinh / mã số)."""
+        cac_tu = chuan_hoa_tu(cau_hoi)
+        if not cac_tu: return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        tong = np.zeros(self.so_dong, dtype=np.float32)
+        so_tu_khop = np.zeros(self.so_dong, dtype=np.int16)
+        diem_tu = np.zeros(self.so_dong, dtype=np.float32)
+        diem_toi_da, so_tu_co_khop = 0.0, 0
+        for tu in cac_tu:
+            khop = self.tu_gan_dung(tu)
+            if not khop: continue
+            so_tu_co_khop += 1
+            diem_tu[:] = 0
+            # Ghi theo độ giống tăng dần: dòng có nhiều từ khớp giữ điểm của từ khớp tốt nhất
+            for k, d in sorted(((k, d * self.idf[k]) for k, d in khop.items()), key=lambda x: x[1]):
+                diem_tu[self.dong[self.bien[k]:self.bien[k + 1]]] = d
+            tong += diem_tu; so_tu_khop += diem_tu > 0
+            diem_toi_da += max(d * self.idf[k] for k, d in khop.items())
+        if not so_tu_co_khop: return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        # Ưu tiên các dòng khớp đủ mọi từ tìm được; không có thì nới ra thiếu một từ (câu hỏi từ 3 từ trở lên)
+        for can_khop in [so_tu_co_khop] + ([so_tu_co_khop - 1] if so_tu_co_khop > 2 else []):
+            ung_vien = np.flatnonzero(so_tu_khop >= can_khop)
+            if trong is not None: ung_vien = np.intersect1d(ung_vien, np.asarray(trong, dtype=np.int64), assume_unique=True)
+            if len(ung_vien): break
+        if not len(ung_vien): return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        diem = tong[ung_vien] / diem_toi_da - PHAT_TU_THUA * np.maximum(self.so_tu_cua_dong[ung_vien] - len(cac_tu), 0)
+        if len(ung_vien) > so_ket_qua:
+            top = np.argpartition(-diem, so_ket_qua - 1)[:so_ket_qua]; ung_vien, diem = ung_vien[top], diem[top]
+        thu_tu = np.lexsort((ung_vien, -diem))   # Điểm giảm dần, cùng điểm thì theo thứ tự gốc
+        return ung_vien[thu_tu].astype(np.int64), diem[thu_tu].astype(np.float32)
+
+    def cham_diem(self, cau_hoi, vi_tri):
+        """Điểm của đúng các dòng cho trước (vd. cùng ngày sinh), không dựng mảng theo cả bảng như tim().
+
+        Khác tim(): từ câu hỏi không khớp từ nào trong từ điển vẫn được tính vào mẫu số (với IDF lớn
+        nhất), nên họ tên thiếu hẳn một từ bị điểm thấp thay vì bị bỏ qua.
+        """
+        vi_tri = np.asarray(vi_tri, dtype=np.int64)
+        cac_tu = chuan_hoa_tu(cau_hoi)
+        diem = np.zeros(len(vi_tri), dtype=np.float32)
+        if not cac_tu or not len(vi_tri): return diem
+        diem_toi_da = 0.0
+        for tu in cac_tu:
+            khop = self.tu_gan_dung(tu)
+            if not khop: diem_toi_da += float(np.log1p(self.so_dong)); continue
+            tot_nhat = np.zeros(len(vi_tri), dtype=np.float32)
+            for k, d in khop.items():
+                ds = self.dong[self.bien[k]:self.bien[k + 1]]   # Tăng dần: tìm nhị phân thay vì quét
+                j = np.minimum(np.searchsorted(ds, vi_tri), len(ds) - 1)
+                tot_nhat = np.where(ds[j] == vi_tri, np.maximum(tot_nhat, d * self.idf[k]), tot_nhat)
+            diem += tot_nhat
+            diem_toi_da += max(d * self.idf[k] for k, d in khop.items())
+        return (diem / diem_toi_da - PHAT_TU_THUA * np.maximum(self.so_tu_cua_dong[vi_tri] - len(cac_tu), 0)).astype(np.float32)
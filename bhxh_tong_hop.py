@@ -0,0 +1,161 @@
+"""Khối tổng hợp dựng sẵn cho biểu đồ: số lượng theo nhóm, bảng chéo và danh sách dòng của từng nhóm.
+
+Dựng một lần cho mỗi phiên bản dữ liệu. Cột phân loại (category) được đếm ngay lúc dựng;
+cột nhiều giá trị được đếm khi lần đầu cần và chỉ giữ top-N nhóm, phần còn lại gộp vào "Khác".
+Bấm vào một cột của biểu đồ là tra danh sách vị trí dòng, không quét lại dữ liệu.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from bhxh_du_lieu import la_cot_phu, cot_dang_chuoi
+
+SO_NHOM_TOI_DA = 100           # Số cột tối đa trên một biểu đồ, còn lại gộp vào NHAN_KHAC
+NHAN_KHAC = 'Khác'
+COT_HAN = 'hanTheDen'
+TINH_TRANG_HAN = 'Tình trạng hạn'   # Cột ảo tính từ hanTheDen theo ngày hôm nay
+NHAN_TINH_TRANG = ['Đã hết hạn', 'Sắp hết hạn', 'Còn hạn', 'Không rõ']
+SO_NGAY_SAP_HET = 30
+BANG_CHEO = [('maTinh', 'gioiTinh'), ('maTinh', TINH_TRANG_HAN)]   # Bảng chéo dựng sẵn
+
+class _Nhom:
+    """Các nhóm của một cột: nhãn, số lượng và vị trí dòng xếp liền nhau theo nhóm."""
+    __slots__ = ('nhan', 'dem', 'bien', 'vi_tri_sx', 'vi_tri_khac')
+
+    def __init__(self, ma, nhan, vi_tri_khac=None):
+        hop_le = ma >= 0
+        self.nhan = np.asarray([str(x) for x in nhan], dtype=object)
+        self.dem = np.bincount(ma[hop_le], minlength=len(nhan)).astype(np.int64)
+        self.bien = np.concatenate([[0], np.cumsum(self.dem)])
+        kieu = np.int32 if len(ma) < 2**31 else np.int64
+        thu_tu = np.argsort(ma, kind='stable').astype(kieu)   # Ổn định: vị trí trong mỗi nhóm vẫn tăng dần
+        self.vi_tri_sx = thu_tu[len(ma) - int(hop_le.sum()):]
+        self.vi_tri_khac = vi_tri_khac   # Dòng thuộc các nhóm đã bị cắt khỏi top-N (cột nhiều giá trị)
+
+    def vi_tri(self, k):
+        return self.vi_tri_sx[self.bien[k]:self.bien[k + 1]]
+
+def _ma_tu_chuoi(chuoi):
+    """factorize một cột chuỗi, ô trống thành -1."""
+    ma, nhan = pd.factorize(chuoi)
+    rong = np.flatnonzero(np.asarray(nhan, dtype=object) == '')
+    if len(rong): ma = np.where(ma == rong[0], -1, ma)
+    return ma, nhan
+
+class KhoiTongHop:
+    def __init__(self, df, hom_nay=None):
+        self._df = df
+        self.so_dong = len(df)
+        self._nhom, self._bang_cheo, self._tinh_trang = {}, {}, {}
+        self._khoa = threading.Lock()   # Khối dùng chung giữa các phiên; chỉ giữ khóa khi đọc / ghi các dict, không giữ lúc tính
+        for cot in df.columns:
+            if not la_cot_phu(cot) and isinstance(df[cot].dtype, pd.CategoricalDtype):
+                self._nhom[cot] = _Nhom(df[cot].cat.codes.to_numpy(), df[cot].cat.categories)
+        hom_nay = hom_nay or pd.Timestamp.now()
+        if COT_HAN in df.columns: self._nhom_cua(TINH_TRANG_HAN, hom_nay)
+        for cot_a, cot_b in BANG_CHEO:
+            if self.co_the_cheo(cot_a) and self.co_the_cheo(cot_b): self.bang_cheo(cot_a, cot_b, hom_nay)
+
+    # --- MÃ NHÓM CỦA TỪNG CỘT ---
+    def _ma_tinh_trang(self, hom_nay):
+        """Mã tình trạng hạn thẻ (chỉ số trong NHAN_TINH_TRANG), tính lại mỗi ngày."""
+        ngay = pd.to_datetime(self._df[COT_HAN], errors='coerce').to_numpy(dtype='datetime64[D]')
+        hom_nay = np.datetime64(pd.Timestamp(hom_nay).normalize(), 'D')
+        ma = np.full(len(ngay), 3, dtype=np.int8)
+        ma[ngay > hom_nay] = 2
+        ma[(ngay > hom_nay) & (ngay <= hom_nay + SO_NGAY_SAP_HET)] = 1
+        ma[ngay <= hom_nay] = 0
+        return ma
+
+    def _ma(self, cot, hom_nay=None):
+        if cot == TINH_TRANG_HAN:
+            ngay = pd.Timestamp(hom_nay or pd.Timestamp.now()).normalize()
+            with self._khoa: ma = self._tinh_trang.get(ngay)
+            if ma is None:
+                ma = self._ma_tinh_trang(ngay)
+                with self._khoa: self._tinh_trang = {ngay: ma}   # Chỉ giữ ngày đang xem
+            return ma, NHAN_TINH_TRANG
+        if isinstance(self._df[cot].dtype, pd.CategoricalDtype):
+            return self._df[cot].cat.codes.to_numpy(), self._df[cot].cat.categories
+        return _ma_tu_chuoi(cot_dang_chuoi(self._df, cot))
+
+    def _nhom_cua(self, cot, hom_nay=None):
+        if cot == TINH_TRANG_HAN:
+            khoa = (cot, pd.Timestamp(hom_nay or pd.Timestamp.now()).normalize())
+            with self._khoa: nhom = self._nhom.get(khoa)
+            if nhom is None:
+                nhom = _Nhom(*self._ma(cot, khoa[1]))
+                with self._khoa:
+                    for k in [k for k in self._nhom if isinstance(k, tuple) and k[0] == cot]: del self._nhom[k]
+                    self._nhom[khoa] = nhom
+            return nhom
+        with self._khoa: nhom = self._nhom.get(cot)
+        if nhom is None:
+            # Cột nhiều giá trị: chỉ giữ danh sách dòng của top-N nhóm, các dòng còn lại để riêng
+            ma, nhan = self._ma(cot)
+            dem = np.bincount(ma[ma >= 0], minlength=len(nhan))
+            top = np.argsort(-dem, kind='stable')[:SO_NHOM_TOI_DA]
+            anh_xa = np.full(len(nhan), -1, dtype=np.int64); anh_xa[top] = np.arange(len(top))
+            ma_top = np.where(ma >= 0, anh_xa[np.maximum(ma, 0)], -1)
+            khac = np.flatnonzero((ma >= 0) & (ma_top < 0))
+            nhom = _Nhom(ma_top, np.asarray(nhan, dtype=object)[top], khac if len(khac) else None)
+            with self._khoa: self._nhom[cot] = nhom
+        return nhom
+
+    def co_the_cheo(self, cot):
+        """Chỉ lập bảng chéo với cột phân loại hoặc tình trạng hạn (ít giá trị)."""
+        if cot == TINH_TRANG_HAN: return COT_HAN in self._df.columns
+        return cot in self._df.columns and isinstance(self._df[cot].dtype, pd.CategoricalDtype)
+
+    def cot_cheo(self):
+        cac_cot = [c for c in self._df.columns if not la_cot_phu(c) and self.co_the_cheo(c)]
+        return cac_cot + ([TINH_TRANG_HAN] if self.co_the_cheo(TINH_TRANG_HAN) else [])
+
+    # --- TRUY VẤN ---
+    def dem(self, cot, so_nhom=SO_NHOM_TOI_DA, hom_nay=None):
+        """Bảng ['Phân loại', 'Số lượng'] giảm dần, tối đa so_nhom dòng cộng một dòng 'Khác'."""
+        nhom = self._nhom_cua(cot, hom_nay)
+        thu_tu = np.argsort(-nhom.dem, kind='stable')
+        thu_tu = thu_tu[nhom.dem[thu_tu] > 0]
+        bang = pd.DataFrame({'Phân loại': nhom.nhan[thu_tu[:so_nhom]], 'Số lượng': nhom.dem[thu_tu[:so_nhom]]})
+        so_khac = int(nhom.dem[thu_tu[so_nhom:]].sum()) + (len(nhom.vi_tri_khac) if nhom.vi_tri_khac is not None else 0)
+        if so_khac: bang.loc[len(bang)] = [NHAN_KHAC, so_khac]
+        return bang
+
+    def vi_tri(self, cot, gia_tri, so_nhom=SO_NHOM_TOI_DA, hom_nay=None):
+        """Vị trí dòng (tăng dần) của một cột trên biểu đồ, kể cả cột 'Khác'."""
+        nhom = self._nhom_cua(cot, hom_nay)
+        k = np.flatnonzero(nhom.nhan == str(gia_tri))
+        if len(k): return nhom.vi_tri(k[0])
+        if str(gia_tri) != NHAN_KHAC: return np.empty(0, dtype=np.int64)
+        thu_tu = np.argsort(-nhom.dem, kind='stable')
+        phan = [nhom.vi_tri(k) for k in thu_tu[so_nhom:]]
+        if nhom.vi_tri_khac is not None: phan.append(nhom.vi_tri_khac)
+        return np.sort(np.concatenate(phan)) if phan else np.empty(0, dtype=np.int64)
+
+    def vi_tri_o(self, cot_a, gia_tri_a, cot_b, gia_tri_b, hom_nay=None):
+        """Vị trí dòng của một ô trong bảng chéo (giao hai danh sách đã sắp xếp)."""
+        return np.intersect1d(self.vi_tri(cot_a, gia_tri_a, hom_nay=hom_nay), self.vi_tri(cot_b, gia_tri_b, hom_nay=hom_nay), assume_unique=True)
+
+    def bang_cheo(self, cot_a, cot_b, hom_nay=None, so_nhom=SO_NHOM_TOI_DA):
+        """Bảng dài ['Phân loại', 'Phân tách', 'Số lượng'] của cot_a × cot_b, bỏ các ô bằng 0."""
+        khoa = (cot_a, cot_b, pd.Timestamp(hom_nay or pd.Timestamp.now()).normalize() if TINH_TRANG_HAN in (cot_a, cot_b) else None)
+        with self._khoa: bang = self._bang_cheo.get(khoa)
+        if bang is None:
+            ma_a, nhan_a = self._ma(cot_a, khoa[2]); ma_b, nhan_b = self._ma(cot_b, khoa[2])
+            hop_le = (ma_a >= 0) & (ma_b >= 0)
+            dem = np.bincount(ma_a[hop_le].astype(np.int64) * len(nhan_b) + ma_b[hop_le], minlength=len(nhan_a) * len(nhan_b))
+            bang = (np.asarray([str(x) for x in nhan_a], dtype=object), np.asarray([str(x) for x in nhan_b], dtype=object), dem.reshape(len(nhan_a), len(nhan_b)))
+            with self._khoa:
+                if khoa[2] is not None:   # Bảng theo tình trạng hạn: chỉ giữ ngày đang xem
+                    for k in [k for k in self._bang_cheo if k[2] is not None and k[2] != khoa[2]]: del self._bang_cheo[k]
+                self._bang_cheo[khoa] = bang
+        nhan_a, nhan_b, dem = bang
+        tong = dem.sum(axis=1)
+        thu_tu = np.argsort(-tong, kind='stable'); thu_tu = thu_tu[tong[thu_tu] > 0][:so_nhom]
+        i, j = np.nonzero(dem[thu_tu])
+        return pd.DataFrame({'Phân loại': nhan_a[thu_tu][i], 'Phân tách': nhan_b[j], 'Số lượng': dem[thu_tu][i, j]})
+
+def dung_khoi_tong_hop(df):
+    return KhoiTongHop(df)
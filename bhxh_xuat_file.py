@@ -0,0 +1,343 @@
+"""Xuất file Excel / CSV / Word theo yêu cầu, chạy nền ngoài luồng script của Streamlit.
+
+File chỉ được tạo khi người dùng bấm tải. Công việc chạy trong pool tiến trình (hoặc luồng) và tự
+mở lại bản Arrow ánh xạ bộ nhớ của đúng phiên bản dữ liệu, nên chỉ cần gửi đi mảng vị trí dòng.
+Excel / CSV được ghi theo lô với bộ nhớ không đổi. File kết quả được lưu theo mã băm của truy vấn
+(phiên bản + vị trí dòng + cột + định dạng) và dọn bớt theo tuổi và tổng dung lượng.
+"""
+import hashlib
+import multiprocessing as mp
+import os
+import re
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache, partial
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+from docx import Document
+from docx.shared import Pt, RGBColor
+
+from bhxh_du_lieu import dang_hien_thi, doc_arrow_anh_xa
+from bhxh_kho_du_lieu import duong_dan_ban_chia_se
+
+DINH_DANG = {
+    'xlsx': ('.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv': ('.csv', 'text/csv'),
+    'docx': ('.docx', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'),
+    'zip': ('.zip', 'application/zip'),              # Phiếu hàng loạt, mỗi người một file
+    'docx_gop': ('.docx', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'),   # ... gộp một file
+}
+SO_DONG_MOI_LO_XUAT = 20_000
+SO_DONG_TOI_DA_MOI_SHEET = 1_048_575   # Giới hạn của Excel (trừ dòng tiêu đề)
+DUNG_LUONG_TOI_DA = 512 * 2**20       # Tổng dung lượng file xuất được giữ lại
+TUOI_TOI_DA = 6 * 3600                # File không được tải lại sau 6 giờ thì xóa
+SO_PHIEU_MOI_LO = 200                 # Số phiếu mỗi tiến trình làm việc tạo trong một lượt
+NGAT_TRANG = '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+
+# --- TẠO FILE ---
+def tao_phieu_word(row, cac_cot, ngay_xuat=None):
+    doc = Document()
+    heading = doc.add_heading('PHIẾU THÔNG TIN BHXH', 0); heading.alignment = 1
+    doc.add_paragraph(f'Ngày xuất phiếu: {ngay_xuat or datetime.now().strftime("%d/%m/%Y %H:%M")}')
+    doc.add_paragraph('--------------------------------------------------')
+    p = doc.add_paragraph(); run = p.add_run(f"HỌ VÀ TÊN: {row.get('hoTen', '').upper()}")
+    run.bold = True; run.font.size = Pt(14); run.font.color.rgb = RGBColor(0, 51, 102)
+    table = doc.add_table(rows=1, cols=2); table.style = 'Table Grid'
+    hdr_cells = table.rows[0].cells; hdr_cells[0].text = 'THÔNG TIN'; hdr_cells[1].text = 'CHI TIẾT'
+    for cot in cac_cot:
+        row_cells = table.add_row().cells; row_cells[0].text = cot
+        val = row.get(cot, ''); row_cells[1].text = str(val) if pd.notna(val) else ""
+    doc.add_paragraph('\n'); doc.add_paragraph('Người trích xuất: Admin BHXH').alignment = 2
+    bio = BytesIO(); doc.save(bio); return bio
+
+# --- PHIẾU WORD HÀNG LOẠT ---
+@lru_cache(maxsize=4)
+def _mau_phieu(cac_cot):
+    """Dựng phiếu mẫu một lần bằng tao_phieu_word với các ô giữ chỗ @@k@@.
+
+    Trả về (cac_phan, vo_zip): cac_phan là document.xml đã tách theo ô giữ chỗ (phần tử lẻ là tên ô),
+    vo_zip là file docx mẫu thiếu document.xml để mỗi phiếu chỉ cần nối thêm phần này.
+    """
+    o_giu_cho = {cot: f"@@{i}@@" for i, cot in enumerate(cac_cot)}
+    o_giu_cho.setdefault('hoTen', '@@HOTEN@@')
+    mau = zipfile.ZipFile(tao_phieu_word(o_giu_cho, cac_cot, ngay_xuat='@@NGAY@@'))
+    xml = mau.read('word/document.xml').decode('utf-8')
+    xml = xml.replace(f"HỌ VÀ TÊN: {o_giu_cho['hoTen']}", "HỌ VÀ TÊN: @@TIEUDE@@")   # Tiêu đề in hoa, khác ô trong bảng
+    vo = BytesIO()
+    with zipfile.ZipFile(vo, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for muc in mau.infolist():
+            if muc.filename != 'word/document.xml': zf.writestr(muc, mau.read(muc))
+    return re.split(r'@@(\w+)@@', xml), vo.getvalue()
+
+def _dien_phieu(cac_phan, row, cac_cot, ngay_xuat):
+    """Điền một hồ sơ vào document.xml mẫu (giá trị được escape XML)."""
+    gia_tri = {'NGAY': ngay_xuat}
+    for i, cot in enumerate(cac_cot):
+        val = row.get(cot, ''); gia_tri[str(i)] = escape(str(val)) if pd.notna(val) else ""
+    ho_ten = row.get('hoTen', '')
+    gia_tri['HOTEN'] = escape(str(ho_ten)) if pd.notna(ho_ten) else ""
+    gia_tri['TIEUDE'] = escape(str(ho_ten).upper()) if pd.notna(ho_ten) else ""
+    return ''.join(phan if i % 2 == 0 else gia_tri[phan] for i, phan in enumerate(cac_phan))
+
+def _tach_than(xml):
+    """Tách document.xml thành (đầu, thân, cuối) quanh nội dung trang để ghép nhiều phiếu."""
+    dau = xml.index('<w:body>') + len('<w:body>'); cuoi = xml.rindex('<w:sectPr')
+    return xml[:dau], xml[dau:cuoi], xml[cuoi:]
+
+def _tao_lo_phieu(file_arrow, vi_tri, cac_cot, ngay_xuat, kieu):
+    """Tạo một lô phiếu trong tiến trình làm việc.
+
+    kieu='zip': trả về [(soBhxh, nội dung docx)]; kieu='docx_gop': trả về phần thân XML đã ghép.
+    """
+    cac_phan, vo_zip = _mau_phieu(tuple(cac_cot))
+    df = dang_hien_thi(_du_lieu(file_arrow).iloc[vi_tri])
+    ket_qua = []
+    for row in df.to_dict('records'):
+        xml = _dien_phieu(cac_phan, row, cac_cot, ngay_xuat)
+        if kieu == 'docx_gop':
+            ket_qua.append(_tach_than(xml)[1]); continue
+        bio = BytesIO(vo_zip); bio.seek(0, os.SEEK_END)
+        with zipfile.ZipFile(bio, 'a', zipfile.ZIP_DEFLATED) as zf: zf.writestr('word/document.xml', xml)
+        ket_qua.append((re.sub(r'[^\w.-]', '_', str(row.get('soBhxh', '') or 'hs')), bio.getvalue()))
+    if kieu == 'docx_gop': return NGAT_TRANG.join(ket_qua)
+    return ket_qua
+
+def tao_phieu_hang_loat(file_arrow, vi_tri, cac_cot, duong_dan, kieu='zip', pool=None, cua_so=4,
+                        so_phieu_moi_lo=SO_PHIEU_MOI_LO, bao_tien_do=None):
+    """Tạo phiếu cho nhiều hồ sơ thành một file ZIP (kieu='zip') hoặc một file Word gộp ('docx_gop').
+
+    Các lô được chia cho pool (None: chạy tại chỗ). Chỉ tối đa cua_so lô nằm trong bộ nhớ cùng lúc,
+    kết quả được ghi ngay ra file, nên bộ nhớ không tăng theo số phiếu.
+    Trả về dict thống kê: so_phieu, giay, phieu_moi_giay.
+    """
+    bat_dau = time.perf_counter()
+    vi_tri = np.asarray(vi_tri, dtype=np.int64); tong = len(vi_tri)
+    cac_cot = list(cac_cot); ngay_xuat = datetime.now().strftime("%d/%m/%Y %H:%M")
+    lam_lo = partial(_tao_lo_phieu, file_arrow, cac_cot=cac_cot, ngay_xuat=ngay_xuat, kieu=kieu)
+    cac_lo_vi_tri = [vi_tri[i:i + so_phieu_moi_lo] for i in range(0, tong, so_phieu_moi_lo)]
+
+    def ket_qua_theo_thu_tu():
+        if pool is None:
+            for lo in cac_lo_vi_tri: yield lo, lam_lo(lo)
+            return
+        dang_cho = deque()
+        for lo in cac_lo_vi_tri:
+            dang_cho.append((lo, pool.submit(lam_lo, lo)))
+            if len(dang_cho) >= cua_so:
+                lo_xong, cv = dang_cho.popleft(); yield lo_xong, cv.result()
+        while dang_cho:
+            lo_xong, cv = dang_cho.popleft(); yield lo_xong, cv.result()
+
+    file_tam = f"{duong_dan}.{os.getpid()}.{threading.get_ident()}.tmp"
+    da_xong = 0
+    try:
+        if kieu == 'zip':
+            ten_da_dung = {}
+            with zipfile.ZipFile(file_tam, 'w', zipfile.ZIP_STORED, allowZip64=True) as zf:   # docx vốn đã nén
+                for lo, ds in ket_qua_theo_thu_tu():
+                    for so_bhxh, noi_dung in ds:
+                        lan = ten_da_dung[so_bhxh] = ten_da_dung.get(so_bhxh, 0) + 1
+                        zf.writestr(f"Phieu_{so_bhxh}{'' if lan == 1 else f'_{lan}'}.docx", noi_dung)
+                    da_xong += len(lo)
+                    if bao_tien_do: bao_tien_do(da_xong, tong)
+        else:
+            cac_phan, vo_zip = _mau_phieu(tuple(cac_cot))
+            dau, _, cuoi = _tach_than(''.join(cac_phan[0::2]))
+            vo = zipfile.ZipFile(BytesIO(vo_zip))
+            with zipfile.ZipFile(file_tam, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+                for muc in vo.infolist(): zf.writestr(muc, vo.read(muc))
+                with zf.open('word/document.xml', 'w', force_zip64=True) as f:
+                    f.write(dau.encode('utf-8'))
+                    for lo, than in ket_qua_theo_thu_tu():
+                        if da_xong: f.write(NGAT_TRANG.encode('utf-8'))
+                        f.write(than.encode('utf-8'))
+                        da_xong += len(lo)
+                        if bao_tien_do: bao_tien_do(da_xong, tong)
+                    f.write(cuoi.encode('utf-8'))
+        os.replace(file_tam, duong_dan)
+    finally:
+        if os.path.exists(file_tam): os.remove(file_tam)
+    giay = time.perf_counter() - bat_dau
+    return {'so_phieu': tong, 'giay': giay, 'phieu_moi_giay': tong / max(giay, 1e-9)}
+
+def cac_lo(df, vi_tri, cac_cot=None, so_dong_moi_lo=SO_DONG_MOI_LO_XUAT):
+    """Chia các dòng cần xuất thành từng lô đã ở dạng hiển thị (luôn có ít nhất một lô để ghi tiêu đề)."""
+    for dau in range(0, max(len(vi_tri), 1), so_dong_moi_lo):
+        lo = df.iloc[vi_tri[dau:dau + so_dong_moi_lo]]
+        yield dang_hien_thi(lo[cac_cot] if cac_cot else lo)
+
+def ghi_xlsx(lo_du_lieu, duong_dan):
+    """Ghi XLSX từng dòng ra đĩa (constant_memory), sang sheet mới khi vượt giới hạn dòng của Excel."""
+    wb = xlsxwriter.Workbook(duong_dan, {'constant_memory': True, 'nan_inf_to_errors': True})
+    dam = wb.add_format({'bold': True, 'border': 1})
+    cac_sheet = []
+    def sheet_moi(tieu_de):
+        ws = wb.add_worksheet('DanhSach' if not cac_sheet else f'DanhSach_{len(cac_sheet) + 1}')
+        ws.write_row(0, 0, tieu_de, dam); cac_sheet.append(ws)
+        return ws
+    ws, dong = None, 1
+    for lo in lo_du_lieu:
+        if ws is None: ws = sheet_moi(list(lo.columns))
+        for ban_ghi in lo.astype(object).where(lo.notna(), None).itertuples(index=False, name=None):
+            if dong > SO_DONG_TOI_DA_MOI_SHEET: ws, dong = sheet_moi(list(lo.columns)), 1
+            ws.write_row(dong, 0, ban_ghi); dong += 1
+    wb.close()
+
+def ghi_csv(lo_du_lieu, duong_dan):
+    """Ghi CSV UTF-8 có BOM (Excel mở đúng tiếng Việt), nối từng lô vào cuối file."""
+    with open(duong_dan, 'w', encoding='utf-8-sig', newline='') as f:
+        for i, lo in enumerate(lo_du_lieu): lo.to_csv(f, header=(i == 0), index=False)
+
+# --- CÔNG VIỆC CHẠY TRONG TIẾN TRÌNH / LUỒNG NỀN ---
+_BAN_DA_MO = {}   # Bản Arrow đã ánh xạ trong tiến trình làm việc, theo đường dẫn
+
+def _du_lieu(file_arrow):
+    df = _BAN_DA_MO.get(file_arrow)
+    if df is None:
+        if len(_BAN_DA_MO) >= 2: _BAN_DA_MO.clear()
+        df = _BAN_DA_MO[file_arrow] = doc_arrow_anh_xa(file_arrow)
+    return df
+
+def _chay_xuat(file_arrow, vi_tri, cac_cot, dinh_dang, duong_dan):
+    df = _du_lieu(file_arrow)
+    file_tam = f"{duong_dan}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        if dinh_dang == 'docx':
+            row = dang_hien_thi(df.iloc[vi_tri[:1]]).iloc[0]
+            with open(file_tam, 'wb') as f: f.write(tao_phieu_word(row, cac_cot).getvalue())
+        elif dinh_dang == 'csv': ghi_csv(cac_lo(df, vi_tri, cac_cot), file_tam)
+        else: ghi_xlsx(cac_lo(df, vi_tri, cac_cot), file_tam)
+        os.replace(file_tam, duong_dan)
+    finally:
+        if os.path.exists(file_tam): os.remove(file_tam)
+    return duong_dan
+
+# --- QUẢN LÝ CÔNG VIỆC VÀ KHO FILE ĐÃ XUẤT ---
+class QuanLyXuatFile:
+    """Hàng đợi xuất file dùng chung cho mọi phiên (tạo một lần bằng st.cache_resource).
+
+    Mỗi truy vấn được định danh bằng mã băm; hai phiên yêu cầu cùng một file sẽ dùng chung
+    một công việc và một file kết quả. Với docx / zip / docx_gop, cac_cot là các trường in trên phiếu.
+    Phiếu hàng loạt được điều phối từ một luồng riêng, chia lô cho chính pool làm việc.
+    Nếu có bo_do (BoDoHieuNang), mỗi lần tạo file và mỗi lần lấy file có sẵn được ghi thành một số đo 'xuat_file'.
+    """
+
+    def __init__(self, thu_muc_kho, thu_muc_xuat, so_luong=2, dung_tien_trinh=True,
+                 dung_luong_toi_da=DUNG_LUONG_TOI_DA, tuoi_toi_da=TUOI_TOI_DA, bo_do=None):
+        self.thu_muc_kho, self.thu_muc_xuat = thu_muc_kho, thu_muc_xuat
+        self.bo_do = bo_do
+        self.so_luong, self.dung_tien_trinh = so_luong, dung_tien_trinh
+        self.dung_luong_toi_da, self.tuoi_toi_da = dung_luong_toi_da, tuoi_toi_da
+        self._khoa = threading.RLock()   # done_callback có thể chạy ngay trong gui() khi đang giữ khóa
+        self._cong_viec = {}   # ma -> Future
+        self._tien_do, self._thong_ke = {}, {}   # ma -> (đã xong, tổng) / thống kê của phiếu hàng loạt
+        self._pool = None
+        self._dieu_phoi = ThreadPoolExecutor(1, thread_name_prefix='phieu_hang_loat')
+        os.makedirs(thu_muc_xuat, exist_ok=True)
+
+    def _lay_pool(self):
+        if self._pool is None:
+            if self.dung_tien_trinh:
+                self._pool = ProcessPoolExecutor(self.so_luong, mp_context=mp.get_context('spawn'))
+            else: self._pool = ThreadPoolExecutor(self.so_luong, thread_name_prefix='xuat_file')
+        return self._pool
+
+    @staticmethod
+    def ma_truy_van(phien_ban, vi_tri, dinh_dang, cac_cot=None):
+        h = hashlib.sha1(f"{phien_ban}|{dinh_dang}|{list(cac_cot or [])}".encode('utf-8'))
+        h.update(np.ascontiguousarray(vi_tri, dtype=np.int64).tobytes())
+        return h.hexdigest()[:24]
+
+    def duong_dan(self, phien_ban, ma, dinh_dang):
+        return os.path.join(self.thu_muc_xuat, f"{phien_ban}_{ma}{DINH_DANG[dinh_dang][0]}")
+
+    def trang_thai(self, phien_ban, vi_tri, dinh_dang='xlsx', cac_cot=None):
+        """('xong', đường dẫn) | ('dang_chay', (đã xong, tổng) hoặc None) | ('loi', thông báo) | ('chua_co', None)."""
+        ma = self.ma_truy_van(phien_ban, vi_tri, dinh_dang, cac_cot)
+        duong_dan = self.duong_dan(phien_ban, ma, dinh_dang)
+        if os.path.exists(duong_dan):
+            try: os.utime(duong_dan)   # Đánh dấu vừa dùng để dọn theo LRU
+            except OSError: pass
+            return 'xong', duong_dan
+        cong_viec = self._cong_viec.get(ma)
+        if cong_viec is None: return 'chua_co', None
+        if not cong_viec.done(): return 'dang_chay', self._tien_do.get(ma)
+        loi = cong_viec.exception()
+        return ('loi', str(loi)) if loi else ('chua_co', None)   # Xong nhưng file đã bị dọn
+
+    def gui(self, phien_ban, vi_tri, dinh_dang='xlsx', cac_cot=None):
+        """Xếp công việc vào hàng đợi nếu file chưa có và chưa có ai đang tạo. Trả về Future (hoặc None)."""
+        vi_tri = np.ascontiguousarray(vi_tri, dtype=np.int64)
+        ma = self.ma_truy_van(phien_ban, vi_tri, dinh_dang, cac_cot)
+        duong_dan = self.duong_dan(phien_ban, ma, dinh_dang)
+        with self._khoa:
+            if os.path.exists(duong_dan): return None
+            cong_viec = self._cong_viec.get(ma)
+            if cong_viec is not None and (not cong_viec.done() or cong_viec.exception() is None): return cong_viec
+            file_arrow = duong_dan_ban_chia_se(self.thu_muc_kho, phien_ban)
+            if dinh_dang in ('zip', 'docx_gop'):
+                cong_viec = self._dieu_phoi.submit(self._chay_hang_loat, ma, file_arrow, vi_tri, list(cac_cot), dinh_dang, duong_dan)
+            else:
+                cong_viec = self._lay_pool().submit(_chay_xuat, file_arrow, vi_tri, list(cac_cot) if cac_cot else None, dinh_dang, duong_dan)
+            cong_viec.add_done_callback(lambda _: self.don_dep())
+            if self.bo_do is not None: cong_viec.add_done_callback(partial(self._ghi_do, dinh_dang, len(vi_tri), time.perf_counter()))
+            self._cong_viec[ma] = cong_viec
+            return cong_viec
+
+    def _chay_hang_loat(self, ma, file_arrow, vi_tri, cac_cot, dinh_dang, duong_dan):
+        bao_tien_do = lambda xong, tong: self._tien_do.__setitem__(ma, (xong, tong))
+        try:
+            thong_ke = tao_phieu_hang_loat(file_arrow, vi_tri, cac_cot, duong_dan, dinh_dang, self._lay_pool(),
+                                           cua_so=2 * self.so_luong, bao_tien_do=bao_tien_do)
+        finally: self._tien_do.pop(ma, None)
+        if len(self._thong_ke) > 100: self._thong_ke.clear()
+        self._thong_ke[ma] = thong_ke
+        return duong_dan
+
+    def _ghi_do(self, dinh_dang, so_dong, bat_dau, cong_viec):
+        """Thời gian từ lúc xếp hàng tới khi file tạo xong (chạy ở tiến trình làm việc nên không đo RSS)."""
+        loi = cong_viec.exception() if not cong_viec.cancelled() else None
+        self.bo_do.ghi('xuat_file', chi_tiet=dinh_dang, giay=time.perf_counter() - bat_dau, so_dong_tra=so_dong, trung_bo_dem=False,
+                       loi=type(loi).__name__ if loi else None)
+
+    def thong_ke(self, phien_ban, vi_tri, dinh_dang, cac_cot=None):
+        """Thống kê lần tạo phiếu hàng loạt gần nhất của truy vấn (so_phieu, giay, phieu_moi_giay) nếu còn."""
+        return self._thong_ke.get(self.ma_truy_van(phien_ban, vi_tri, dinh_dang, cac_cot))
+
+    def cho_ket_qua(self, phien_ban, vi_tri, dinh_dang='xlsx', cac_cot=None):
+        """Tạo (hoặc lấy từ kho) rồi trả về nội dung file; dùng cho nút tải trì hoãn của file nhỏ."""
+        bat_dau = time.perf_counter()
+        cong_viec = self.gui(phien_ban, vi_tri, dinh_dang, cac_cot)
+        duong_dan = cong_viec.result() if cong_viec is not None else \
+            self.duong_dan(phien_ban, self.ma_truy_van(phien_ban, vi_tri, dinh_dang, cac_cot), dinh_dang)
+        with open(duong_dan, 'rb') as f: noi_dung = f.read()
+        if cong_viec is None and self.bo_do is not None:   # File có sẵn trong kho: số đo của lần tạo đã được ghi lúc xong
+            self.bo_do.ghi('xuat_file', chi_tiet=dinh_dang, giay=time.perf_counter() - bat_dau, so_dong_tra=len(vi_tri), trung_bo_dem=True)
+        return noi_dung
+
+    def don_dep(self):
+        """Xóa file quá tuổi, sau đó xóa file ít dùng nhất cho tới khi tổng dung lượng dưới ngưỡng."""
+        with self._khoa:
+            self._cong_viec = {ma: cv for ma, cv in self._cong_viec.items() if not cv.done() or cv.exception() is not None}
+        danh_sach = []
+        for ten in os.listdir(self.thu_muc_xuat):
+            if ten.endswith('.tmp'): continue
+            duong_dan = os.path.join(self.thu_muc_xuat, ten)
+            try: tt = os.stat(duong_dan)
+            except OSError: continue
+            danh_sach.append((tt.st_mtime, tt.st_size, duong_dan))
+        danh_sach.sort()
+        tong = sum(d[1] for d in danh_sach)
+        han = time.time() - self.tuoi_toi_da
+        for mtime, kich_thuoc, duong_dan in danh_sach:
+            if mtime >= han and tong <= self.dung_luong_toi_da: break
+            try: os.remove(duong_dan); tong -= kich_thuoc
+            except OSError: pass
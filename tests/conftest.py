@@ -0,0 +1,59 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bhxh_du_lieu import luu_parquet, doc_du_lieu
+
+HO = ['Nguyễn', 'Trần', 'Lê', 'Phạm', 'Hoàng', 'Vũ', 'Đặng', 'Bùi']
+DEM = ['Văn', 'Thị', 'Hữu', 'Ngọc', 'Minh', 'Thu', '']
+TEN = ['An', 'Bình', 'Chi', 'Dũng', 'Hương', 'Lan', 'Phúc', 'Đức', 'Kiên', 'Anh']
+
+def tao_bang_mau(so_dong=3000, seed=0):
+    """Dữ liệu dạng chuỗi như pd.read_excel(dtype=str): có mã trùng, ô trống / giữ chỗ, ngày sai, chữ hoa, khoảng trắng thừa."""
+    rng = np.random.default_rng(seed)
+    def chon(gia_tri, n=so_dong): return np.asarray(gia_tri, dtype=object)[rng.integers(0, len(gia_tri), n)]
+    def chu_so(so_chu_so): return np.array([''.join(map(str, d)) for d in rng.integers(0, 10, (so_dong, so_chu_so))], dtype=object)
+    def ngay(tu, den):
+        tu, den = pd.Timestamp(tu), pd.Timestamp(den)
+        return (tu + pd.to_timedelta(rng.integers(0, (den - tu).days, so_dong), unit='D')).strftime('%d/%m/%Y').to_numpy(dtype=object)
+    bang = pd.DataFrame({
+        'hoTen': [' '.join(p for p in bo if p) for bo in zip(chon(HO), chon(DEM), chon(TEN))],
+        'ngaySinh': ngay('1940-01-01', '2020-12-31'), 'gioiTinh': chon(['Nam', 'Nữ']),
+        'soBhxh': chu_so(10), 'soCmnd': np.where(rng.random(so_dong) < 0.5, chu_so(9), chu_so(12)),
+        'soDienThoai': chu_so(10), 'diaChiLh': [f'Số {i % 97} đường {d}' for i, d in enumerate(chon(['Lê Lợi', 'Quang Trung', 'Hùng Vương']))],
+        'maTinh': chon(['01', '26', '48', '79']),
+        'hanTheDen': ngay('2024-01-01', '2027-12-31'), 'VSS_EMAIL': chon(['a@gmail.com', 'b.c@bhxh.vn', 'sai@', ''])})
+    def chen(cot, gia_tri, n=30):
+        vi_tri = rng.choice(so_dong, n, replace=False); bang.loc[vi_tri, cot] = chon(gia_tri, n)
+    bang.loc[rng.choice(so_dong, 20, replace=False), 'soBhxh'] = bang['soBhxh'].iloc[:20].to_numpy()   # Mã trùng
+    chen('soBhxh', ['', ' 0123456789 ']); chen('soCmnd', ['', 'nan', '0', None, '0123'])
+    chen('ngaySinh', ['', '31/02/1990', 'không rõ', None]); chen('hanTheDen', ['', None]); chen('hoTen', [None, '  '])
+    chen('hoTen', ['NGUYỄN VĂN AN', 'le thi lan', '  Trần Đức  ']); chen('soDienThoai', ['0912 345 678', 'null', '84912345678'])
+    return bang
+
+@pytest.fixture(scope='session')
+def bang_mau():
+    """Bảng chuỗi dùng chung cho cả phiên kiểm thử: chỉ được đọc."""
+    return tao_bang_mau()
+
+@pytest.fixture(scope='session')
+def file_mau(bang_mau, tmp_path_factory):
+    """Parquet dạng chuỗi như cache cũ."""
+    duong_dan = str(tmp_path_factory.mktemp('du_lieu_mau') / 'mau.parquet')
+    luu_parquet(bang_mau, duong_dan)
+    return duong_dan
+
+@pytest.fixture(scope='session')
+def df_mau(file_mau):
+    """Dữ liệu đã nạp như ứng dụng (cột ngày, category, cột không dấu). Dùng chung nên không được sửa."""
+    return doc_du_lieu(file_mau)[0]
+
+@pytest.fixture(scope='session')
+def chi_muc_mau(df_mau):
+    from bhxh_chi_muc import dung_chi_muc
+    return dung_chi_muc(df_mau)
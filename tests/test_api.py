@@ -0,0 +1,58 @@
+import asyncio
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from starlette.requests import Request
+
+from bhxh_api import tra_ma_so, tra_ho_ten, trang_thai_han, _doc_danh_sach_ma, Loi
+from bhxh_chi_muc import dung_chi_muc
+from bhxh_du_lieu import doc_du_lieu, luu_parquet
+
+@pytest.fixture(scope='module')
+def du_lieu(tmp_path_factory):
+    duong_dan = str(tmp_path_factory.mktemp('api') / 'nho.parquet')
+    luu_parquet(pd.DataFrame({
+        'soBhxh': ['0000000001', '0000000002', '0000000003', '0000000003'],
+        'hoTen': ['Nguyễn Văn An', 'Trần Thị Bình', 'Lê Văn Chí', 'Lê Văn Chí'],
+        'ngaySinh': ['01/02/1990', '15/03/1985', '20/12/2000', '20/12/2000'],
+        'hanTheDen': ['10/01/2026', '01/02/2026', '31/12/2026', ''],
+    }), duong_dan)
+    df = doc_du_lieu(duong_dan)[0]
+    return df, dung_chi_muc(df)
+
+def test_tra_ma_so_giu_thu_tu_va_ma_trung(du_lieu):
+    _, chi_muc = du_lieu
+    ma, vi_tri = tra_ma_so(chi_muc, ['0000000002', ' 9999 ', '0000000003', 1])
+    assert vi_tri.tolist() == [1, -1, 2, 3, -1]
+    assert ma.tolist() == ['0000000002', '9999', '0000000003', '0000000003', '1']
+
+def test_tra_ho_ten_theo_ngay_sinh(du_lieu):
+    _, chi_muc = du_lieu
+    stt, vi_tri, diem = tra_ho_ten(chi_muc, [('nguyen van an', '01/02/1990'), ('Tran Thi Binh', '15-03-1985'), ('Không Có', '01/01/1900')])
+    assert stt.tolist() == [0, 1, 2] and vi_tri.tolist() == [0, 1, -1]
+    assert diem[0] >= 0.75 and np.isnan(diem[2])
+
+def test_tra_ho_ten_khong_ngay_sinh(du_lieu):
+    _, chi_muc = du_lieu
+    stt, vi_tri, _ = tra_ho_ten(chi_muc, [('Le Van Chi', '')])
+    assert sorted(vi_tri.tolist()) == [2, 3] and stt.tolist() == [0, 0]
+
+def test_trang_thai_han(du_lieu):
+    df, _ = du_lieu
+    trang_thai, con_lai = trang_thai_han(df, np.array([0, 1, 2, 3, -1]), pd.Timestamp('2026-01-10 15:00'))
+    assert trang_thai.tolist() == ['het_han', 'sap_het_han', 'con_han', 'khong_ro', 'khong_tim_thay']
+    assert con_lai[:3].tolist() == [0, 22, 355] and con_lai[3:].isna().all()
+
+def _doc_ma(than, loai='application/json'):
+    async def nhan(): return {'type': 'http.request', 'body': than, 'more_body': False}
+    yeu_cau = Request({'type': 'http', 'method': 'POST', 'headers': [(b'content-type', loai.encode())]}, nhan)
+    return asyncio.run(_doc_danh_sach_ma(yeu_cau))
+
+def test_doc_danh_sach_ma():
+    assert _doc_ma(json.dumps({'ma': ['1', 2]}).encode()) == ['1', '2']
+    assert _doc_ma(b'1, 2\n3', 'text/plain') == ['1', '2', '3']
+    for than in [{'ma': 5}, {'ma': 'abc'}, {'ma': [None]}, {'ma': [True]}, {'ma': [[1]]}, {'khac': []}, [1]]:
+        with pytest.raises(Loi) as loi: _doc_ma(json.dumps(than).encode())
+        assert loi.value.ma == 400, than
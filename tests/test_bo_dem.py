@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from bhxh_bo_dem import BoDemKetQua
+
+class _DemLanTinh:
+    def __init__(self, gia_tri): self.gia_tri, self.so_lan = gia_tri, 0
+    def __call__(self):
+        self.so_lan += 1
+        return np.array(self.gia_tri)
+
+def test_trung_truot():
+    bo_dem, tinh = BoDemKetQua(), _DemLanTinh([1, 2, 3])
+    assert bo_dem.lay('v1', 'tim', 'an', tinh).tolist() == [1, 2, 3]
+    assert bo_dem.lay('v1', 'tim', 'an', tinh).tolist() == [1, 2, 3]
+    tk = bo_dem.thong_ke()
+    assert tinh.so_lan == 1 and (tk['trung'], tk['truot'], tk['so_muc']) == (1, 1, 1)
+
+def test_hai_phien_ban_cung_trung_khi_chuyen():
+    bo_dem, tinh = BoDemKetQua(), _DemLanTinh([1])
+    for _ in range(3):   # Phiên cũ và phiên mới xen kẽ trong lúc chuyển phiên bản
+        bo_dem.lay('v1', 'tim', 'an', tinh); bo_dem.lay('v2', 'tim', 'an', tinh)
+    assert tinh.so_lan == 2 and bo_dem.thong_ke()['vo_hieu'] == 0
+
+def test_bo_phien_ban_dung_lau_nhat():
+    bo_dem, tinh = BoDemKetQua(), _DemLanTinh([1])
+    bo_dem.lay('v1', 'tim', 'an', tinh); bo_dem.lay('v2', 'tim', 'an', tinh)
+    bo_dem.lay('v1', 'tim', 'an', tinh); bo_dem.lay('v3', 'tim', 'an', tinh)   # v2 dùng lâu nhất nên bị bỏ
+    tk = bo_dem.thong_ke()
+    assert tinh.so_lan == 3 and tk['vo_hieu'] == 1 and tk['phien_ban'] == ['v3', 'v1'] and tk['so_muc'] == 2
+    bo_dem.lay('v1', 'tim', 'an', tinh)
+    assert tinh.so_lan == 3
+
+def test_ket_qua_cua_phien_ban_cu_khong_duoc_luu():
+    bo_dem = BoDemKetQua()
+    def tinh_cham():   # Trong lúc tính, hai phiên bản mới hơn đã đẩy v1 ra khỏi bộ đệm
+        bo_dem.lay('v2', 'khac', 'x', lambda: np.array([0])); bo_dem.lay('v3', 'khac', 'x', lambda: np.array([0]))
+        return np.array([1])
+    bo_dem.lay('v1', 'tim', 'an', tinh_cham)
+    assert bo_dem.thong_ke()['so_muc'] == 2 and bo_dem.thong_ke()['phien_ban'] == ['v3', 'v2']
+
+def test_bo_muc_qua_han_va_khi_day():
+    qua_han, tinh = BoDemKetQua(tuoi_toi_da=-1), _DemLanTinh([1])
+    qua_han.lay('v1', 'tim', 'an', tinh); qua_han.lay('v1', 'tim', 'an', tinh)
+    assert tinh.so_lan == 2
+    day = BoDemKetQua(dung_luong_toi_da=3 * 8 * 100)
+    for i in range(5): day.lay('v1', 'tim', i, lambda: np.zeros(100, dtype=np.int64))
+    tk = day.thong_ke()
+    assert tk['so_muc'] == 3 and tk['bo_do_day'] == 2 and tk['dung_luong'] <= tk['dung_luong_toi_da']
+
+def test_ket_qua_chi_doc():
+    ket_qua = BoDemKetQua().lay('v1', 'tim', 'an', lambda: (np.arange(3), np.arange(2)))
+    with pytest.raises(ValueError): ket_qua[0][0] = 5
+
+def test_xoa():
+    bo_dem, tinh = BoDemKetQua(), _DemLanTinh([1])
+    bo_dem.lay('v1', 'tim', 'an', tinh); bo_dem.xoa(); bo_dem.lay('v1', 'tim', 'an', tinh)
+    assert tinh.so_lan == 2
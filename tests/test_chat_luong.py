@@ -0,0 +1,31 @@
+import re
+
+import numpy as np
+
+from bhxh_chat_luong import BaoCaoChatLuong, DINH_DANG, GIA_TRI_GIU_CHO
+from bhxh_du_lieu import cot_dang_chuoi, la_cot_phu
+
+def test_o_trong_giong_bo_loc_cu(df_mau):
+    bao_cao = BaoCaoChatLuong(df_mau)
+    for cot in [c for c in df_mau.columns if not la_cot_phu(c)]:
+        cu = np.flatnonzero(cot_dang_chuoi(df_mau, cot).str.strip().str.lower().isin(GIA_TRI_GIU_CHO).to_numpy(dtype=bool))
+        assert np.array_equal(bao_cao.vi_tri(cot, 'thieu'), cu), cot
+        assert bao_cao.dem(cot, 'thieu') == len(cu)
+
+def test_dinh_dang_va_trung_ma(df_mau):
+    bao_cao = BaoCaoChatLuong(df_mau)
+    for cot in ('soBhxh', 'soCmnd'):
+        chuoi = cot_dang_chuoi(df_mau, cot).str.strip()
+        thieu = chuoi.str.lower().isin(GIA_TRI_GIU_CHO).to_numpy(dtype=bool)
+        sai = np.array([not re.search(DINH_DANG[cot][0], g) for g in chuoi]) & ~thieu
+        assert np.array_equal(bao_cao.vi_tri(cot, 'dinh_dang'), np.flatnonzero(sai)), cot
+        trung = chuoi[~thieu].duplicated(keep=False)
+        assert np.array_equal(bao_cao.vi_tri(cot, 'trung'), np.flatnonzero(~thieu)[trung.to_numpy()]), cot
+
+def test_song_song_giong_tuan_tu(df_mau, monkeypatch):
+    import bhxh_chat_luong
+    tuan_tu = BaoCaoChatLuong(df_mau, so_luong=1)
+    monkeypatch.setattr(bhxh_chat_luong, 'SO_DONG_SONG_SONG', 0)
+    song_song = BaoCaoChatLuong(df_mau, so_luong=4)
+    assert tuan_tu.cac_luat() == song_song.cac_luat()
+    for cot, loai in tuan_tu.cac_luat(): assert np.array_equal(tuan_tu.vi_tri(cot, loai), song_song.vi_tri(cot, loai))
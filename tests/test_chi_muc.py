@@ -0,0 +1,64 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bhxh_chi_muc import dung_chi_muc, tim_kiem_quet, doi_chieu_voi_quet, loc_theo_cau_hoi
+from bhxh_du_lieu import xoa_dau_tieng_viet, cot_dang_chuoi
+
+def _cac_tu_khoa(df, cot, so_mau=15):
+    """Giá trị đầy đủ, tiền tố, đoạn giữa chuỗi, đổi hoa thường và vài chuỗi ngắn / không có."""
+    gia_tri = [g for g in cot_dang_chuoi(df, cot).str.strip() if g][:: max(1, len(df) // so_mau)][:so_mau]
+    tu_khoa = ['0', '01', '0123', 'zzzz', ' ']
+    for g in gia_tri: tu_khoa += [g, g[:2], g[:5], g[2:6], g[-3:], g.upper(), g.lower()]
+    return sorted(set(tu_khoa))
+
+@pytest.mark.parametrize('cot', ['soBhxh', 'soCmnd', 'ngaySinh', 'hoTen', 'hoTen_khongdau', 'diaChiLh'])
+def test_tim_trung_ket_qua_quet(df_mau, chi_muc_mau, cot):
+    for tu_khoa in _cac_tu_khoa(df_mau, cot):
+        assert np.array_equal(chi_muc_mau.tim(df_mau, cot, tu_khoa), tim_kiem_quet(df_mau, cot, tu_khoa)), tu_khoa
+
+@pytest.mark.parametrize('cot,kieu', [('soBhxh', 'chinh_xac'), ('soCmnd', 'chinh_xac'), ('soBhxh', 'tien_to'),
+                                      ('soCmnd', 'tien_to'), ('ngaySinh', 'tien_to'), ('hoTen', 'chua'), ('hoTen_khongdau', 'chua')])
+def test_tung_chi_muc_trung_ket_qua_quet(df_mau, chi_muc_mau, cot, kieu):
+    for tu_khoa in _cac_tu_khoa(df_mau, cot):
+        assert doi_chieu_voi_quet(chi_muc_mau, df_mau, cot, tu_khoa, kieu), tu_khoa
+
+def test_cot_khong_dau_giong_ham_tung_gia_tri(df_mau):
+    for cot in ('hoTen', 'diaChiLh'):
+        assert df_mau[cot + '_khongdau'].tolist() == [xoa_dau_tieng_viet(g) for g in cot_dang_chuoi(df_mau, cot)], cot
+
+def test_tim_ma_so_gom_ca_khop_giua_chuoi():
+    df = pd.DataFrame({'soBhxh': ['0123456789', '9990123000', '1111111111'], 'soCmnd': ['0123', '99012345', '012399']})
+    chi_muc = dung_chi_muc(df)
+    assert chi_muc.tim(df, 'soCmnd', '0123').tolist() == [0, 1, 2]
+    assert chi_muc.tim(df, 'soBhxh', '0123').tolist() == [0, 1]
+    assert chi_muc.tim(df, 'soBhxh', '1111111111').tolist() == [2]
+
+def test_dem_han_khop_dem_truc_tiep(df_mau, chi_muc_mau):
+    hom_nay = pd.Timestamp('2026-01-15')
+    dem = chi_muc_mau.dem_han('hanTheDen', hom_nay)
+    han = df_mau['hanTheDen']
+    assert dem['het'] == int((han <= hom_nay).sum())
+    for moc in (7, 30, 60, 90):
+        assert dem[moc] == int(((han > hom_nay) & (han <= hom_nay + pd.Timedelta(days=moc))).sum())
+
+def test_dem_han_dung_chung_giua_cac_luong(df_mau):
+    chi_muc = dung_chi_muc(df_mau)
+    loi, ngay = [], pd.date_range('2025-01-01', periods=60)
+    def chay():
+        try:
+            for n in ngay: assert 'het' in chi_muc.dem_han('hanTheDen', n)
+        except Exception as e: loi.append(e)
+    cac_luong = [threading.Thread(target=chay) for _ in range(4)]
+    for t in cac_luong: t.start()
+    for t in cac_luong: t.join()
+    assert not loi
+
+def test_loc_theo_cau_hoi_ngay_sinh_va_ma_so(df_mau, chi_muc_mau):
+    dong = df_mau.dropna(subset=['ngaySinh']).iloc[7]
+    ngay = dong['ngaySinh'].strftime('%d/%m/%Y')
+    vi_tri, filters = loc_theo_cau_hoi(df_mau, chi_muc_mau, f"tìm {ngay} {dong['soBhxh']}")
+    assert dong.name in vi_tri and len(filters) == 2
+    assert (df_mau['ngaySinh'].iloc[vi_tri] == dong['ngaySinh']).all()
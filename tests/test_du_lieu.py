@@ -0,0 +1,34 @@
+import pandas as pd
+
+from benchmarks.du_lieu_mau import GhiXlsb
+from bhxh_du_lieu import doc_du_lieu, luu_parquet, cot_dang_chuoi, la_cot_phu, chuyen_xlsb_sang_parquet
+
+def test_doc_lai_giong_chuoi_goc(bang_mau, df_mau):
+    assert [c for c in df_mau.columns if not la_cot_phu(c)] == list(bang_mau.columns)
+    for cot in bang_mau.columns:
+        assert cot_dang_chuoi(df_mau, cot).tolist() == bang_mau[cot].fillna('').tolist(), cot
+
+def test_kieu_cot(df_mau):
+    assert pd.api.types.is_datetime64_any_dtype(df_mau['ngaySinh']) and pd.api.types.is_datetime64_any_dtype(df_mau['hanTheDen'])
+    assert isinstance(df_mau['gioiTinh'].dtype, pd.CategoricalDtype) and isinstance(df_mau['maTinh'].dtype, pd.CategoricalDtype)
+    assert df_mau['ngaySinh_goc'].notna().sum() > 0   # Ngày sai vẫn giữ chuỗi gốc
+
+def test_ghi_lai_khong_can_nang_cap(df_mau, tmp_path):
+    duong_dan = str(tmp_path / 'moi.parquet')
+    luu_parquet(df_mau, duong_dan)
+    df, can_ghi_lai = doc_du_lieu(duong_dan)
+    assert not can_ghi_lai
+    for cot in df_mau.columns: assert cot_dang_chuoi(df, cot).tolist() == cot_dang_chuoi(df_mau, cot).tolist(), cot
+
+def _o(df):
+    return df.astype(object).where(df.notna(), None).values.tolist()
+
+def test_xlsb_giong_read_excel(tmp_path):
+    file_xlsb, file_parquet = str(tmp_path / 'a.xlsb'), str(tmp_path / 'a.parquet')
+    ghi = GhiXlsb(file_xlsb, ['soBhxh', 'hoTen', 'ghiChu'])
+    for dong in [[123.0, 'null', 'NA'], [1.5, 'nan', ' null '], ['0123', 'None', 'N/A'], [None, 'An', '#N/A'], [7.0, '', 'NULL']]:
+        ghi.ghi_dong(dong)
+    ghi.dong()
+    chuyen_xlsb_sang_parquet(file_xlsb, file_parquet)
+    df = pd.read_parquet(file_parquet)
+    assert _o(df[[c for c in df.columns if not la_cot_phu(c)]]) == _o(pd.read_excel(file_xlsb, engine='pyxlsb', dtype=str))
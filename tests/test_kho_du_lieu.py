@@ -0,0 +1,100 @@
+import os
+import threading
+
+import pandas as pd
+import pytest
+
+from bhxh_du_lieu import luu_parquet, doc_du_lieu, cot_dang_chuoi, la_cot_phu
+from bhxh_kho_du_lieu import (tinh_delta, cap_nhat_tang_dan, ghi_ban_day_du, khoi_tao_kho, doc_kho, doc_manifest,
+                              mo_ban_chia_se, gop_kho, file_tam_trong_kho, FILE_KHOA)
+from bhxh_khoa_file import khoa_file
+
+def _bang(ma, ten, ngay=None):
+    return pd.DataFrame({'soBhxh': ma, 'hoTen': ten, 'ngaySinh': ngay or ['01/01/1990'] * len(ma)})
+
+def _ghi(thu_muc, df):
+    duong_dan = file_tam_trong_kho(thu_muc); luu_parquet(df, duong_dan)
+    return duong_dan
+
+def _theo_khoa(df):
+    """Nội dung như người dùng nhìn thấy, sắp theo soBhxh (thứ tự dòng sau khi áp delta không giữ nguyên)."""
+    cac_cot = [c for c in df.columns if not la_cot_phu(c)]
+    bang = pd.DataFrame({c: cot_dang_chuoi(df, c).to_numpy(dtype=object) for c in cac_cot})
+    return bang.sort_values('soBhxh').reset_index(drop=True)
+
+def test_tinh_delta():
+    cu = _bang(['1', '2', '3'], ['An', 'Binh', 'Chi'])
+    moi = _bang(['2', '3', '4'], ['Binh', 'Chi Mai', 'Dung'])
+    vi_tri_them, vi_tri_sua, khoa_xoa = tinh_delta(cu, moi)
+    assert vi_tri_them.tolist() == [2] and vi_tri_sua.tolist() == [1] and khoa_xoa.tolist() == ['1']
+
+def test_cap_nhat_tang_dan_khop_ban_day_du(tmp_path, file_mau):
+    thu_muc = str(tmp_path)
+    df_goc, _ = doc_du_lieu(file_mau)
+    df_goc = df_goc[~cot_dang_chuoi(df_goc, 'soBhxh').duplicated(keep=False).to_numpy()].reset_index(drop=True)
+    cot = [c for c in df_goc.columns if not la_cot_phu(c)]
+    cu = pd.DataFrame({c: cot_dang_chuoi(df_goc, c) for c in cot})
+    ghi_ban_day_du(thu_muc, _ghi(thu_muc, cu))
+
+    moi = cu.iloc[50:].copy()                                  # Xóa 50 dòng đầu
+    moi.loc[moi.index[:30], 'hoTen'] = 'Người Đã Sửa'          # Sửa 30 dòng
+    them = cu.iloc[:20].copy(); them['soBhxh'] = [f"99{i:08d}" for i in range(20)]
+    moi = pd.concat([moi, them], ignore_index=True)            # Thêm 20 dòng
+    tom_tat = cap_nhat_tang_dan(thu_muc, _ghi(thu_muc, moi))
+    assert (tom_tat['che_do'], tom_tat['them'], tom_tat['sua'], tom_tat['xoa']) == ('tang_dan', 20, 30, 50)
+    assert tom_tat['phien_ban'] == 'v000002'
+    pd.testing.assert_frame_equal(_theo_khoa(doc_kho(thu_muc)), _theo_khoa(moi))
+
+    ban = mo_ban_chia_se(thu_muc)[1]
+    pd.testing.assert_frame_equal(_theo_khoa(ban), _theo_khoa(moi))
+    gop_kho(thu_muc)
+    assert doc_manifest(thu_muc)['delta'] == []
+    pd.testing.assert_frame_equal(_theo_khoa(doc_kho(thu_muc)), _theo_khoa(moi))
+
+def test_cap_nhat_khong_doi_giu_phien_ban(tmp_path):
+    thu_muc = str(tmp_path); df = _bang(['1', '2'], ['An', 'Binh'])
+    ghi_ban_day_du(thu_muc, _ghi(thu_muc, df))
+    tom_tat = cap_nhat_tang_dan(thu_muc, _ghi(thu_muc, df))
+    assert tom_tat['phien_ban'] == 'v000001' and tom_tat['them'] == tom_tat['sua'] == tom_tat['xoa'] == 0
+
+def test_khoa_trung_thi_thay_the_toan_bo(tmp_path):
+    thu_muc = str(tmp_path)
+    ghi_ban_day_du(thu_muc, _ghi(thu_muc, _bang(['1', '2'], ['An', 'Binh'])))
+    tom_tat = cap_nhat_tang_dan(thu_muc, _ghi(thu_muc, _bang(['1', '1'], ['An', 'An Khac'])))
+    assert tom_tat['che_do'] == 'toan_bo' and len(doc_kho(thu_muc)) == 2
+
+def test_mo_dung_phien_ban(tmp_path):
+    thu_muc = str(tmp_path)
+    for i in range(1, 4):
+        ghi_ban_day_du(thu_muc, _ghi(thu_muc, _bang([str(j) for j in range(i)], ['An'] * i)))
+        assert mo_ban_chia_se(thu_muc)[0] == f"v{i:06d}"
+    ma, df = mo_ban_chia_se(thu_muc, 'v000002')              # Bản trước vẫn được giữ
+    assert ma == 'v000002' and len(df) == 2 and df.attrs['phien_ban'] == 'v000002'
+    with pytest.raises(LookupError): mo_ban_chia_se(thu_muc, 'v000001')
+
+def test_khoi_tao_kho_tu_cache_cu(tmp_path):
+    thu_muc, file_cu = str(tmp_path / 'kho'), str(tmp_path / 'cu.parquet')
+    luu_parquet(_bang(['1', '2'], ['An', 'Binh']), file_cu)
+    assert khoi_tao_kho(thu_muc, file_cu, str(tmp_path / 'khong_co.xlsb'))
+    assert not os.path.exists(file_cu)
+    assert not khoi_tao_kho(thu_muc, file_cu, str(tmp_path / 'khong_co.xlsb'))
+    assert doc_manifest(thu_muc)['phien_ban'] == 'v000001'
+    assert not [t for t in os.listdir(thu_muc) if t.startswith('moi_')]
+
+def test_ghi_dong_thoi_khong_mat_phien_ban(tmp_path):
+    thu_muc = str(tmp_path); loi = []
+    ghi_ban_day_du(thu_muc, _ghi(thu_muc, _bang(['0'], ['An'])))
+    def chay(i):
+        try: ghi_ban_day_du(thu_muc, _ghi(thu_muc, _bang([str(i)], [f'Ten {i}'])))
+        except Exception as e: loi.append(e)
+    cac_luong = [threading.Thread(target=chay, args=(i,)) for i in range(1, 7)]
+    for t in cac_luong: t.start()
+    for t in cac_luong: t.join()
+    assert not loi and doc_manifest(thu_muc)['so'] == 7
+    assert os.path.exists(os.path.join(thu_muc, FILE_KHOA))   # File khóa không bao giờ bị xóa
+
+def test_khoa_file_loai_tru_va_het_gio(tmp_path):
+    duong_dan = str(tmp_path / 'x.lock')
+    with khoa_file(duong_dan):
+        with pytest.raises(TimeoutError), khoa_file(duong_dan, cho_toi_da=0.1): pass
+    with khoa_file(duong_dan, cho_toi_da=0.1): pass
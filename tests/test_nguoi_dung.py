@@ -0,0 +1,62 @@
+import json
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+from bhxh_nguoi_dung import KhoNguoiDung, MAT_KHAU_MAC_DINH
+
+@pytest.fixture
+def duong_dan(tmp_path):
+    return str(tmp_path / 'users.json')
+
+def test_khoi_tao_quan_tri_mac_dinh(duong_dan):
+    kho = KhoNguoiDung(duong_dan, so_luong_bam=1)
+    assert list(kho.doc()['usernames']) == ['bhxh_admin']
+    ma_bam = kho.doc()['usernames']['bhxh_admin']['password']
+    assert kho.kiem_tra_mat_khau(MAT_KHAU_MAC_DINH, ma_bam) and not kho.kiem_tra_mat_khau('sai', ma_bam)
+
+def test_cap_nhat_dong_thoi_khong_mat_thay_doi(duong_dan):
+    KhoNguoiDung(duong_dan).doc(); loi = []
+    def them(i):   # Mỗi luồng một đối tượng riêng, như hai tiến trình khác nhau
+        try: KhoNguoiDung(duong_dan).cap_nhat(lambda c: c['usernames'].__setitem__(f'u{i}', {'name': str(i), 'password': f'mk{i}', 'role': 'user'}))
+        except Exception as e: loi.append(e)
+    cac_luong = [threading.Thread(target=them, args=(i,)) for i in range(6)]
+    for t in cac_luong: t.start()
+    for t in cac_luong: t.join()
+    with open(duong_dan, encoding='utf-8') as f: cau_hinh = json.load(f)
+    assert not loi and sorted(cau_hinh['usernames']) == ['bhxh_admin'] + [f'u{i}' for i in range(6)]
+    assert all(u['password'].startswith('$2') for u in cau_hinh['usernames'].values())   # Mật khẩu thô đã được băm
+    assert KhoNguoiDung(duong_dan).kiem_tra_mat_khau('mk3', cau_hinh['usernames']['u3']['password'])
+
+def test_loi_trong_ham_huy_lan_ghi(duong_dan):
+    kho = KhoNguoiDung(duong_dan); kho.doc()
+    def hong(cau_hinh):
+        cau_hinh['usernames'].clear(); raise ValueError('trùng tên')
+    with pytest.raises(ValueError): kho.cap_nhat(hong)
+    assert list(kho.doc()['usernames']) == ['bhxh_admin']
+
+def test_file_sua_tay_duoc_doc_lai_va_bam(duong_dan):
+    kho = KhoNguoiDung(duong_dan); kho.doc()
+    with open(duong_dan, encoding='utf-8') as f: cau_hinh = json.load(f)
+    cau_hinh['usernames']['moi'] = {'name': 'Mới', 'password': 'abc', 'role': 'user'}
+    with open(duong_dan, 'w', encoding='utf-8') as f: json.dump(cau_hinh, f)
+    ma_bam = kho.doc()['usernames']['moi']['password']
+    assert ma_bam.startswith('$2') and kho.kiem_tra_mat_khau('abc', ma_bam)
+
+def test_bam_mat_khau_ngoai_khoa(duong_dan):
+    kho = KhoNguoiDung(duong_dan); kho.doc()
+    khoa_goc, bam_goc, dang_khoa, bam_trong_khoa = kho._khoa_file, kho.bam_mat_khau, [False], []
+    @contextmanager
+    def khoa():
+        with khoa_goc():
+            dang_khoa[0] = True
+            try: yield
+            finally: dang_khoa[0] = False
+    def bam(mat_khau):
+        if dang_khoa[0]: bam_trong_khoa.append(mat_khau)
+        return bam_goc(mat_khau)
+    kho._khoa_file, kho.bam_mat_khau = khoa, bam
+    kho.cap_nhat(lambda c: c['usernames'].__setitem__('moi', {'name': 'Mới', 'password': 'abc', 'role': 'user'}))
+    assert not bam_trong_khoa
+    assert kho.kiem_tra_mat_khau('abc', kho.doc()['usernames']['moi']['password'])
@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+from bhxh_tim_ten import ChiMucTen, khoang_cach_sua
+
+def _osa(a, b):
+    """Khoảng cách sửa có đảo hai ký tự liền nhau, cài đặt trực tiếp để đối chiếu."""
+    d = [[i + j if i * j == 0 else 0 for j in range(len(b) + 1)] for i in range(len(a) + 1)]
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            d[i][j] = min(d[i - 1][j] + 1, d[i][j - 1] + 1, d[i - 1][j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]: d[i][j] = min(d[i][j], d[i - 2][j - 2] + 1)
+    return d[-1][-1]
+
+def test_khoang_cach_sua_giong_quy_hoach_dong():
+    tu_dien = ['hung', 'hnug', 'an', 'nguyen', 'nguyn', 'thi', 'huong', '']
+    chi_muc = ChiMucTen(pd.Series([' '.join(tu_dien)]))
+    for tu in ['hung', 'hnug', 'huong', 'ngyuen', 'a', 'thii']:
+        kc = khoang_cach_sua(tu, chi_muc.ma_tu_dien, chi_muc.do_dai_tu)
+        assert kc.tolist() == [_osa(tu, t) for t in chi_muc.tu_dien], tu
+
+def test_tim_dao_thu_tu_va_go_sai():
+    chi_muc = ChiMucTen(pd.Series(['nguyen van an', 'tran thi binh', 'nguyen thi an', 'le van hung', None]))
+    vi_tri, diem = chi_muc.tim('an nguyen van')
+    assert vi_tri[0] == 0 and diem[0] >= diem[1:].max()
+    assert chi_muc.tim('le van hnug')[0][0] == 3
+    assert chi_muc.tim('nguyen', trong=[2, 3])[0].tolist() == [2]
+    assert len(chi_muc.tim('zzzz')[0]) == 0 and len(chi_muc.tim('')[0]) == 0
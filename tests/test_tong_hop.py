@@ -0,0 +1,42 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from bhxh_du_lieu import cot_dang_chuoi
+from bhxh_tong_hop import KhoiTongHop, TINH_TRANG_HAN, NHAN_KHAC
+
+HOM_NAY = pd.Timestamp('2026-01-15')
+
+def test_dem_va_vi_tri_khop_df(df_mau):
+    khoi = KhoiTongHop(df_mau, HOM_NAY)
+    for cot in ('gioiTinh', 'maTinh', 'soCmnd'):
+        chuoi, bang = cot_dang_chuoi(df_mau, cot), khoi.dem(cot, hom_nay=HOM_NAY)
+        assert bang['Số lượng'].sum() == int((chuoi != '').sum()), cot
+        for nhan in bang['Phân loại']:
+            if nhan == NHAN_KHAC: continue
+            assert np.array_equal(khoi.vi_tri(cot, nhan, hom_nay=HOM_NAY), np.flatnonzero((chuoi == nhan).to_numpy(dtype=bool))), (cot, nhan)
+
+def test_bang_cheo_chi_giu_ngay_dang_xem(df_mau):
+    khoi = KhoiTongHop(df_mau, HOM_NAY)
+    for ngay in pd.date_range(HOM_NAY, periods=5):
+        bang = khoi.bang_cheo('maTinh', TINH_TRANG_HAN, hom_nay=ngay)
+        assert bang['Số lượng'].sum() == int(df_mau['maTinh'].notna().sum())
+    assert sorted({k[2] for k in khoi._bang_cheo} - {None}) == [HOM_NAY + pd.Timedelta(days=4)]
+    assert ('maTinh', 'gioiTinh', None) in khoi._bang_cheo
+
+def test_dung_chung_giua_cac_luong(df_mau):
+    khoi, loi = KhoiTongHop(df_mau, HOM_NAY), []
+    mong_doi = {ngay: khoi.bang_cheo('maTinh', TINH_TRANG_HAN, hom_nay=ngay) for ngay in pd.date_range(HOM_NAY, periods=3)}
+    def chay():
+        try:
+            for _ in range(20):
+                for ngay, bang in mong_doi.items():
+                    pd.testing.assert_frame_equal(khoi.bang_cheo('maTinh', TINH_TRANG_HAN, hom_nay=ngay), bang)
+                    assert khoi.dem(TINH_TRANG_HAN, hom_nay=ngay)['Số lượng'].sum() == len(df_mau)
+                    khoi.dem('soBhxh')
+        except Exception as e: loi.append(e)
+    cac_luong = [threading.Thread(target=chay) for _ in range(4)]
+    for t in cac_luong: t.start()
+    for t in cac_luong: t.join()
+    assert not loi
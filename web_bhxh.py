@@ -2,99 +2,151 @@ import streamlit as st
 import pandas as pd
 import os
 import streamlit_authenticator as stauth
-import yaml
-import bcrypt
 import plotly.express as px
-import requests 
-import json
-import re
-import unicodedata
-import csv 
+import time
 from datetime import datetime, timedelta
-from io import BytesIO
-from docx import Document 
-from docx.shared import Pt, RGBColor
+from functools import partial
+from bhxh_chi_muc import dung_chi_muc, loc_theo_cau_hoi, CAC_MOC_HAN
+from bhxh_du_lieu import xoa_dau_tieng_viet, la_cot_phu, chuyen_xlsb_sang_parquet, dang_hien_thi
+from bhxh_kho_du_lieu import mo_ban_chia_se, phien_ban, khoi_tao_kho, ghi_ban_day_du, cap_nhat_tang_dan, file_tam_trong_kho
+from bhxh_xuat_file import QuanLyXuatFile, DINH_DANG
+from bhxh_tong_hop import dung_khoi_tong_hop
+from bhxh_bo_dem import BoDemKetQua
+from bhxh_chat_luong import dung_bao_cao_chat_luong, MO_TA_LUAT
+from bhxh_phan_trang import ConTroKetQua, anh_xa_cot, SO_DONG_MOI_TRANG_BANG
+from bhxh_nguoi_dung import KhoNguoiDung
+from bhxh_nhat_ky import BoGhiNhatKy, chuyen_csv_cu, truy_van as truy_van_nhat_ky, xuat_csv as xuat_csv_nhat_ky
+from bhxh_hieu_nang import BoDoHieuNang, ghi_so_dong, doc_do_luong, tong_hop as tong_hop_hieu_nang, xu_huong, truy_van_cham, NGUONG_CHAM
 
 # --- CẤU HÌNH TRANG ---
 st.set_page_config(page_title="BHXH Web Manager", layout="wide", initial_sidebar_state="expanded")
 
 # --- CẤU HÌNH FILE ---
-PARQUET_FILE = 'data_cache.parquet' 
+PARQUET_FILE = 'data_cache.parquet' # Cache một file của bản cũ, được chuyển vào DATA_DIR ở lần chạy đầu
 EXCEL_FILE = 'aaa.xlsb' 
+DATA_DIR = 'data_store' # Kho dữ liệu có phiên bản (đoạn gốc + delta + manifest.json)
+EXPORT_DIR = 'exports_cache' # File Excel/CSV/Word đã xuất, lưu theo mã băm truy vấn
+NGUONG_XUAT_NGAY = 5000 # Kết quả nhỏ hơn mức này được tạo ngay khi bấm tải, lớn hơn thì chạy nền
+NGUONG_PHIEU_NGAY = 100 # Tương tự cho phiếu Word hàng loạt
 USER_DB_FILE = 'users.json' 
-LOG_FILE = 'activity_logs.csv' 
+LOG_FILE = 'activity_logs.csv' # Nhật ký dạng CSV của bản cũ, được chuyển vào LOG_DIR ở lần chạy đầu
+LOG_DIR = 'nhat_ky' # Nhật ký hoạt động, mỗi tháng một file SQLite có chỉ mục
+SO_DONG_MOI_TRANG_NHAT_KY = 200
+PERF_DIR = 'hieu_nang' # Số đo thời gian / bộ nhớ của từng thao tác, mỗi tháng một file SQLite
 COT_UU_TIEN = ['hoTen', 'ngaySinh', 'soBhxh', 'hanTheDen', 'soCmnd', 'soDienThoai', 'diaChiLh', 'VSS_EMAIL']
 
 # --- HỆ THỐNG LOGGING (NHẬT KÝ) ---
-def log_action(username, action, detail=""):
-    """Ghi lại hoạt động của người dùng vào file CSV."""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    file_exists = os.path.isfile(LOG_FILE)
-    
-    # Giới hạn độ dài chi tiết để tránh lỗi file CSV quá lớn
-    detail = str(detail)[:150] 
+@st.cache_resource
+def lay_bo_ghi_nhat_ky():
+    """Hàng đợi nhật ký dùng chung cho mọi phiên, ghi theo lô ở luồng nền."""
+    chuyen_csv_cu(LOG_FILE, LOG_DIR)
+    return BoGhiNhatKy(LOG_DIR)
 
-    with open(LOG_FILE, mode='a', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        if not file_exists:
-            writer.writerow(['Thời gian', 'Người dùng', 'Hành động', 'Chi tiết'])
-        writer.writerow([timestamp, username, action, detail])
+def log_action(username, action, detail=""):
+    """Ghi lại hoạt động của người dùng (đưa vào hàng đợi, không ghi đĩa trong lượt chạy của trang)."""
+    lay_bo_ghi_nhat_ky().ghi(username, action, detail)
 
 def hien_thi_nhat_ky_he_thong(user_config):
-    """Hiển thị và lọc nhật ký hoạt động của từng người dùng."""
+    """Hiển thị và lọc nhật ký hoạt động theo người dùng và khoảng thời gian, từng trang một."""
     st.markdown("### 🕵️‍♂️ NHẬT KÝ HOẠT ĐỘNG HỆ THỐNG")
-    
-    if os.path.exists(LOG_FILE):
-        df_log = pd.read_csv(LOG_FILE)
-        df_log = df_log.sort_values(by='Thời gian', ascending=False)
-        
-        user_list = ['Tất cả người dùng'] + list(user_config['usernames'].keys())
-        selected_user = st.selectbox("Chọn người dùng để xem nhật ký:", user_list)
-        
-        df_display = df_log.copy()
-        
-        if selected_user != 'Tất cả người dùng':
-            df_display = df_log[df_log['Người dùng'] == selected_user]
-            st.info(f"Đang hiển thị nhật ký của: **{selected_user}** ({len(df_display)} hoạt động).")
-        else:
-            st.info(f"Đang hiển thị nhật ký của: **Tất cả người dùng** ({len(df_display)} hoạt động).")
-            
-        if df_display.empty:
-            st.warning("Không có hoạt động nào được ghi lại cho người dùng này.")
-            return
-
-        st.dataframe(df_display, use_container_width=True, height=500)
-        csv = df_display.to_csv(index=False).encode('utf-8-sig')
-        st.download_button(f"📥 Tải Nhật ký của {selected_user}", csv, f"nhat_ky_{selected_user}.csv", "text/csv")
-        
+    lay_bo_ghi_nhat_ky().xa()   # Ghi nốt các dòng đang chờ để thấy cả thao tác vừa làm
+
+    c1, c2 = st.columns([1, 1])
+    user_list = ['Tất cả người dùng'] + list(user_config['usernames'].keys())
+    selected_user = c1.selectbox("Chọn người dùng để xem nhật ký:", user_list)
+    hom_nay = datetime.now().date()
+    khoang = c2.date_input("Khoảng thời gian:", (hom_nay - timedelta(days=30), hom_nay), format="DD/MM/YYYY")
+    tu, den = (khoang[0], khoang[-1]) if khoang else (None, None)
+    nguoi_dung = None if selected_user == 'Tất cả người dùng' else selected_user
+
+    # Về trang đầu khi đổi điều kiện lọc
+    bo_loc = (nguoi_dung, tu, den)
+    if st.session_state.get('bo_loc_nhat_ky') != bo_loc: st.session_state['bo_loc_nhat_ky'] = bo_loc; st.session_state['trang_nhat_ky'] = 1
+    trang = st.session_state.get('trang_nhat_ky', 1)
+    df_display, tong = truy_van_nhat_ky(LOG_DIR, nguoi_dung, tu, den, trang - 1, SO_DONG_MOI_TRANG_NHAT_KY)
+    st.info(f"Đang hiển thị nhật ký của: **{selected_user}** ({tong:,} hoạt động).")
+    if tong == 0:
+        st.warning("Không có hoạt động nào được ghi lại cho người dùng này.")
+        return
+
+    so_trang = (tong - 1) // SO_DONG_MOI_TRANG_NHAT_KY + 1
+    st.dataframe(df_display, use_container_width=True, height=500)
+    p1, p2, p3 = st.columns([1, 2, 1])
+    if p1.button("⬅️ Trang trước", disabled=trang <= 1): st.session_state['trang_nhat_ky'] = trang - 1; st.rerun()
+    p2.caption(f"Trang {trang:,}/{so_trang:,}")
+    if p3.button("Trang sau ➡️", disabled=trang >= so_trang): st.session_state['trang_nhat_ky'] = trang + 1; st.rerun()
+    # Chỉ đọc toàn bộ khoảng đã lọc khi người dùng thật sự bấm tải
+    st.download_button(f"📥 Tải Nhật ký của {selected_user}", partial(xuat_csv_nhat_ky, LOG_DIR, nguoi_dung, tu, den),
+                       f"nhat_ky_{selected_user}.csv", "text/csv", on_click='ignore')
+
+# --- ĐO HIỆU NĂNG ---
+@st.cache_resource
+def lay_bo_do_hieu_nang():
+    """Kho số đo dùng chung cho mọi phiên, ghi theo lô ở luồng nền như nhật ký."""
+    return BoDoHieuNang(PERF_DIR)
+
+def do_hieu_nang(chuc_nang, chi_tiet=""):
+    """Đo một thao tác của phiên hiện tại (with do_hieu_nang(...): ...); chạy cả cProfile nếu phiên đã bật profiler."""
+    return lay_bo_do_hieu_nang().do(chuc_nang, st.session_state.get("username") or "", chi_tiet, ho_so=st.session_state.get('ho_so_hieu_nang', False))
+
+def hien_thi_hieu_nang():
+    """Phân vị độ trễ, số dòng và tỷ lệ trúng bộ đệm của từng chức năng, thao tác chậm, xu hướng và profiler theo phiên."""
+    st.markdown("### ⏱️ HIỆU NĂNG HỆ THỐNG")
+    bo_do = lay_bo_do_hieu_nang(); bo_do.xa()   # Ghi nốt các số đo đang chờ để thấy cả thao tác vừa làm
+
+    c1, c2, c3 = st.columns([2, 3, 1])
+    hom_nay = datetime.now().date()
+    khoang = c1.date_input("Khoảng thời gian:", (hom_nay - timedelta(days=7), hom_nay), format="DD/MM/YYYY", key="khoang_hieu_nang")
+    tu, den = (khoang[0], khoang[-1]) if khoang else (None, None)
+    df_do = doc_do_luong(PERF_DIR, tu, den)
+    chon = c2.multiselect("Chức năng:", sorted(df_do['chuc_nang'].unique()), placeholder="Tất cả chức năng")
+    nguong_ms = c3.number_input("Ngưỡng chậm (ms):", 10, 3_600_000, int(NGUONG_CHAM * 1000), step=250)
+    if chon: df_do = df_do[df_do['chuc_nang'].isin(chon)]
+
+    if df_do.empty: st.info("Chưa có số đo nào trong khoảng thời gian này.")
     else:
-        st.info("Chưa có nhật ký hoạt động nào.")
+        cham = truy_van_cham(df_do, nguong_ms / 1000)
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Số thao tác", f"{len(df_do):,}"); m2.metric("p95 chung", f"{df_do['giay'].quantile(0.95) * 1000:,.0f} ms")
+        m3.metric("Thao tác chậm", f"{(df_do['giay'] >= nguong_ms / 1000).sum():,}")
+        trung = df_do['trung_bo_dem'].mean(); m4.metric("Trúng bộ đệm", f"{trung:.0%}" if pd.notna(trung) else "-")
+        so = st.column_config.NumberColumn(format="%.0f"); so_le = st.column_config.NumberColumn(format="%.1f")
+        st.dataframe(tong_hop_hieu_nang(df_do), hide_index=True, use_container_width=True,
+                     column_config={**{c: so for c in ['p50 (ms)', 'p95 (ms)', 'p99 (ms)', 'Tối đa (ms)', 'Dòng quét TB', 'Dòng trả TB']},
+                                    'Trúng bộ đệm (%)': so_le, 'RSS tăng TB (MB)': so_le})
+
+        st.markdown("#### 📈 Xu hướng")
+        theo_gio = tu is not None and den is not None and (den - tu).days <= 2
+        chi_so = st.radio("Chỉ số", ['p95 (ms)', 'p50 (ms)', 'Số lượt'], horizontal=True, key="chi_so_xu_huong")
+        st.plotly_chart(px.line(xu_huong(df_do, theo_gio), x='Thời điểm', y=chi_so, color='Chức năng', markers=True), use_container_width=True)
+
+        st.markdown(f"#### 🐢 Thao tác chậm (≥ {nguong_ms:,} ms)")
+        if cham.empty: st.success("Không có thao tác nào vượt ngưỡng.")
+        else: st.dataframe(cham.rename(columns={'thoi_gian': 'Thời gian', 'chuc_nang': 'Chức năng', 'nguoi_dung': 'Người dùng', 'chi_tiet': 'Chi tiết',
+                                                'so_dong_quet': 'Dòng quét', 'so_dong_tra': 'Dòng trả', 'trung_bo_dem': 'Trúng bộ đệm', 'rss_tang_mb': 'RSS tăng (MB)', 'loi': 'Lỗi'}),
+                           hide_index=True, use_container_width=True)
+
+    with st.expander("🔬 Profiler theo phiên (cProfile)"):
+        # Giữ ở khóa riêng, không phải khóa của widget, để vẫn bật khi rời màn hình này
+        st.session_state['ho_so_hieu_nang'] = st.toggle("Bật cProfile cho các thao tác của tôi", value=st.session_state.get('ho_so_hieu_nang', False))
+        st.caption("Mỗi thao tác được đo sẽ chạy kèm cProfile (chậm hơn đáng kể); chỉ nên bật khi cần tìm nguyên nhân.")
+        for h in bo_do.cac_ho_so(st.session_state.get("username")):
+            with st.popover(f"{h['thoi_gian']} · {h['chuc_nang']} · {h['giay'] * 1000:,.0f} ms {h['chi_tiet']}"[:120]): st.code(h['bao_cao'], language=None)
+    hien_thi_thong_ke_bo_dem()
 
 # --- HÀM QUẢN LÝ USER ---
-def load_users():
-    if not os.path.exists(USER_DB_FILE):
-        hashed_pw = bcrypt.hashpw("12345".encode(), bcrypt.gensalt()).decode()
-        default_data = {
-            'usernames': {
-                'bhxh_admin': {
-                    'name': 'Admin Tổng',
-                    'email': 'admin@bhxh.vn',
-                    'password': hashed_pw,
-                    'role': 'admin'
-                }
-            }
-        }
-        with open(USER_DB_FILE, 'w') as f: json.dump(default_data, f)
-        return default_data
-    try:
-        with open(USER_DB_FILE, 'r') as f: return json.load(f)
-    except Exception: return {}
+@st.cache_resource
+def lay_kho_nguoi_dung():
+    """Kho tài khoản dùng chung: chỉ đọc lại users.json khi file đổi."""
+    return KhoNguoiDung(USER_DB_FILE)
 
-def save_users(config):
-    with open(USER_DB_FILE, 'w') as f: json.dump(config, f)
+def lay_bo_xac_thuc(kho):
+    """Dựng lại mỗi lần chạy: CookieManager chỉ đọc cookie lúc khởi tạo, giữ qua các lần chạy sẽ mất đăng nhập bằng cookie."""
+    return stauth.Authenticate(kho.ban_sao(), 'bhxh_cookie', 'key_bi_mat_rat_dai_va_kho_doan_123', 30, auto_hash=False)
 
 # --- GIAO DIỆN QUẢN TRỊ USER (ADMIN) ---
-def hien_thi_quan_ly_user(config):
+def hien_thi_quan_ly_user(kho):
+    config = kho.doc()
     st.markdown("### 👥 QUẢN TRỊ NGƯỜI DÙNG")
     
     tab1, tab2, tab3, tab4 = st.tabs(["➕ Thêm User", "🛠️ Reset Mật khẩu", "🔑 Đổi MK Thủ công", "❌ Xóa User"])
@@ -110,12 +162,14 @@ def hien_thi_quan_ly_user(config):
             
             if st.form_submit_button("Lưu tài khoản"):
                 if new_username and new_password and new_name:
-                    if new_username in config['usernames']:
+                    hashed_pw = kho.bam_mat_khau(new_password)
+                    def them(c):
+                        if new_username in c['usernames']: return False
+                        c['usernames'][new_username] = {'name': new_name, 'password': hashed_pw, 'role': new_role, 'email': ''}
+                        return True
+                    if not kho.cap_nhat(them):
                         st.error("❌ Tên đăng nhập này đã tồn tại!")
                     else:
-                        hashed_pw = bcrypt.hashpw(new_password.encode(), bcrypt.gensalt()).decode()
-                        config['usernames'][new_username] = {'name': new_name, 'password': hashed_pw, 'role': new_role, 'email': ''}
-                        save_users(config)
                         log_action(st.session_state["username"], "Thêm User", f"User: {new_username}")
                         st.success(f"✅ Đã tạo user: {new_username}")
                         st.rerun()
@@ -132,9 +186,8 @@ def hien_thi_quan_ly_user(config):
             st.write("")
             if st.button("🔄 Reset về 123456", type="primary"):
                 try:
-                    default_pw_hash = bcrypt.hashpw("123456".encode(), bcrypt.gensalt()).decode()
-                    config['usernames'][user_to_reset]['password'] = default_pw_hash
-                    save_users(config)
+                    default_pw_hash = kho.bam_mat_khau("123456")
+                    kho.cap_nhat(lambda c: c['usernames'][user_to_reset].update(password=default_pw_hash))
                     log_action(st.session_state["username"], "Reset MK", f"User: {user_to_reset}")
                     st.success(f"✅ Đã reset mật khẩu của **{user_to_reset}** thành **123456**")
                 except Exception as e: st.error(f"Lỗi: {e}")
@@ -152,9 +205,8 @@ def hien_thi_quan_ly_user(config):
             st.write("") 
             if st.button("💾 Cập nhật MK"):
                 if st.session_state.new_pass_change:
-                    new_hash = bcrypt.hashpw(st.session_state.new_pass_change.encode(), bcrypt.gensalt()).decode()
-                    config['usernames'][user_to_change]['password'] = new_hash
-                    save_users(config)
+                    new_hash = kho.bam_mat_khau(st.session_state.new_pass_change)
+                    kho.cap_nhat(lambda c: c['usernames'][user_to_change].update(password=new_hash))
                     log_action(st.session_state["username"], "Đổi MK thủ công", f"User: {user_to_change}")
                     st.success(f"✅ Đã đổi mật khẩu cho: {user_to_change}")
                 else: st.error("Chưa nhập mật khẩu.")
@@ -170,8 +222,7 @@ def hien_thi_quan_ly_user(config):
             user_to_delete = st.selectbox("Chọn tài khoản cần xóa:", list_users_to_delete, key="sel_del")
             if st.button("🗑️ Xác nhận xóa", type="primary"):
                 try:
-                    del config['usernames'][user_to_delete]
-                    save_users(config)
+                    kho.cap_nhat(lambda c: c['usernames'].pop(user_to_delete, None))
                     log_action(st.session_state["username"], "Xóa User", f"User: {user_to_delete}")
                     st.success(f"✅ Đã xóa tài khoản: {user_to_delete}")
                     st.rerun()
@@ -191,9 +242,10 @@ def hien_thi_quan_tri_admin(config):
     st.markdown("### ⚙️ TRUNG TÂM QUẢN TRỊ")
     
     st.markdown("#### Quản lý Người dùng")
-    col_u1, col_u2 = st.columns(2)
+    col_u1, col_u2, col_u3 = st.columns(3)
     col_u1.button("👥 QUẢN LÝ USER", on_click=set_state, args=('admin_user',))
     col_u2.button("📝 NHẬT KÝ", on_click=set_state, args=('admin_log',)) 
+    col_u3.button("⏱️ HIỆU NĂNG", on_click=set_state, args=('admin_perf',))
     
     st.markdown("#### Quản lý Dữ liệu")
     st.button("⚙️ CẬP NHẬT DATA", on_click=set_state, args=('admin_data',))
@@ -203,129 +255,283 @@ def hien_thi_quan_tri_admin(config):
     if st.session_state.get('admin_user'): hien_thi_quan_ly_user(config)
     elif st.session_state.get('admin_data'): hien_thi_quan_tri_data()
     elif st.session_state.get('admin_log'): hien_thi_nhat_ky_he_thong(config)
+    elif st.session_state.get('admin_perf'): hien_thi_hieu_nang()
     else: st.info("Chọn một chức năng quản trị bên trên.")
 
 # --- HÀM HỖ TRỢ & NẠP DỮ LIỆU (GIỮ NGUYÊN) ---
-def xoa_dau_tieng_viet(text):
-    if not isinstance(text, str): return str(text)
-    text = unicodedata.normalize('NFD', text)
-    text = re.sub(r'[\u0300-\u036f]', '', text)
-    text = text.lower().strip()
-    text = re.sub(r'\s+', ' ', text)
-    return text
-
 def set_state(name):
-    for key in ['search', 'loc', 'han', 'bieu', 'chuan', 'ai', 'admin_data', 'admin_user', 'admin_log', 'admin_panel']:
+    for key in ['search', 'loc', 'han', 'bieu', 'chuan', 'ai', 'admin_data', 'admin_user', 'admin_log', 'admin_perf', 'admin_panel']:
         st.session_state[key] = False
     st.session_state[name] = True
 
 def hien_thi_quan_tri_data():
     st.markdown("### ⚙️ CẬP NHẬT DỮ LIỆU HỆ THỐNG")
     uploaded_file = st.file_uploader("📂 Chọn file Excel dữ liệu (.xlsb)", type=['xlsb'])
+    che_do = st.radio("Chế độ cập nhật:", ["🔁 Tăng dần (so khớp theo soBhxh)", "♻️ Thay thế toàn bộ"], horizontal=True)
     if uploaded_file is not None:
         if st.button("🚀 CẬP NHẬT DỮ LIỆU"):
+            # Ghi ra file tạm trước: nếu file lỗi thì dữ liệu đang dùng không bị ảnh hưởng
+            os.makedirs(DATA_DIR, exist_ok=True)
+            file_tam, file_moi = file_tam_trong_kho(DATA_DIR, '.xlsb'), file_tam_trong_kho(DATA_DIR)
+            thanh_tien_do = st.progress(0.0, text="Đang đọc file...")
+
+            def bao_tien_do(so_dong, tong, toc_do):
+                ty_le = min(so_dong / tong, 1.0) if tong else 0.0
+                thanh_tien_do.progress(ty_le, text=f"Đã xử lý {so_dong:,}/{tong:,} dòng ({ty_le:.0%}) - {toc_do:,.0f} dòng/giây")
+
             try:
-                with st.spinner("Đang xử lý..."):
-                    with open(EXCEL_FILE, "wb") as f: f.write(uploaded_file.getbuffer())
-                    st.cache_data.clear()
-                    if os.path.exists(PARQUET_FILE): os.remove(PARQUET_FILE)
-                    nap_du_lieu_toi_uu()
-                    log_action(st.session_state["username"], "Cập nhật Data", f"File: {uploaded_file.name}")
-                st.success("✅ Cập nhật thành công!")
-            except Exception as e: st.error(f"Có lỗi xảy ra: {e}")
-
-def tao_phieu_word(row):
-    doc = Document()
-    heading = doc.add_heading('PHIẾU THÔNG TIN BHXH', 0); heading.alignment = 1
-    doc.add_paragraph(f'Ngày xuất phiếu: {datetime.now().strftime("%d/%m/%Y %H:%M")}')
-    doc.add_paragraph('--------------------------------------------------')
-    p = doc.add_paragraph(); run = p.add_run(f"HỌ VÀ TÊN: {row.get('hoTen', '').upper()}")
-    run.bold = True; run.font.size = Pt(14); run.font.color.rgb = RGBColor(0, 51, 102)
-    table = doc.add_table(rows=1, cols=2); table.style = 'Table Grid'
-    hdr_cells = table.rows[0].cells; hdr_cells[0].text = 'THÔNG TIN'; hdr_cells[1].text = 'CHI TIẾT'
-    for cot in COT_UU_TIEN:
-        row_cells = table.add_row().cells; row_cells[0].text = cot
-        val = row.get(cot, ''); row_cells[1].text = str(val) if pd.notna(val) else ""
-    doc.add_paragraph('\n'); doc.add_paragraph('Người trích xuất: Admin BHXH').alignment = 2
-    bio = BytesIO(); doc.save(bio); return bio
-
-def tao_file_excel(df_input):
-    output = BytesIO(); writer = pd.ExcelWriter(output, engine='xlsxwriter')
-    df_input.to_excel(writer, index=False, sheet_name='DanhSach')
-    writer.close(); return output
-
-@st.cache_data(ttl=3600)
-def nap_du_lieu_toi_uu():
-    if os.path.exists(PARQUET_FILE):
-        try:
-            df = pd.read_parquet(PARQUET_FILE)
-            cols_to_str = ['soBhxh', 'soCmnd', 'soDienThoai', 'ngaySinh', 'hanTheDen']
-            for col in cols_to_str:
-                if col in df.columns: df[col] = df[col].astype(str)
-            return df
-        except Exception: pass
-    if not os.path.exists(EXCEL_FILE): return pd.DataFrame()
-    try:
-        with st.spinner('⚙️ Đang tối ưu hóa dữ liệu...'):
-            df = pd.read_excel(EXCEL_FILE, dtype=str, engine='pyxlsb')
-            df.columns = df.columns.str.strip()
-            df.to_parquet(PARQUET_FILE)
+                with open(file_tam, "wb") as f: f.write(uploaded_file.getbuffer())
+                with do_hieu_nang('cap_nhat_du_lieu', uploaded_file.name):
+                    so_dong = chuyen_xlsb_sang_parquet(file_tam, file_moi, bao_tien_do=bao_tien_do); ghi_so_dong(quet=so_dong)
+                    with st.spinner("Đang so khớp và ghi phiên bản mới..."):
+                        if che_do.startswith("🔁"): tom_tat = cap_nhat_tang_dan(DATA_DIR, file_moi)
+                        else:
+                            manifest = ghi_ban_day_du(DATA_DIR, file_moi)
+                            tom_tat = {'che_do': 'toan_bo', 'them': so_dong, 'sua': 0, 'xoa': 0, 'phien_ban': manifest['phien_ban']}
+                    ghi_so_dong(tra=tom_tat['them'] + tom_tat['sua'])
+                os.replace(file_tam, EXCEL_FILE)
+                # Phiên bản mới đã được ghi nhận: các phiên khác tự chuyển sang ở lượt chạy kế tiếp
+                with st.spinner("Đang nạp dữ liệu mới..."):
+                    df_moi = nap_du_lieu_toi_uu(tom_tat['phien_ban'])
+                    if not df_moi.empty: lay_chi_muc_tim_kiem(tom_tat['phien_ban'], df_moi); lay_khoi_tong_hop(tom_tat['phien_ban'], df_moi); lay_bao_cao_chat_luong(tom_tat['phien_ban'], df_moi)
+                chi_tiet = f"{uploaded_file.name} -> {tom_tat['phien_ban']} ({tom_tat['che_do']}): +{tom_tat['them']} ~{tom_tat['sua']} -{tom_tat['xoa']}"
+                log_action(st.session_state["username"], "Cập nhật Data", chi_tiet)
+                st.success(f"✅ Cập nhật thành công phiên bản {tom_tat['phien_ban']}: thêm {tom_tat['them']:,}, sửa {tom_tat['sua']:,}, xóa {tom_tat['xoa']:,} hồ sơ.")
+            except Exception as e: st.error(f"Có lỗi xảy ra, dữ liệu cũ được giữ nguyên: {e}")
+            finally:
+                for f in (file_tam, file_moi):
+                    if os.path.exists(f): os.remove(f)
+    hien_thi_thong_ke_bo_dem()
+
+def hien_thi_thong_ke_bo_dem():
+    with st.expander("⚡ Bộ đệm kết quả truy vấn"):
+        tk = lay_bo_dem_ket_qua().thong_ke()
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Tỷ lệ trúng", f"{tk['ty_le_trung']:.0%}"); c2.metric("Trúng / trượt", f"{tk['trung']:,} / {tk['truot']:,}")
+        c3.metric("Số mục", f"{tk['so_muc']:,}"); c4.metric("Dung lượng", f"{tk['dung_luong'] / 2**20:.1f} / {tk['dung_luong_toi_da'] / 2**20:.0f} MB")
+        st.caption(f"Phiên bản: {', '.join(tk['phien_ban']) or '-'} · bỏ do đầy: {tk['bo_do_day']:,} · bỏ do quá hạn: {tk['bo_do_cu']:,} · bỏ phiên bản cũ: {tk['vo_hieu']:,}")
+        if tk['theo_loai']:
+            st.dataframe(pd.DataFrame([{'Loại truy vấn': loai, 'Trúng': d['trung'], 'Trượt': d['truot'], 'Số mục': d['so_muc']} for loai, d in tk['theo_loai'].items()]), hide_index=True)
+        if st.button("🧹 Xóa bộ đệm"): lay_bo_dem_ket_qua().xoa(); st.rerun()
+
+@st.cache_resource(max_entries=2)
+def nap_du_lieu_toi_uu(phien_ban):
+    """Phiên bản dữ liệu hiện hành, ánh xạ bộ nhớ và dùng chung một đối tượng cho mọi phiên.
+
+    Mở đúng phien_ban (khóa cache) nên khi kho lên phiên bản mới, các phiên tự chuyển sang bản mới mà
+    không có bản mới nào bị cache nhầm dưới mã cũ. Lỗi được ném ra ngoài (không cache) để lượt sau thử lại.
+    DataFrame trả về là dùng chung nên chỉ được đọc, muốn sửa phải .copy() trước.
+    """
+    if not phien_ban: return pd.DataFrame()
+    with do_hieu_nang('nap_du_lieu', phien_ban):
+        df = mo_ban_chia_se(DATA_DIR, phien_ban)[1]; ghi_so_dong(quet=len(df), tra=len(df))
         return df
-    except Exception as e: return pd.DataFrame()
-
-def hien_thi_uu_tien(df_ket_qua):
-    if df_ket_qua.empty: st.warning("😞 Không tìm thấy kết quả phù hợp."); return
-    st.success(f"✅ Tìm thấy {len(df_ket_qua)} hồ sơ!"); excel_data = tao_file_excel(df_ket_qua)
-    st.download_button(label="📥 Tải danh sách (Excel)", data=excel_data.getvalue(), file_name=f"danh_sach.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-    if len(df_ket_qua) > 50: st.caption(f"⚠️ Đang hiển thị 50/{len(df_ket_qua)} kết quả đầu tiên."); df_ket_qua = df_ket_qua.head(50)
-    for i in range(min(len(df_ket_qua), 50)):
-        row = df_ket_qua.iloc[i]; tieu_de = f"👤 {row.get('hoTen', 'Na')} - {row.get('soBhxh', '')}"
+
+def phien_ban_du_lieu():
+    """Mã phiên bản hiện hành của kho. Lần chạy đầu sẽ tạo kho từ cache hoặc file Excel cũ."""
+    ma = phien_ban(DATA_DIR)
+    if not ma and (os.path.exists(PARQUET_FILE) or os.path.exists(EXCEL_FILE)):
+        try:
+            with st.spinner('⚙️ Đang tối ưu hóa dữ liệu...'), do_hieu_nang('khoi_tao_kho'): khoi_tao_kho(DATA_DIR, PARQUET_FILE, EXCEL_FILE)
+        except Exception: return ""
+        ma = phien_ban(DATA_DIR)
+    return ma
+
+@st.cache_resource(show_spinner='🔎 Đang dựng chỉ mục tìm kiếm...', max_entries=2)
+def lay_chi_muc_tim_kiem(phien_ban, _df):
+    """Dựng chỉ mục một lần cho mỗi phiên bản dữ liệu, dùng chung cho mọi phiên đăng nhập."""
+    with do_hieu_nang('dung_chi_muc', phien_ban): ghi_so_dong(quet=len(_df)); return dung_chi_muc(_df)
+
+@st.cache_resource(show_spinner='📊 Đang tổng hợp số liệu...', max_entries=2)
+def lay_khoi_tong_hop(phien_ban, _df):
+    """Số liệu tổng hợp cho biểu đồ, dựng một lần cho mỗi phiên bản dữ liệu."""
+    with do_hieu_nang('dung_tong_hop', phien_ban): ghi_so_dong(quet=len(_df)); return dung_khoi_tong_hop(_df)
+
+@st.cache_resource(show_spinner='🩺 Đang kiểm tra chất lượng dữ liệu...', max_entries=2)
+def lay_bao_cao_chat_luong(phien_ban, _df):
+    """Báo cáo chất lượng toàn bộ cột, tính một lần cho mỗi phiên bản dữ liệu."""
+    with do_hieu_nang('dung_chat_luong', phien_ban): ghi_so_dong(quet=len(_df)); return dung_bao_cao_chat_luong(_df)
+
+@st.cache_resource
+def lay_bo_dem_ket_qua():
+    """Bộ đệm kết quả truy vấn dùng chung, giữ kết quả của các phiên bản dữ liệu đang được dùng."""
+    return BoDemKetQua()
+
+def tinh_co_dem(df, loai, truy_van, tinh):
+    """Lấy kết quả từ bộ đệm theo (phiên bản dữ liệu, loại, truy vấn đã chuẩn hóa), chưa có thì tính.
+
+    Trúng / trượt được ghi vào phép đo đang mở; khi phải tính, số dòng quét tính là toàn bộ dữ liệu
+    đang nạp (cận trên khi tra bằng chỉ mục).
+    """
+    da_tinh = []
+    ket_qua = lay_bo_dem_ket_qua().lay(df.attrs.get('phien_ban', ''), loai, truy_van, lambda: da_tinh.append(True) or tinh())
+    ghi_so_dong(quet=len(df) if da_tinh else None, trung_bo_dem=not da_tinh)
+    return ket_qua
+
+@st.cache_resource
+def lay_quan_ly_xuat_file():
+    """Hàng đợi xuất file nền, dùng chung cho mọi phiên."""
+    return QuanLyXuatFile(DATA_DIR, EXPORT_DIR, bo_do=lay_bo_do_hieu_nang())
+
+@st.fragment(run_every=1)
+def cho_xuat_file(ql, phien_ban, vi_tri, dinh_dang, cac_cot):
+    """Chỉ phần này chạy lại mỗi giây cho tới khi file nền tạo xong, rồi chạy lại cả trang để hiện nút tải."""
+    trang_thai, tien_do = ql.trang_thai(phien_ban, vi_tri, dinh_dang, cac_cot)
+    if trang_thai != 'dang_chay': st.rerun()
+    if tien_do: st.progress(tien_do[0] / max(tien_do[1], 1), text=f"⏳ Đang tạo {tien_do[0]:,}/{tien_do[1]:,}...")
+    else: st.caption("⏳ Đang tạo file ở chế độ nền, bạn vẫn có thể tiếp tục thao tác...")
+
+def nut_tai_file(df_chon, nhan, ten_file, dinh_dang='xlsx', cac_cot=None, key=None, nguong=NGUONG_XUAT_NGAY, vi_tri=None):
+    """Nút tải file chỉ tạo khi được yêu cầu (df_chon là lát cắt của dữ liệu đang nạp,
+    hoặc chính dữ liệu đang nạp kèm vi_tri để khỏi phải cắt ra nhiều dòng).
+
+    File nhỏ hoặc đã có sẵn: tạo / lấy ra ngay lúc bấm tải. File lớn: bấm để xếp việc chạy nền,
+    nút tải hiện ra khi xong.
+    """
+    ql = lay_quan_ly_xuat_file(); phien_ban = df_chon.attrs.get('phien_ban', '')
+    vi_tri = df_chon.index.to_numpy() if vi_tri is None else vi_tri; key = key or f"xuat_{ten_file}"
+    trang_thai, chi_tiet = ql.trang_thai(phien_ban, vi_tri, dinh_dang, cac_cot)
+    if trang_thai == 'xong' or (trang_thai == 'chua_co' and len(vi_tri) <= nguong):
+        st.download_button(nhan, data=partial(ql.cho_ket_qua, phien_ban, vi_tri, dinh_dang, cac_cot), file_name=ten_file, mime=DINH_DANG[dinh_dang][1], key=key, on_click='ignore')
+        thong_ke = ql.thong_ke(phien_ban, vi_tri, dinh_dang, cac_cot)
+        if thong_ke: st.caption(f"⚡ {thong_ke['so_phieu']:,} phiếu trong {thong_ke['giay']:.1f}s ({thong_ke['phieu_moi_giay']:,.0f} phiếu/giây)")
+    elif trang_thai == 'dang_chay': cho_xuat_file(ql, phien_ban, vi_tri, dinh_dang, cac_cot)
+    else:
+        if trang_thai == 'loi': st.error(f"Tạo file thất bại: {chi_tiet}")
+        st.button(f"⚙️ Chuẩn bị: {nhan} ({len(vi_tri):,} dòng)", key=key, on_click=ql.gui, args=(phien_ban, vi_tri, dinh_dang, cac_cot))
+
+def _doi_trang(khoa, buoc, so_trang):
+    st.session_state[khoa] = min(max(st.session_state.get(khoa, 1) + buoc, 1), so_trang)
+
+def chon_trang(con_tro, khoa):
+    """Thanh chuyển trang của một con trỏ kết quả; quay về trang 1 khi kết quả đổi. Trả về (trang, chỗ ghi thời gian)."""
+    k = f"trang_{khoa}"
+    if st.session_state.get(f"con_tro_{khoa}") != con_tro.ma: st.session_state[f"con_tro_{khoa}"] = con_tro.ma; st.session_state[k] = 1
+    so_trang = con_tro.so_trang; trang = min(max(st.session_state.get(k, 1), 1), so_trang)
+    c1, c2, c3, c4 = st.columns([1, 2, 1, 6])
+    if so_trang > 1:
+        c1.button("◀", key=f"lui_{khoa}", on_click=_doi_trang, args=(k, -1, so_trang), disabled=trang <= 1)
+        c2.number_input("Trang", 1, so_trang, key=k, label_visibility="collapsed")
+        c3.button("▶", key=f"toi_{khoa}", on_click=_doi_trang, args=(k, 1, so_trang), disabled=trang >= so_trang)
+    return trang, c4.empty()
+
+def _ghi_thoi_gian(cho_ghi, con_tro, trang, bat_dau):
+    dau, cuoi = con_tro.khoang(trang)
+    cho_ghi.caption(f"Dòng {dau + 1:,}–{cuoi:,} / {len(con_tro):,} · trang {trang:,}/{con_tro.so_trang:,} · ⏱️ {(time.perf_counter() - bat_dau) * 1000:.0f} ms")
+
+@st.fragment
+def trang_ket_qua(con_tro, khoa):
+    """Chỉ phần này chạy lại khi chuyển trang: cắt và định dạng đúng các hồ sơ đang xem."""
+    bat_dau = time.perf_counter(); trang, cho_ghi = chon_trang(con_tro, khoa)
+    df_trang = con_tro.trang(trang); dau = con_tro.khoang(trang)[0]
+    anh_xa = anh_xa_cot(tuple(df_trang.columns), tuple(COT_UU_TIEN))
+    for i in range(len(df_trang)):
+        row = df_trang.iloc[i]; tieu_de = f"👤 {row.get('hoTen', 'Na')} - {row.get('soBhxh', '')}"
         with st.expander(tieu_de, expanded=False):
             c1, c2 = st.columns([3, 1]); 
             with c1:
-                col_a, col_b = st.columns(2);
-                for idx, cot in enumerate(COT_UU_TIEN):
-                    val = "(Trống)"; 
-                    for c_ex in df_ket_qua.columns:
-                         if cot.lower() == c_ex.lower():
-                             v = row[c_ex]; val = str(v) if pd.notna(v) and str(v).strip() != "" and str(v).lower() != "nan" else "(Trống)"; break
-                    if idx % 2 == 0: col_a.markdown(f"**🔹 {cot}:** {val}")
-                    else: col_b.markdown(f"**🔹 {cot}:** {val}")
-            with c2: w_data = tao_phieu_word(row); st.download_button(label="📄 In Phiếu", data=w_data.getvalue(), file_name=f"Phieu_{row.get('soBhxh', 'hs')}.docx", mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document", key=f"btn_word_{i}")
-            st.dataframe(row.to_frame().T, hide_index=True)
-
-def hien_thi_loc_loi(df, ten_cot):
-    log_action(st.session_state["username"], "Lọc Lỗi", f"Cột: {ten_cot}"); col_chuan = df[ten_cot].astype(str).str.strip().str.lower(); rong = ['nan', 'none', 'null', '', '0']; df_loc = df[col_chuan.isin(rong)]
-    if not df_loc.empty:
-        st.warning(f"⚠️ {len(df_loc)} hồ sơ thiếu '{ten_cot}'."); excel_data = tao_file_excel(df_loc)
-        st.download_button(label="📥 Tải danh sách lỗi", data=excel_data.getvalue(), file_name=f"loi_{ten_cot}.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"); st.dataframe(df_loc.head(1000))
-    else: st.success(f"Tuyệt vời! Cột '{ten_cot}' đủ dữ liệu.")
-
-def hien_thi_kiem_tra_han(df, ten_cot_ngay):
-    log_action(st.session_state["username"], "Kiểm tra hạn", ten_cot_ngay); df_temp = df[[ten_cot_ngay, 'hoTen', 'soBhxh']].copy()
+                dong_hien_thi = []
+                for cot, c_ex in anh_xa:
+                    v = row[c_ex] if c_ex is not None else None
+                    val = str(v) if pd.notna(v) and str(v).strip() != "" and str(v).lower() != "nan" else "(Trống)"
+                    dong_hien_thi.append(f"**🔹 {cot}:** {val}")
+                col_a, col_b = st.columns(2); col_a.markdown("  \n".join(dong_hien_thi[0::2])); col_b.markdown("  \n".join(dong_hien_thi[1::2]))   # Một khối chữ mỗi cột thay vì một phần tử mỗi trường
+            with c2: nut_tai_file(df_trang.iloc[[i]], "📄 In Phiếu", f"Phieu_{row.get('soBhxh', 'hs')}.docx", 'docx', COT_UU_TIEN, key=f"btn_word_{khoa}_{dau + i}")
+    st.dataframe(df_trang, hide_index=True)   # Đủ các cột của cả trang trong một bảng
+    _ghi_thoi_gian(cho_ghi, con_tro, trang, bat_dau)
+
+@st.fragment
+def bang_phan_trang(con_tro, khoa, cac_cot=None):
+    """Bảng kết quả lớn: chỉ gửi trang đang xem lên trình duyệt."""
+    bat_dau = time.perf_counter(); trang, cho_ghi = chon_trang(con_tro, khoa)
+    st.dataframe(con_tro.trang(trang, cac_cot), hide_index=True)
+    _ghi_thoi_gian(cho_ghi, con_tro, trang, bat_dau)
+
+def hien_thi_uu_tien(df, vi_tri, khoa="ket_qua"):
+    """Kết quả tìm kiếm: vi_tri là vị trí dòng trên dữ liệu đang nạp, chỉ trang đang xem được cắt ra."""
+    if not len(vi_tri): st.warning("😞 Không tìm thấy kết quả phù hợp."); return
+    st.success(f"✅ Tìm thấy {len(vi_tri)} hồ sơ!"); nut_tai_file(df, "📥 Tải danh sách (Excel)", "danh_sach.xlsx", vi_tri=vi_tri)
+    with st.expander(f"🖨️ In phiếu hàng loạt ({len(vi_tri):,} hồ sơ)"):
+        gop = st.radio("Định dạng", ["📦 ZIP (mỗi người một file)", "📄 Một file Word gộp"], horizontal=True, key="kieu_phieu_hang_loat") != "📦 ZIP (mỗi người một file)"
+        nut_tai_file(df, "🖨️ Tải phiếu", "phieu_bhxh.docx" if gop else "phieu_bhxh.zip", 'docx_gop' if gop else 'zip', COT_UU_TIEN, key="phieu_hang_loat", nguong=NGUONG_PHIEU_NGAY, vi_tri=vi_tri)
+    trang_ket_qua(ConTroKetQua(df, vi_tri), khoa)
+
+def hien_thi_loc_loi(df, ten_cot, bao_cao):
+    log_action(st.session_state["username"], "Lọc Lỗi", f"Cột: {ten_cot}")
+    with st.expander("🩺 Báo cáo chất lượng toàn bộ dữ liệu"):
+        bang = bao_cao.bang_tong_hop()
+        st.dataframe(bang[bang['Số dòng'] > 0] if st.toggle("Chỉ hiện luật có vi phạm", value=True) else bang, hide_index=True,
+                     column_config={'Tỷ lệ (%)': st.column_config.NumberColumn(format="%.2f")})
+    cac_luat = [loai for _, loai in bao_cao.cac_luat(ten_cot)]
+    loai = st.radio("Luật kiểm tra", cac_luat, format_func=lambda l: f"{MO_TA_LUAT[l]} ({bao_cao.dem(ten_cot, l):,})", horizontal=True, key=f"luat_{ten_cot}") if len(cac_luat) > 1 else 'thieu'
+    vi_tri = bao_cao.vi_tri(ten_cot, loai)   # Giải nén bitmap tính sẵn, không quét lại cột
+    ghi_so_dong(tra=len(vi_tri))
+    if len(vi_tri):
+        st.warning(f"⚠️ {len(vi_tri)} hồ sơ thiếu '{ten_cot}'." if loai == 'thieu' else f"⚠️ {len(vi_tri)} hồ sơ vi phạm '{MO_TA_LUAT[loai]}' ở cột '{ten_cot}'."); c1, c2 = st.columns(2)
+        with c1: nut_tai_file(df, "📥 Tải danh sách lỗi", f"loi_{ten_cot}_{loai}.xlsx", vi_tri=vi_tri)
+        with c2: nut_tai_file(df, "📥 Tải CSV", f"loi_{ten_cot}_{loai}.csv", 'csv', vi_tri=vi_tri)
+        bang_phan_trang(ConTroKetQua(df, vi_tri, SO_DONG_MOI_TRANG_BANG), f"loi_{ten_cot}_{loai}")
+    elif loai == 'thieu': st.success(f"Tuyệt vời! Cột '{ten_cot}' đủ dữ liệu.")
+    else: st.success(f"Không có hồ sơ nào vi phạm '{MO_TA_LUAT[loai]}' ở cột '{ten_cot}'.")
+
+def hien_thi_kiem_tra_han(df, ten_cot_ngay, chi_muc=None):
+    log_action(st.session_state["username"], "Kiểm tra hạn", ten_cot_ngay)
+    if chi_muc is not None and ten_cot_ngay in chi_muc.ngay: hien_thi_han_theo_chi_muc(df, ten_cot_ngay, chi_muc); return
+    df_temp = df[[ten_cot_ngay, 'hoTen', 'soBhxh']].copy()
     try:
         df_temp[ten_cot_ngay] = pd.to_datetime(df_temp[ten_cot_ngay], dayfirst=True, errors='coerce'); df_co = df_temp.dropna(subset=[ten_cot_ngay])
         hom_nay = datetime.now(); sau_30 = hom_nay + timedelta(days=30); ds_het = df_co[df_co[ten_cot_ngay] < hom_nay].copy()
         ds_sap = df_co[(df_co[ten_cot_ngay] >= hom_nay) & (df_co[ten_cot_ngay] <= sau_30)].copy()
         if not ds_het.empty: ds_het[ten_cot_ngay] = ds_het[ten_cot_ngay].dt.strftime('%d/%m/%Y')
         if not ds_sap.empty: ds_sap[ten_cot_ngay] = ds_sap[ten_cot_ngay].dt.strftime('%d/%m/%Y')
+        ghi_so_dong(quet=len(df), tra=len(ds_het) + len(ds_sap))
         c1, c2 = st.columns(2); c1.metric("🔴 ĐÃ HẾT HẠN", f"{len(ds_het)}"); c2.metric("⚠️ SẮP HẾT HẠN", f"{len(ds_sap)}")
         if not ds_het.empty:
-            st.subheader("🔴 Danh sách Hết Hạn"); excel_het = tao_file_excel(ds_het); st.download_button("📥 Tải Hết Hạn", excel_het.getvalue(), "het_han.xlsx"); st.dataframe(ds_het.head(500), hide_index=True)
+            st.subheader("🔴 Danh sách Hết Hạn"); nut_tai_file(ds_het, "📥 Tải Hết Hạn", "het_han.xlsx", cac_cot=list(ds_het.columns)); bang_phan_trang(ConTroKetQua(ds_het, None, SO_DONG_MOI_TRANG_BANG), "het_han")
         if not ds_sap.empty:
-            st.subheader("⚠️ Danh sách Sắp Hết"); excel_sap = tao_file_excel(ds_sap); st.download_button("📥 Tải Sắp Hết", excel_sap.getvalue(), "sap_het.xlsx"); st.dataframe(ds_sap.head(500), hide_index=True)
+            st.subheader("⚠️ Danh sách Sắp Hết"); nut_tai_file(ds_sap, "📥 Tải Sắp Hết", "sap_het.xlsx", cac_cot=list(ds_sap.columns)); bang_phan_trang(ConTroKetQua(ds_sap, None, SO_DONG_MOI_TRANG_BANG), "sap_het")
     except Exception as e: st.error(f"Lỗi ngày tháng: {e}")
 
-def hien_thi_bieu_do_tuong_tac(df, ten_cot):
+def hien_thi_han_theo_chi_muc(df, ten_cot_ngay, chi_muc):
+    """Cột ngày đã có chỉ mục: số liệu đếm sẵn, danh sách lấy bằng tìm kiếm nhị phân, không quét lại cột."""
+    hom_nay = pd.Timestamp.now().normalize(); dem = chi_muc.dem_han(ten_cot_ngay, hom_nay, CAC_MOC_HAN)
+    so_ngay = st.radio("Cửa sổ sắp hết hạn", CAC_MOC_HAN, index=CAC_MOC_HAN.index(30) if 30 in CAC_MOC_HAN else 0, horizontal=True, format_func=lambda n: f"{n} ngày", key="cua_so_han")
+    c1, c2 = st.columns(2); c1.metric("🔴 ĐÃ HẾT HẠN", f"{dem['het']}"); c2.metric(f"⚠️ SẮP HẾT HẠN ({so_ngay} ngày)", f"{dem[so_ngay]}")
+    st.caption(" · ".join(f"{n} ngày: **{dem[n]:,}**" for n in CAC_MOC_HAN))
+    cot_xem = [c for c in [ten_cot_ngay, 'hoTen', 'soBhxh'] if c in df.columns]
+    ds_het, ds_sap = tinh_co_dem(df, 'kiem_tra_han', (ten_cot_ngay, hom_nay, so_ngay), lambda: (
+        chi_muc.khoang_ngay(ten_cot_ngay, den=hom_nay)[::-1],   # Mới hết hạn lên đầu
+        chi_muc.khoang_ngay(ten_cot_ngay, hom_nay + pd.Timedelta(days=1), hom_nay + pd.Timedelta(days=so_ngay))))
+    ghi_so_dong(tra=len(ds_het) + len(ds_sap))
+    for vi_tri, tieu_de, nhan, ten_file in [(ds_het, "🔴 Danh sách Hết Hạn", "📥 Tải Hết Hạn", "het_han.xlsx"), (ds_sap, "⚠️ Danh sách Sắp Hết", "📥 Tải Sắp Hết", "sap_het.xlsx")]:
+        if not len(vi_tri): continue
+        st.subheader(tieu_de); nut_tai_file(df, nhan, ten_file, cac_cot=cot_xem, key=f"xuat_{ten_file}", vi_tri=vi_tri)
+        bang_phan_trang(ConTroKetQua(df, vi_tri, SO_DONG_MOI_TRANG_BANG), ten_file.split('.')[0], cot_xem)
+
+def hien_thi_bieu_do_tuong_tac(df, ten_cot, khoi):
     log_action(st.session_state["username"], "Xem Biểu Đồ", ten_cot); st.markdown(f"### 📊 BIỂU ĐỒ TƯƠNG TÁC: {ten_cot}")
-    thong_ke = df[ten_cot].value_counts().reset_index(); thong_ke.columns = ['Phân loại', 'Số lượng'] 
-    fig = px.bar(thong_ke, x='Phân loại', y='Số lượng', text='Số lượng', color='Phân loại')
+    tach = None
+    if khoi.co_the_cheo(ten_cot):
+        lua_chon = st.selectbox("Phân tách theo", ['(Không)'] + [c for c in khoi.cot_cheo() if c != ten_cot], key=f"tach_{ten_cot}")
+        if lua_chon != '(Không)': tach = lua_chon
+    if tach is None:
+        thong_ke = khoi.dem(ten_cot)
+        fig = px.bar(thong_ke, x='Phân loại', y='Số lượng', text='Số lượng', color='Phân loại')
+    else:
+        thong_ke = khoi.bang_cheo(ten_cot, tach)
+        fig = px.bar(thong_ke, x='Phân loại', y='Số lượng', color='Phân tách', custom_data=['Phân tách'], labels={'Phân tách': tach})
+    fig.update_xaxes(type='category')   # Mã tỉnh là chuỗi số, không để Plotly hiểu thành trục số
     event = st.plotly_chart(fig, use_container_width=True, on_select="rerun")
     if event and event['selection']['points']:
-        gia_tri_chon = event['selection']['points'][0]['x']; st.divider(); st.info(f"🔍 Bạn vừa chọn: **{gia_tri_chon}**.")
-        log_action(st.session_state["username"], "Click Biểu Đồ", f"Xem chi tiết: {gia_tri_chon}"); hien_thi_uu_tien(df[df[ten_cot] == gia_tri_chon])
-
-def hien_thi_chatbot_thong_minh(df):
+        diem = event['selection']['points'][0]; gia_tri_chon = diem['x']
+        if tach is not None and diem.get('customdata'):
+            gia_tri_tach = diem['customdata'][0]; vi_tri = khoi.vi_tri_o(ten_cot, gia_tri_chon, tach, gia_tri_tach)
+            gia_tri_chon = f"{gia_tri_chon} / {gia_tri_tach}"
+        else: vi_tri = khoi.vi_tri(ten_cot, gia_tri_chon)
+        st.divider(); st.info(f"🔍 Bạn vừa chọn: **{gia_tri_chon}**."); ghi_so_dong(tra=len(vi_tri))
+        log_action(st.session_state["username"], "Click Biểu Đồ", f"Xem chi tiết: {gia_tri_chon}"); hien_thi_uu_tien(df, vi_tri)
+
+def hien_thi_chatbot_thong_minh(df, chi_muc, khoi):
     log_action(st.session_state["username"], "Xem Chatbot", ""); st.markdown("### 🤖 TRỢ LÝ ẢO (Tìm Kiếm Linh Hoạt)")
     if "messages" not in st.session_state: st.session_state.messages = []
     
@@ -337,71 +543,36 @@ def hien_thi_chatbot_thong_minh(df):
         st.session_state.messages.append({"role": "user", "content": prompt})
         with st.chat_message("user"): st.markdown(prompt) 
         log_action(st.session_state["username"], "Chat AI", prompt)
-        
-        with st.chat_message("assistant"):
-            df_res = df.copy()
-            df_res['hoTen_khongdau'] = df_res['hoTen'].apply(lambda x: xoa_dau_tieng_viet(str(x)))
-            prompt_khong_dau = xoa_dau_tieng_viet(prompt)
-            filters = [] 
-            
+        st.session_state['cau_hoi_tro_ly'] = prompt
+    
+    # Vẽ lại kết quả của câu hỏi cuối ở mọi lần chạy: nút "Chuẩn bị" hay chọn định dạng phiếu chạy lại cả trang
+    if prompt := st.session_state.get('cau_hoi_tro_ly'):
+        with st.chat_message("assistant"), do_hieu_nang('tro_ly_ao', prompt):
             try:
-                # 1. TÌM NGÀY THÁNG
-                date_m = re.search(r'\d{1,2}[/-]\d{1,2}[/-]\d{4}', prompt)
-                if date_m:
-                    ngay_raw = date_m.group().replace('-', '/')
-                    try:
-                        nd = pd.to_datetime(ngay_raw, dayfirst=True).strftime('%d/%m/%Y')
-                        mask_date = df_res['ngaySinh'].astype(str).str.contains(nd)
-                        df_res = df_res[mask_date]
-                        filters.append(f"Ngày sinh: **{nd}**")
-                        prompt_khong_dau = prompt_khong_dau.replace(xoa_dau_tieng_viet(ngay_raw), "")
-                    except: pass
-                
-                # 2. TÌM MÃ SỐ
-                nums = re.findall(r'\b\d{5,}\b', prompt)
-                for n in nums:
-                    if date_m and n in date_m.group(): continue
-                    mask_so = (df_res['soBhxh'].astype(str).str.contains(n)) | (df_res['soCmnd'].astype(str).str.contains(n))
-                    df_res = df_res[mask_so]
-                    filters.append(f"Mã số: **{n}**")
-                    prompt_khong_dau = prompt_khong_dau.replace(n, "")
-                
-                # 3. TÌM TÊN (SỬA LỖI CÚ PHÁP TẠI ĐÂY)
-                tu_rac = ["tim", "loc", "cho", "toi", "nguoi", "co", "ngay", "sinh", "ten", "la", "o", "que"]
-                
-                p_clean = xoa_dau_tieng_viet(prompt) # Khởi tạo p_clean trước
-                
-                for w in tu_rac: 
-                    p_clean = re.sub(r'\b' + w + r'\b', ' ', p_clean) # Đã sửa lỗi cú pháp dòng 360
-
-                p_clean = re.sub(r'\b(bieu do|thong ke|han|het han)\b', ' ', p_clean)
-                ten = re.sub(r'\s+', ' ', p_clean).strip()
-                
-                if len(ten) > 1:
-                    df_res = df_res[df_res['hoTen_khongdau'].str.contains(ten)]
-                    filters.append(f"Tên chứa: **{ten}**")
+                # Khóa là câu hỏi bỏ dấu, chữ thường, gộp khoảng trắng: kết quả lọc không phụ thuộc các khác biệt đó
+                vi_tri, filters = tinh_co_dem(df, 'tro_ly_ao', xoa_dau_tieng_viet(prompt), lambda: loc_theo_cau_hoi(df, chi_muc, prompt))
+                ghi_so_dong(tra=len(vi_tri))
                 
                 # 4. TỔNG HỢP
                 if "bieu do" in xoa_dau_tieng_viet(prompt):
                     cot_ve = 'gioiTinh'
                     if "tinh" in xoa_dau_tieng_viet(prompt): cot_ve = 'maTinh'
                     st.write(f"📈 Đang vẽ biểu đồ: {cot_ve}")
-                    hien_thi_bieu_do_tuong_tac(df, cot_ve)
+                    hien_thi_bieu_do_tuong_tac(df, cot_ve, khoi)
                 elif "han" in xoa_dau_tieng_viet(prompt) and "het" in xoa_dau_tieng_viet(prompt):
                     st.write("⏳ Kiểm tra hạn BHYT...")
-                    hien_thi_kiem_tra_han(df, 'hanTheDen')
+                    hien_thi_kiem_tra_han(df, 'hanTheDen', chi_muc)
                 elif filters:
                     st.write(f"🔍 Điều kiện: {' + '.join(filters)}")
-                    if not df_res.empty:
-                        if 'hoTen_khongdau' in df_res.columns: df_res = df_res.drop(columns=['hoTen_khongdau'])
-                        hien_thi_uu_tien(df_res)
+                    if len(vi_tri): hien_thi_uu_tien(df, vi_tri)
                     else: st.warning("Không tìm thấy ai.")
                 else: st.info("🤖 Hãy nhập tên hoặc ngày sinh để tìm kiếm.")
             except Exception as e: st.error(f"Lỗi xử lý: {e}")
 # --- MAIN ---
 def main():
-    user_config = load_users()
-    authenticator = stauth.Authenticate(user_config, 'bhxh_cookie', 'key_bi_mat_rat_dai_va_kho_doan_123', 30)
+    kho_nguoi_dung = lay_kho_nguoi_dung()
+    authenticator = lay_bo_xac_thuc(kho_nguoi_dung)
+    user_config = kho_nguoi_dung.doc()
     
     # FIX LỖI: Chỉ gọi login, không lấy giá trị trả về
     authenticator.login(location='main') 
@@ -424,7 +595,13 @@ def main():
             st.markdown("---")
         
         st.title("🌐 HỆ THỐNG QUẢN LÝ BHXH")
-        df = nap_du_lieu_toi_uu() 
+        ma_phien_ban = phien_ban_du_lieu()
+        try:
+            try: df = nap_du_lieu_toi_uu(ma_phien_ban)
+            except LookupError:   # Kho vừa lên phiên bản mới và đã dọn bản vừa đọc mã: lấy lại mã
+                ma_phien_ban = phien_ban_du_lieu(); df = nap_du_lieu_toi_uu(ma_phien_ban)
+        except Exception as e:
+            st.error(f"Không nạp được dữ liệu: {e}"); df = pd.DataFrame()
         
         if df.empty:
             st.warning("⚠️ Chưa có dữ liệu.")
@@ -432,9 +609,10 @@ def main():
                 st.sidebar.button("⚙️ QUẢN TRỊ DATA", on_click=set_state, args=('admin_data',))
                 if st.session_state.get('admin_data'): hien_thi_quan_tri_data()
             return
+        chi_muc = lay_chi_muc_tim_kiem(ma_phien_ban, df); khoi = lay_khoi_tong_hop(ma_phien_ban, df)
 
         st.sidebar.header("CHỨC NĂNG")
-        cols = df.columns.tolist()
+        cols = [c for c in df.columns if not la_cot_phu(c)]
         idx_sobhxh = cols.index('soBhxh') if 'soBhxh' in cols else 0
         ten_cot = st.sidebar.selectbox("Cột xử lý:", options=cols, index=idx_sobhxh)
         tim_kiem = st.sidebar.text_input("Tìm kiếm nhanh:", placeholder="Nhập tên...")
@@ -453,29 +631,35 @@ def main():
             st.sidebar.markdown("---")
             st.sidebar.caption("QUẢN TRỊ HỆ THỐNG")
             st.sidebar.button("📝 NHẬT KÝ", on_click=set_state, args=('admin_log',)) 
+            st.sidebar.button("⏱️ HIỆU NĂNG", on_click=set_state, args=('admin_perf',))
             st.sidebar.button("⚙️ CẬP NHẬT DATA", on_click=set_state, args=('admin_data',))
             st.sidebar.button("👥 QUẢN LÝ USER", on_click=set_state, args=('admin_user',))
 
         st.markdown("---")
-        for key in ['search', 'loc', 'han', 'bieu', 'ai', 'admin_data', 'admin_user', 'admin_log']:
+        for key in ['search', 'loc', 'han', 'bieu', 'ai', 'admin_data', 'admin_user', 'admin_log', 'admin_perf']:
             if key not in st.session_state: st.session_state[key] = False
 
-        if st.session_state.get('loc'): hien_thi_loc_loi(df, ten_cot)
-        elif st.session_state.get('han'): hien_thi_kiem_tra_han(df, ten_cot)
-        elif st.session_state.get('bieu'): hien_thi_bieu_do_tuong_tac(df, ten_cot)
-        elif st.session_state.get('ai'): hien_thi_chatbot_thong_minh(df)
+        if st.session_state.get('loc'):
+            with do_hieu_nang('loc_loi', ten_cot): hien_thi_loc_loi(df, ten_cot, lay_bao_cao_chat_luong(ma_phien_ban, df))
+        elif st.session_state.get('han'):
+            with do_hieu_nang('han_bhyt', ten_cot): hien_thi_kiem_tra_han(df, ten_cot, chi_muc)
+        elif st.session_state.get('bieu'):
+            with do_hieu_nang('bieu_do', ten_cot): hien_thi_bieu_do_tuong_tac(df, ten_cot, khoi)
+        elif st.session_state.get('ai'): hien_thi_chatbot_thong_minh(df, chi_muc, khoi)
         elif st.session_state.get('admin_data') and user_role == 'admin': hien_thi_quan_tri_data()
-        elif st.session_state.get('admin_user') and user_role == 'admin': hien_thi_quan_ly_user(user_config)
+        elif st.session_state.get('admin_user') and user_role == 'admin': hien_thi_quan_ly_user(kho_nguoi_dung)
         elif st.session_state.get('admin_log') and user_role == 'admin': hien_thi_nhat_ky_he_thong(user_config)
+        elif st.session_state.get('admin_perf') and user_role == 'admin': hien_thi_hieu_nang()
         
         elif tim_kiem:
             log_action(username, "Tìm kiếm nhanh", f"Từ khóa: {tim_kiem} (Cột: {ten_cot})")
-            mask = df[ten_cot].astype(str).str.contains(tim_kiem, case=False, na=False)
-            hien_thi_uu_tien(df[mask])
+            with do_hieu_nang('tim_nhanh', f"{ten_cot}: {tim_kiem}"):
+                vi_tri = tinh_co_dem(df, 'tim_nhanh', (ten_cot, str(tim_kiem).strip()), lambda: chi_muc.tim(df, ten_cot, tim_kiem))
+                ghi_so_dong(tra=len(vi_tri)); hien_thi_uu_tien(df, vi_tri)
         else:
             st.info("👈 Chọn chức năng bên trái.")
             st.caption("Dữ liệu mẫu:")
-            st.dataframe(df.head(10))
+            st.dataframe(dang_hien_thi(df.head(10)))
 
     elif st.session_state["authentication_status"] is False: st.error('Sai mật khẩu.')
     elif st.session_state["authentication_status"] is None: st.warning('Vui lòng đăng nhập.')